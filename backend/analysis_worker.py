@@ -0,0 +1,160 @@
+# backend/analysis_worker.py
+"""
+오디오 분석 전용 프로세스 풀.
+librosa 작업은 CPU/GIL 을 점유하므로 이벤트 루프 밖의 별도 프로세스에서 돌리고,
+대기열이 가득 차면 즉시 AnalysisBusy 를 던져 호출 측이 503 으로 응답하게 한다.
+제한 시간(ANALYSIS_TIMEOUT)을 넘긴 작업은 워커를 종료하고 풀을 새로 띄워, 멈춘 분석이 워커와 대기열 슬롯을 붙잡지 않게 한다.
+워커는 뜰 때(교체될 때 포함) 짧은 클립으로 분석을 한 번 돌려 numba JIT 를 미리 끝낸다 (ANALYSIS_PREWARM).
+"""
+import os, asyncio, threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Tuple
+
+ANALYSIS_WORKERS         = int(os.getenv("ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+ANALYSIS_MAX_PENDING     = int(os.getenv("ANALYSIS_MAX_PENDING", "8"))
+ANALYSIS_TIMEOUT         = float(os.getenv("ANALYSIS_TIMEOUT", "300"))
+ANALYSIS_TASKS_PER_CHILD = int(os.getenv("ANALYSIS_TASKS_PER_CHILD", "20"))
+ANALYSIS_PREWARM         = os.getenv("ANALYSIS_PREWARM", "1") != "0"
+
+# 워커 프로세스 안에서만 채워진다: 예열에 걸린 시간 (초, 실패하면 -1)
+_warm_seconds: Optional[float] = None
+
+
+def _init_worker(prewarm: bool, nice: int = 0) -> None:
+    global _warm_seconds
+    if nice > 0 and hasattr(os, "nice"):
+        os.nice(nice)   # 낮은 우선순위 풀(음원 변환 등)은 분석 워커에게 CPU 를 양보한다
+    if not prewarm:
+        return
+    try:
+        from audio_analysis import warm_up
+        _warm_seconds = warm_up()
+    except Exception:
+        # 예열 실패는 첫 분석이 느려질 뿐이므로 워커는 그대로 띄운다
+        _warm_seconds = -1.0
+
+
+def _worker_info() -> Tuple[int, Optional[float]]:
+    return os.getpid(), _warm_seconds
+
+
+class AnalysisBusy(RuntimeError):
+    """대기열이 가득 참 (backpressure)"""
+
+
+class AnalysisTimeout(RuntimeError):
+    """작업이 제한 시간 안에 끝나지 않음"""
+
+
+class _PoolRecycled(Exception):
+    """다른 작업 때문에 풀이 교체되면서 함께 끊김 (run 이 새 풀에서 다시 시도한다)"""
+
+
+class AnalysisExecutor:
+    def __init__(
+        self,
+        workers: int = ANALYSIS_WORKERS,
+        max_pending: int = ANALYSIS_MAX_PENDING,
+        timeout: float = ANALYSIS_TIMEOUT,
+        tasks_per_child: int = ANALYSIS_TASKS_PER_CHILD,
+        prewarm: bool = ANALYSIS_PREWARM,
+        nice: int = 0,
+    ):
+        self.workers         = workers
+        self.max_pending     = max_pending
+        self.timeout         = timeout
+        self.tasks_per_child = tasks_per_child
+        self.prewarm         = prewarm
+        self.nice            = nice
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock    = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """실행 중 + 대기 중인 작업 수"""
+        return self._pending
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # 처음 쓸 때 생성 (import 시점에 프로세스를 띄우지 않음)
+        if self._pool is None:
+            # max_tasks_per_child 는 워커를 N 건마다 새로 띄워 librosa/numba 메모리 증가를 끊는다
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                max_tasks_per_child=self.tasks_per_child,
+                initializer=_init_worker,
+                initargs=(self.prewarm, self.nice),
+            )
+        return self._pool
+
+    async def start(self) -> List[Tuple[int, Optional[float]]]:
+        """
+        워커를 지금 모두 띄우고 예열이 끝날 때까지 기다린다 → [(pid, 예열 초)].
+        서버 기동 직후 백그라운드로 부른다. 대기열 한도(pending)에는 세지 않는다.
+        """
+        pool = self._get_pool()
+        futs: List[Future] = [pool.submit(_worker_info) for _ in range(self.workers)]
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futs)))
+
+    def _release(self, _fut: Any) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return await self._run(fn, args, retry=True)
+        except _PoolRecycled:
+            # 다른 작업 때문에 풀이 교체되면서 같이 끊긴 작업은 새 풀에서 한 번 더 돌린다
+            return await self._run(fn, args, retry=False)
+
+    async def _run(self, fn: Callable[..., Any], args: Tuple[Any, ...], retry: bool) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise AnalysisBusy(f"분석 대기열이 가득 찼습니다 ({self._pending}/{self.max_pending}).")
+            self._pending += 1
+        try:
+            pool = self._get_pool()
+            fut  = pool.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # 슬롯은 작업이 실제로 끝나거나(취소·워커 종료 포함) 할 때 반납한다
+        fut.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), self.timeout)
+        except asyncio.TimeoutError:
+            # 이미 돌고 있는 작업은 cancel 로 멈추지 않으므로 워커째 정리하고 풀을 새로 띄운다
+            self._recycle(pool)
+            raise AnalysisTimeout(f"분석이 {self.timeout:g}초 안에 끝나지 않았습니다.")
+        except BrokenProcessPool:
+            # 워커가 비정상 종료(OOM 등)하면 풀을 버리고 다음 요청에서 새로 만든다
+            if not self._recycle(pool) and retry:
+                raise _PoolRecycled()
+            raise
+        except asyncio.CancelledError:
+            # 대기 중에 풀이 교체되어 취소된 경우 (호출한 태스크 자체가 취소된 것이 아니면)
+            if retry and fut.cancelled() and self._pool is not pool and not asyncio.current_task().cancelling():
+                raise _PoolRecycled()
+            raise
+
+    def _recycle(self, pool: ProcessPoolExecutor) -> bool:
+        """
+        pool 을 버리고 워커 프로세스를 모두 종료한다. 대기 중이던 작업은 취소되고,
+        돌던 작업은 BrokenProcessPool 로 끝나 슬롯이 반납된다. 이미 교체된 풀이면 False.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return False
+            self._pool = None
+        procs = list((pool._processes or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        return True
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,347 @@
+# backend/audio_analysis.py
+"""
+librosa 기반 오디오 분석.
+분석 워커 프로세스에서도 import 되므로 FastAPI/LLM 의존성을 두지 않는다.
+서버는 상수와 run_analysis 참조만 쓰므로 librosa / soundfile / soxr 는 함수 안에서 import 한다
+(조회 API 만 쓰는 프로세스는 오디오 스택을 올리지 않음). numba JIT 는 warm_up 으로 워커에서 미리 치른다.
+"""
+import os, time, tempfile
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+ANALYSIS_SR = 22050
+# 이 길이(초) 이상인 곡은 블록 단위 스트리밍 분석을 쓴다 (0 이면 항상, 음수면 사용 안 함)
+STREAMING_MIN_SECONDS = float(os.getenv("ANALYSIS_STREAMING_MIN_SECONDS", "240"))
+STREAM_BLOCK_SECONDS  = 10.0
+# slow_rate != 1 일 때 분석 방식 ("hop" | "stretch"), analyze_audio 참고
+SLOW_METHOD = os.getenv("ANALYSIS_SLOW_METHOD", "hop")
+
+
+def slow_hop_params(slow_rate: float) -> Tuple[int, int, float]:
+    """
+    slow_rate 배로 늘린 신호를 hop 512 / n_fft 2048 로 분석하는 것과 같은 시간 해상도를
+    원 신호에서 hop·n_fft 를 slow_rate 배로 줄여 얻는다 → (hop, n_fft, latency 초).
+
+    time_stretch 는 n_fft=2048 STFT 로 파형을 합성하므로 transient 가 앞으로 번져
+    onset 이 약 (1 - slow_rate) * 1024 샘플 일찍 잡힌다. latency 는 그만큼을 빼서
+    기존(stretch) 결과와 시간축을 맞추기 위한 값이다.
+    """
+    hop     = max(1, int(round(512 * slow_rate)))
+    n_fft   = max(hop, int(round(2048 * slow_rate)))
+    latency = max(0.0, 1.0 - slow_rate) * 1024 / ANALYSIS_SR
+    return hop, n_fft, latency
+
+
+def extract_onset_columns(
+    onset_frames: np.ndarray,
+    onset_times: np.ndarray,
+    pitches: np.ndarray,
+    magnitudes: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    onset 프레임들의 (time, pitch, volume) 을 NumPy 연산 한 번으로 뽑는다.
+
+    pitches/magnitudes 는 piptrack 의 (bins, frames) 행렬 또는
+    프레임별 최대 크기 bin 으로 이미 줄인 (frames,) 배열.
+    크기가 0 인 프레임은 버리고, pitch 는 MIDI 정수 (주파수가 없으면 -1).
+    """
+    import librosa
+
+    frames = np.asarray(onset_frames, dtype=np.intp)
+    if magnitudes.ndim == 2:
+        cols = magnitudes[:, frames]
+        best = cols.argmax(axis=0)
+        amp  = cols[best, np.arange(len(frames))]
+        freq = pitches[best, frames]
+    else:
+        amp  = magnitudes[frames]
+        freq = pitches[frames]
+
+    keep = amp > 0
+    freq = freq[keep]
+    midi = np.full(len(freq), -1, dtype=np.int16)
+    voiced = freq > 0
+    midi[voiced] = np.trunc(librosa.hz_to_midi(freq[voiced]))
+    times  = np.round(np.maximum(0.0, np.asarray(onset_times, dtype=np.float64)[keep]), 4)
+    volume = np.clip(amp[keep], 0, 1)
+    return times, midi, volume
+
+
+def onsets_to_dicts(times: np.ndarray, midi: np.ndarray, volume: np.ndarray) -> List[Dict[str, Any]]:
+    """열 형태 onset → JSON 용 [{time, pitch, volume}] (pitch -1 은 None)"""
+    return [
+        {"time": t, "pitch": p if p >= 0 else None, "volume": v}
+        for t, p, v in zip(times.tolist(), midi.tolist(), volume.tolist())
+    ]
+
+
+def analyze_audio(
+    path: str,
+    slow_rate: float = 0.5,
+    max_onsets: int = 400,
+    method: str = SLOW_METHOD,
+) -> Dict[str, Any]:
+    """
+    MP3/WAV → BPM + 길이(초) + onset 리스트(dict) 반환
+    slow_rate: 속도 비율 (1.0 = 원속도, 0.5 = 반속도)
+    method:    "hop"     = 파형을 늘리지 않고 hop 을 줄여 분석 (기본)
+               "stretch" = time_stretch 로 늘린 신호를 분석 (이전 방식)
+    단계별 소요 시간(초)은 "timings" 에 담아 돌려준다.
+    """
+    import librosa
+
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    def lap(stage: str) -> None:
+        nonlocal t0
+        now = time.perf_counter()
+        timings[stage] = now - t0
+        t0 = now
+
+    # 1) 원본 신호 로드
+    y, sr = librosa.load(path, sr=ANALYSIS_SR, mono=True)
+    lap("decode")
+
+    # 2) BPM 측정 (원본)
+    tempo = librosa.beat.tempo(y=y, sr=sr)[0]
+    bpm = float(np.round(tempo, 2))
+    lap("tempo")
+
+    # 3) 속도 변경 (pitch-preserving) 또는 hop 축소
+    if slow_rate != 1.0 and method == "stretch":
+        y_proc = librosa.effects.time_stretch(y, rate=slow_rate)
+        hop, n_fft, latency, time_scale = 512, 2048, 0.0, slow_rate
+    else:
+        y_proc = y
+        hop, n_fft, latency = slow_hop_params(slow_rate)
+        time_scale = 1.0
+    lap("stretch")
+
+    # 4) onset 검출 (피크 피킹 파라미터는 프레임 단위로 기존과 같게: hop_length=512 기준)
+    onset_env = librosa.onset.onset_strength(y=y_proc, sr=sr, hop_length=hop, n_fft=n_fft)
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=onset_env,
+        sr=sr,
+        hop_length=512,
+        units="frames",
+        backtrack=True
+    )
+    onset_times_slow = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop)
+    lap("onset")
+
+    # 5) pitch·volume 분석 (onset 과 같은 프레임 격자)
+    pitches, magnitudes = librosa.piptrack(y=y_proc, sr=sr, hop_length=hop)
+
+    # 6) 결과 조합 & 시간 환산 및 반올림 (모든 onset 을 한 번에)
+    times, midi, volume = extract_onset_columns(
+        onset_frames, onset_times_slow * time_scale - latency, pitches, magnitudes
+    )
+    lap("pitch")
+
+    # 7) 최대 개수 제한 & 반환
+    return {
+        "bpm": bpm,
+        "duration": round(len(y) / sr, 3),
+        "onsets": onsets_to_dicts(times[:max_onsets], midi[:max_onsets], volume[:max_onsets]),
+        "timings": timings,
+    }
+
+
+def analyze_audio_streaming(
+    path: str,
+    slow_rate: float = 0.5,
+    max_onsets: int = 400,
+    block_seconds: float = STREAM_BLOCK_SECONDS,
+) -> Dict[str, Any]:
+    """
+    analyze_audio 와 같은 {"bpm", "duration", "onsets"} 를 돌려주되, 곡 전체를 메모리에 올리지 않는다.
+
+    - soundfile 로 블록 단위 디코딩 + soxr 스트림 리샘플링 (블록 경계 끊김 없음)
+    - 블록마다 앞뒤 여유 구간(pad)을 붙여 mel 스펙트럼과 pitch 를 계산하고,
+      블록 내부 프레임만 이어 붙인다 → 경계에서도 전체 계산과 같은 프레임을 얻는다.
+    - piptrack 행렬은 블록마다 프레임별 (최대 크기 pitch, 크기) 두 값으로 줄여 버린다.
+    - onset_strength 의 dB 하한(전역 최대 - 80dB)은 곡 전체를 봐야 정해지므로
+      mel dB 프레임은 임시 파일(memmap)에 쌓았다가 구간별로 envelope 를 만든다.
+    - peak picking 도 전역 정규화가 필요하므로 (프레임당 float 하나뿐인) envelope 를
+      다 모은 뒤 한 번에 한다.
+
+    slow_rate 는 항상 "hop" 방식으로 처리한다 (slow_hop_params 참고).
+    """
+    import librosa
+    import soundfile as sf
+    import soxr
+
+    timings: Dict[str, float] = {"decode": 0.0, "onset": 0.0, "pitch": 0.0}
+    sr        = ANALYSIS_SR
+    hop, n_fft_on, latency = slow_hop_params(slow_rate)
+    block_len = max(1, int(block_seconds * sr) // hop) * hop
+    pad_len   = -(-4 * 2048 // hop) * hop   # 프레이밍/lag 보정에 충분한 여유 (hop 배수)
+
+    mel_file = tempfile.TemporaryFile()
+    mel_max  = -np.inf
+    pitch_parts: List[np.ndarray] = []
+    mag_parts:   List[np.ndarray] = []
+
+    def process(seg: np.ndarray, lo: int, start: int, stop_frame: int) -> None:
+        """seg = 신호[lo:...], 전역 프레임 [start/hop, stop_frame) 만 보관"""
+        nonlocal mel_max
+        a = start // hop - lo // hop
+        b = stop_frame - lo // hop
+        t0  = time.perf_counter()
+        mel = librosa.feature.melspectrogram(y=seg, sr=sr, n_fft=n_fft_on, hop_length=hop)
+        mel_db = librosa.power_to_db(mel[:, a:b], top_db=None).astype(np.float32)
+        if mel_db.size:
+            mel_max = max(mel_max, float(mel_db.max()))
+        mel_file.write(np.ascontiguousarray(mel_db.T).tobytes())
+        t1  = time.perf_counter()
+        pitches, mags = librosa.piptrack(y=seg, sr=sr, hop_length=hop)
+        best = mags.argmax(axis=0)
+        cols = np.arange(mags.shape[1])
+        t2  = time.perf_counter()
+        pitch_parts.append(pitches[best, cols][a:b].astype(np.float32))
+        mag_parts.append(mags[best, cols][a:b].astype(np.float32))
+        timings["onset"] += t1 - t0
+        timings["pitch"] += t2 - t1
+
+    t0 = time.perf_counter()
+    with mel_file, sf.SoundFile(path) as f:
+        stream = soxr.ResampleStream(f.samplerate, sr, 1, dtype="float32", quality="HQ")
+        native_block = max(1, int(block_seconds * f.samplerate))
+        buf       = np.zeros(0, dtype=np.float32)
+        buf_start = 0   # buf[0] 의 전역 샘플 위치
+        start     = 0   # 다음에 처리할 블록 시작
+        done      = False
+        while not done:
+            x = f.read(native_block, dtype="float32", always_2d=True)
+            done = len(x) < native_block
+            y = stream.resample_chunk(x.mean(axis=1)[:, None], last=done)[:, 0]
+            buf = np.concatenate([buf, y])
+            timings["decode"] += time.perf_counter() - t0
+            total = buf_start + len(buf) if done else None
+
+            # 오른쪽 여유까지 확보된 블록은 바로 처리
+            while start + block_len + pad_len <= buf_start + len(buf) or (done and start < total):
+                lo = max(0, start - pad_len)
+                hi = start + block_len + pad_len
+                if done:
+                    hi = min(hi, total)
+                stop_frame = (start + block_len) // hop
+                if done and start + block_len >= total:
+                    stop_frame = 1 + total // hop   # 마지막 프레임 (center=True 기준)
+                process(buf[lo - buf_start : hi - buf_start], lo, start, stop_frame)
+                start += block_len
+                # 다음 블록의 왼쪽 여유 이전은 버린다
+                keep_from = max(0, start - pad_len)
+                buf = buf[keep_from - buf_start :]
+                buf_start = keep_from
+            t0 = time.perf_counter()
+
+        env = _onset_envelope_from_mel(mel_file, mel_max, n_fft_on, hop)
+        timings["onset"] += time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pitch_hz  = np.concatenate(pitch_parts) if pitch_parts else env
+    magnitude = np.concatenate(mag_parts) if mag_parts else env
+    bpm   = float(np.round(_tempo_from_envelope(env, sr, hop), 2))
+    t1 = time.perf_counter()
+    # 원래 경로(늘린 신호, hop 512)와 같은 프레임 단위 피크 피킹이 되도록 sr/hop 비율을 맞춘다
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=env, sr=sr, hop_length=512, units="frames", backtrack=True
+    )
+    t2 = time.perf_counter()
+    timings["tempo"] = t1 - t0
+    timings["onset"] += t2 - t1
+
+    times, midi, volume = extract_onset_columns(
+        onset_frames, onset_frames * hop / sr - latency, pitch_hz, magnitude
+    )
+
+    return {
+        "bpm": bpm,
+        "duration": round(total / sr, 3),
+        "onsets": onsets_to_dicts(times[:max_onsets], midi[:max_onsets], volume[:max_onsets]),
+        "timings": timings,
+    }
+
+
+def _onset_envelope_from_mel(
+    mel_file: Any, mel_max: float, n_fft: int, hop: int,
+    n_mels: int = 128, seg_frames: int = 4096, top_db: float = 80.0,
+) -> np.ndarray:
+    """
+    임시 파일에 쌓인 mel dB 프레임(frame-major float32)으로
+    librosa.onset.onset_strength(y=...) 와 같은 envelope 를 구간별로 만든다.
+    """
+    mel_file.flush()
+    n_frames = mel_file.tell() // (4 * n_mels)
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    mel_db = np.memmap(mel_file, dtype=np.float32, mode="r", shape=(n_frames, n_mels))
+    floor  = mel_max - top_db
+    diffs  = []
+    for a in range(1, n_frames, seg_frames):
+        b   = min(n_frames, a + seg_frames)
+        seg = np.maximum(mel_db[a - 1 : b], floor)    # lag=1 이므로 앞 프레임 하나 포함
+        diffs.append(np.maximum(0.0, seg[1:] - seg[:-1]).mean(axis=1))
+    del mel_db
+    # onset_strength(center=True) 의 lag + 프레이밍 보정만큼 앞을 0 으로 채우고 길이를 맞춘다
+    pad_width = 1 + n_fft // (2 * hop)
+    env = np.concatenate([np.zeros(pad_width, dtype=np.float32)] + diffs)[:n_frames]
+    return env.astype(np.float32)
+
+
+def _tempo_from_envelope(env: np.ndarray, sr: int, hop: int, seg_frames: int = 512) -> float:
+    """
+    librosa.beat.tempo(onset_envelope=env) 와 같은 값을, 곡 길이와 무관한 메모리로 계산.
+    tempogram 을 구간별로 만들어 열 합만 누적한 뒤 평균 tempogram 으로 템포를 고른다.
+    """
+    import librosa
+
+    win  = int(librosa.time_to_frames(8.0, sr=sr, hop_length=hop))  # tempo 기본 ac_size
+    half = win // 2 + 1
+    total = np.zeros(win, dtype=np.float64)
+    for a in range(0, len(env), seg_frames):
+        b  = min(len(env), a + seg_frames)
+        lo = max(0, a - half)
+        hi = min(len(env), b + half)
+        tg = librosa.feature.tempogram(onset_envelope=env[lo:hi], sr=sr, hop_length=hop, win_length=win)
+        total += tg[:, a - lo : b - lo].sum(axis=1)
+    mean_tg = (total / max(1, len(env)))[:, None]
+    return float(librosa.beat.tempo(tg=mean_tg, sr=sr, hop_length=hop)[0])
+
+
+def run_analysis(path: str, slow_rate: float = 0.5, max_onsets: int = 400) -> Dict[str, Any]:
+    """곡 길이에 따라 전체 로드 / 스트리밍 분석을 고른다 (워커 프로세스 진입점)"""
+    if STREAMING_MIN_SECONDS >= 0:
+        import soundfile as sf
+        try:
+            duration = sf.info(path).duration
+        except RuntimeError:  # soundfile 이 못 읽는 형식은 librosa.load 경로로
+            duration = -1.0
+        if duration >= STREAMING_MIN_SECONDS:
+            return analyze_audio_streaming(path, slow_rate, max_onsets)
+    return analyze_audio(path, slow_rate, max_onsets)
+
+
+def warm_up(seconds: float = 2.0) -> float:
+    """
+    짧은 합성 클립으로 두 분석 경로(전체 로드 / 스트리밍)를 한 번씩 돌려
+    librosa 의 지연 import 와 numba JIT 컴파일을 미리 끝낸다. 걸린 시간(초)을 돌려준다.
+    분석 워커가 뜰 때 (analysis_worker 의 initializer) 호출한다.
+    """
+    import warnings
+    import soundfile as sf
+
+    t0 = time.perf_counter()
+    sr = ANALYSIS_SR
+    t  = np.arange(int(seconds * sr)) / sr
+    # 0.25 초마다 짧게 울리는 440 Hz 톤: onset / pitch / tempo 가 모두 값이 나오게
+    y  = (0.5 * np.sin(2 * np.pi * 440.0 * t) * (np.mod(t, 0.25) < 0.05)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as d, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        path = os.path.join(d, "warmup.wav")
+        sf.write(path, y, sr)
+        analyze_audio(path)
+        analyze_audio_streaming(path, block_seconds=seconds / 2)
+    return time.perf_counter() - t0
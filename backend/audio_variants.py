@@ -0,0 +1,94 @@
+# backend/audio_variants.py
+"""
+재생용 오디오 변형(variant) 만들기.
+
+- stream : 음량 정규화 + 32 kHz 스테레오 VBR MP3 (원본 대비 3~20 배 작음)
+- preview: 곡 선택 화면용, 가장 에너지가 큰 구간 PREVIEW_SECONDS 초 (모노, 페이드 인/아웃)
+
+transcode_variants 는 변환 전용 워커 프로세스(main.transcode_executor)에서 돌 수 있도록 모듈 최상위 함수로 둔다.
+libsndfile 의 MP3 인코더는 LAME 태그에 인코더 지연을 기록하므로 재생 시 원본과 시각이 맞는다.
+"""
+import os, time
+from typing import Dict
+
+import numpy as np
+
+VARIANTS        = ("original", "stream", "preview")
+STREAM_SR       = 32000
+STREAM_QUALITY  = float(os.getenv("AUDIO_STREAM_QUALITY", "0.9"))  # libsndfile compression_level (0=최고 음질)
+PREVIEW_SR      = 22050
+PREVIEW_SECONDS = 20.0
+PREVIEW_FADE    = 1.0
+TARGET_RMS_DB   = -16.0
+PEAK_LIMIT      = 0.95
+
+
+def variant_path(root: str, song_id: str, variant: str) -> str:
+    return os.path.join(root, f"{song_id}.{variant}.mp3")
+
+
+def sniff_media_type(path: str) -> str:
+    """업로드는 확장자와 상관없이 .mp3 로 저장되므로 헤더로 실제 형식을 고른다."""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    return "audio/mpeg"
+
+
+def normalize(y: np.ndarray) -> np.ndarray:
+    """RMS 를 TARGET_RMS_DB 로 맞추되 피크가 PEAK_LIMIT 를 넘지 않게"""
+    rms  = float(np.sqrt(np.mean(np.square(y)))) if y.size else 0.0
+    peak = float(np.max(np.abs(y))) if y.size else 0.0
+    if rms <= 1e-6:
+        return y
+    gain = min(10 ** (TARGET_RMS_DB / 20) / rms, PEAK_LIMIT / peak)
+    return (y * gain).astype(np.float32)
+
+
+def preview_window(mono: np.ndarray, sr: int, seconds: float = PREVIEW_SECONDS) -> slice:
+    """에너지 합이 가장 큰 seconds 길이 구간"""
+    n = int(seconds * sr)
+    if len(mono) <= n:
+        return slice(0, len(mono))
+    hop    = sr // 10
+    frames = np.square(mono[: len(mono) // hop * hop]).reshape(-1, hop).sum(axis=1)
+    win    = n // hop
+    sums   = np.convolve(frames, np.ones(win), mode="valid")
+    start  = int(np.argmax(sums)) * hop
+    return slice(start, start + n)
+
+
+def _write_mp3(path: str, y: np.ndarray, sr: int) -> None:
+    import soundfile as sf
+    tmp = f"{path}.tmp"
+    sf.write(tmp, y.T if y.ndim > 1 else y, sr, format="MP3",
+             bitrate_mode="VARIABLE", compression_level=STREAM_QUALITY)
+    os.replace(tmp, path)
+
+
+def transcode_variants(src: str, root: str, song_id: str) -> Dict[str, float]:
+    """src → stream / preview 변형 파일. 단계별 소요 시간(초)을 돌려준다."""
+    import librosa
+
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    y, sr = librosa.load(src, sr=None, mono=False)
+    timings["decode"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stream = normalize(librosa.resample(y, orig_sr=sr, target_sr=STREAM_SR, res_type="soxr_hq"))
+    _write_mp3(variant_path(root, song_id, "stream"), stream, STREAM_SR)
+    timings["stream"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    mono = librosa.resample(librosa.to_mono(y), orig_sr=sr, target_sr=PREVIEW_SR, res_type="soxr_hq")
+    clip = normalize(mono[preview_window(mono, PREVIEW_SR)])
+    fade = min(int(PREVIEW_FADE * PREVIEW_SR), len(clip) // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        clip[:fade]  *= ramp
+        clip[-fade:] *= ramp[::-1]
+    _write_mp3(variant_path(root, song_id, "preview"), clip, PREVIEW_SR)
+    timings["preview"] = time.perf_counter() - t0
+    return timings
@@ -0,0 +1,72 @@
+# backend/benchmarks/bench_onset_extract.py
+"""
+onset 별 pitch/volume 추출: 예전 파이썬 루프 vs extract_onset_columns (+ dict 변환).
+piptrack 크기의 합성 행렬로 측정하고 두 결과가 같은지도 확인한다.
+
+    cd backend
+    python benchmarks/bench_onset_extract.py --frames 13000 --onsets 1000 5000
+"""
+import os, sys, time, argparse
+from typing import Any, Dict, List
+
+import numpy as np
+import librosa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_analysis import extract_onset_columns, onsets_to_dicts
+
+
+def legacy_loop(frames, times, pitches, magnitudes) -> List[Dict[str, Any]]:
+    """analyze_audio 6단계의 이전 구현"""
+    output = []
+    for idx, frame in enumerate(frames):
+        t_orig = round(max(0.0, times[idx]), 4)
+        mag = magnitudes[:, frame]
+        if mag.any():
+            i = mag.argmax()
+            freq = pitches[i, frame]
+            midi = int(librosa.hz_to_midi(freq)) if freq > 0 else None
+            amp = float(np.clip(mag[i], 0, 1))
+            output.append({"time": t_orig, "pitch": midi, "volume": amp})
+    return output
+
+
+def vectorized(frames, times, pitches, magnitudes) -> List[Dict[str, Any]]:
+    return onsets_to_dicts(*extract_onset_columns(frames, times, pitches, magnitudes))
+
+
+def best_of(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=13000, help="piptrack 프레임 수 (5분, hop 512 ≈ 13000)")
+    ap.add_argument("--bins", type=int, default=1025)
+    ap.add_argument("--onsets", nargs="+", type=int, default=[400, 2000, 5000])
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    # piptrack 처럼 대부분 0 이고 일부 bin 만 값이 있는 행렬
+    magnitudes = np.where(rng.random((args.bins, args.frames)) < 0.02,
+                          rng.random((args.bins, args.frames)), 0).astype(np.float32)
+    magnitudes[:, ::97] = 0   # 소리가 없는 프레임도 섞는다
+    pitches = np.where(magnitudes > 0, rng.uniform(150, 4000, magnitudes.shape), 0).astype(np.float32)
+
+    print(f"{'onsets':>7}  {'loop ms':>9}  {'vector ms':>9}  {'speedup':>7}  equal")
+    for n in args.onsets:
+        frames = np.sort(rng.choice(args.frames, size=min(n, args.frames), replace=False))
+        times  = librosa.frames_to_time(frames, sr=22050)
+        same   = legacy_loop(frames, times, pitches, magnitudes) == vectorized(frames, times, pitches, magnitudes)
+        t_loop = best_of(legacy_loop, frames, times, pitches, magnitudes)
+        t_vec  = best_of(vectorized, frames, times, pitches, magnitudes)
+        print(f"{n:>7}  {t_loop * 1e3:>9.2f}  {t_vec * 1e3:>9.2f}  {t_loop / t_vec:>6.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
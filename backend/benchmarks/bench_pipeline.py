@@ -0,0 +1,390 @@
+# backend/benchmarks/bench_pipeline.py
+"""
+업로드 → 분석 → 채보 생성 → 조회 전체 파이프라인 부하 측정 (가짜 Gemini).
+
+임시 작업 폴더에서 FastAPI 앱을 그대로 띄워(ASGI, 같은 프로세스) 곡 여러 개를 동시에 업로드하고,
+작업이 끝날 때까지 폴링하면서 곡 목록/차트 조회 부하를 함께 건다. LLM 은 지연·실패율을 정할 수 있는
+FakeGenaiClient 로 바꾼다. 출력:
+  - 단계별 시간 (job timings: 분석 세부 단계, LLM 청크, 저장 …) + 청크 계획/프롬프트/병합/인코딩 미세 측정
+  - 엔드포인트별 지연 p50/p95/p99, 곡당 end-to-end 시간, 처리량(곡/분), 최대 RSS(분석 워커 포함)
+  - --save 로 기준값 저장, --compare 로 기준 대비 변화 (허용 범위보다 느려지면 exit 1)
+
+    cd backend
+    python benchmarks/bench_pipeline.py                             # 합성 곡 8개 (60 s, 초당 onset 3개), 동시 4
+    python benchmarks/bench_pipeline.py --songs 16 --concurrency 8 --duration 180 --density 5
+    python benchmarks/bench_pipeline.py --uploads 4                 # uploads/ 의 실제 곡 (내용이 같으면 중복 처리됨)
+    python benchmarks/bench_pipeline.py --llm-latency 2 --llm-failure 0.1 --engine llm
+    python benchmarks/bench_pipeline.py --save base                 # benchmarks/baselines/base.json
+    python benchmarks/bench_pipeline.py --compare reference         # 저장소에 있는 기준 (기본 설정, 만든 환경은 파일 안 machine)
+    python benchmarks/bench_pipeline.py --compare base --tolerance 0.25
+"""
+import os, re, sys, glob, json, time, random, shutil, asyncio, argparse, platform, tempfile, warnings, resource, statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BACKEND   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(BACKEND, "benchmarks", "baselines")
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+
+# ────────────── 합성 음원 ─────────────
+def synth_song(path: str, duration: float, density: float, seed: int, sr: int = 44100) -> int:
+    """
+    duration 초, 초당 평균 density 개 타격음(감쇠 사인 + 잡음 어택)이 있는 스테레오 WAV.
+    곡마다 seed 가 달라 내용 해시가 겹치지 않는다. 넣은 타격 수를 돌려준다.
+    """
+    import soundfile as sf
+    rng  = np.random.default_rng(seed)
+    n    = int(duration * sr)
+    y    = np.zeros(n, dtype=np.float32)
+    gaps = rng.exponential(1.0 / density, size=int(duration * density * 2) + 8)
+    hits = np.cumsum(np.maximum(gaps, 0.06))
+    hits = hits[hits < duration - 0.5]
+    env_len = int(0.25 * sr)
+    t   = np.arange(env_len) / sr
+    env = np.exp(-t * 18).astype(np.float32)
+    for h in hits:
+        midi = rng.integers(48, 84)
+        freq = 440.0 * 2 ** ((midi - 69) / 12)
+        tone = np.sin(2 * np.pi * freq * t) * env
+        tone[: sr // 200] += rng.normal(0, 0.5, sr // 200)      # 어택
+        i = int(h * sr)
+        seg = y[i:i + env_len]
+        seg += tone[: len(seg)] * rng.uniform(0.3, 0.9)
+    y += 0.02 * np.sin(2 * np.pi * 110 * np.arange(n) / sr)      # 잔잔한 배경음
+    y /= max(1.0, float(np.max(np.abs(y))) / 0.9)
+    sf.write(path, np.stack([y, y], axis=1), sr, subtype="PCM_16", format="WAV")
+    return len(hits)
+
+
+# ────────────── 측정 도구 ─────────────
+def machine_info() -> Dict[str, Any]:
+    """기준값을 만든 환경 (다른 환경의 기준과 비교할 때 알려 준다)"""
+    import librosa
+    return {
+        "platform": platform.platform(),
+        "machine":  platform.machine(),
+        "cpus":     os.cpu_count(),
+        "python":   platform.python_version(),
+        "numpy":    np.__version__,
+        "librosa":  librosa.__version__,
+    }
+
+
+def pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def rss_tree_mb() -> Optional[Tuple[float, float]]:
+    """(이 프로세스, 자식 프로세스(분석 워커) 합) RSS MB (Linux /proc, 없으면 None)"""
+    me = os.getpid()
+    try:
+        children = [int(p) for p in os.listdir("/proc") if p.isdigit() and _ppid(int(p)) == me]
+    except OSError:
+        return None
+    return _rss_kb(me) / 1024, sum(_rss_kb(p) for p in children) / 1024
+
+
+def _ppid(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return -1
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.status:  Dict[str, Dict[int, int]] = {}
+        self.peak_rss = self.peak_workers = 0.0
+
+    async def request(self, client, method: str, url: str, label: str, **kw):
+        t0 = time.perf_counter()
+        r  = await client.request(method, url, **kw)
+        self.latency.setdefault(label, []).append(time.perf_counter() - t0)
+        codes = self.status.setdefault(label, {})
+        codes[r.status_code] = codes.get(r.status_code, 0) + 1
+        return r
+
+    async def sample_rss(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            rss = rss_tree_mb()
+            if rss is not None:
+                self.peak_rss     = max(self.peak_rss, sum(rss))
+                self.peak_workers = max(self.peak_workers, rss[1])
+            await asyncio.sleep(0.2)
+
+
+# ────────────── 부하 ─────────────
+async def run_load(main, files: List[str], args) -> Dict[str, Any]:
+    import httpx
+    rec, stop = Recorder(), asyncio.Event()
+    e2e: List[float] = []
+    jobs: List[Dict[str, Any]] = []
+    done_ids: List[str] = []
+    errors: List[str] = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one_song(client, path: str) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            data = {"keys": args.keys, "engine": args.engine, "slow_rate": str(args.slow_rate)}
+            while True:
+                with open(path, "rb") as f:
+                    r = await rec.request(client, "POST", "/api/upload/", "POST /api/upload",
+                                          files={"file": (os.path.basename(path), f, "audio/wav")}, data=data)
+                if r.status_code != 503:
+                    break
+                await asyncio.sleep(float(r.headers.get("Retry-After", "1")) / 10)
+            if r.status_code != 200:
+                errors.append(f"upload {r.status_code}: {r.text[:120]}")
+                return
+            body = r.json()
+            sid, job_id = body["song_id"], body.get("job_id")
+            while job_id:
+                j = (await rec.request(client, "GET", f"/api/jobs/{job_id}", "GET /api/jobs/{id}")).json()
+                if j["status"] in ("done", "error"):
+                    jobs.append(j)
+                    if j["status"] == "error":
+                        errors.append(f"job {j['error']}")
+                    break
+                await asyncio.sleep(args.poll)
+            e2e.append(time.perf_counter() - t0)
+            await rec.request(client, "GET", f"/api/chart/{sid}", "GET /api/chart/{id}",
+                              headers={"Accept-Encoding": "gzip"})
+            await rec.request(client, "GET", f"/api/audio/{sid}?variant=stream", "GET /api/audio/{id}",
+                              headers={"Range": "bytes=0-65535"})
+            done_ids.append(sid)
+
+    async def reader(client) -> None:
+        # 업로드와 동시에 들어오는 조회 트래픽
+        rng = random.Random(0)
+        while not stop.is_set():
+            await rec.request(client, "GET", "/api/songs?limit=50", "GET /api/songs")
+            if done_ids:
+                await rec.request(client, "GET", f"/api/chart/{rng.choice(done_ids)}", "GET /api/chart/{id}",
+                                  headers={"Accept-Encoding": "gzip"})
+            await asyncio.sleep(args.read_interval)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client, \
+               main.app.router.lifespan_context(main.app):
+        sampler = asyncio.create_task(rec.sample_rss(stop))
+        readers = [asyncio.create_task(reader(client)) for _ in range(args.readers)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_song(client, p) for p in files))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await asyncio.gather(sampler, *readers)
+        # 백그라운드 변환 작업이 끝난 뒤 종료
+        while main._job_tasks:
+            await asyncio.sleep(0.1)
+
+    return {"rec": rec, "wall": wall, "e2e": e2e, "jobs": jobs, "errors": errors, "done": len(done_ids)}
+
+
+async def micro_stages(main, files: List[str], args) -> Dict[str, List[float]]:
+    """분석 캐시에 남은 결과로 청크 계획 / 프롬프트 / 병합 / 차트 인코딩만 따로 잰다"""
+    from chunk_scheduler import plan_chunks
+    from prompts import build_prompt
+    from chart_store import encode_chart
+    from chart_engine import generate_chart
+    out: Dict[str, List[float]] = {"plan_chunks": [], "build_prompt": [], "merge_chaebo": [], "encode_chart": []}
+    key = int(args.keys.split(",")[0])
+    for path in files:
+        summary = await main.analyze_audio_cached(path, slow_rate=args.slow_rate)
+        onsets  = main.round_onsets(summary["onsets"])
+        t0 = time.perf_counter(); plan = plan_chunks(onsets, summary["bpm"]); out["plan_chunks"].append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for c in plan:
+            build_prompt(key, summary["bpm"], c.onsets, "", {"before": c.before, "after": c.after})
+        out["build_prompt"].append(time.perf_counter() - t0)
+        chart = generate_chart(key, summary)
+        notes = chart[f"{key}key"]["chaebo"]
+        parts = [notes[i::len(plan) or 1] for i in range(len(plan) or 1)]
+        t0 = time.perf_counter(); main.merge_chaebo(parts); out["merge_chaebo"].append(time.perf_counter() - t0)
+        t0 = time.perf_counter(); encode_chart(chart); out["encode_chart"].append(time.perf_counter() - t0)
+    return out
+
+
+# ────────────── 결과 ─────────────
+def summarize(res: Dict[str, Any], micro: Dict[str, List[float]], main) -> Dict[str, float]:
+    """비교용 평평한 지표 (이름 → 값). 이름이 throughput 으로 시작하면 클수록 좋다."""
+    m: Dict[str, float] = {
+        "throughput_songs_per_min": res["done"] / res["wall"] * 60 if res["wall"] else 0.0,
+        "wall_s": res["wall"],
+        "e2e_p50_s": pct(res["e2e"], 50), "e2e_p95_s": pct(res["e2e"], 95), "e2e_p99_s": pct(res["e2e"], 99),
+    }
+    stages: Dict[str, List[float]] = {}
+    for j in res["jobs"]:
+        llm = 0.0
+        for k, v in j["timings"].items():
+            if k.startswith("llm_chunk_"):
+                llm += v
+            else:
+                stages.setdefault(k, []).append(v)
+        if llm:
+            stages.setdefault("llm_chunks_sum", []).append(llm)
+    for k, vs in sorted(stages.items()):
+        m[f"stage_{k}_mean_s"] = statistics.mean(vs)
+        m[f"stage_{k}_p95_s"]  = pct(vs, 95)
+    for k, vs in micro.items():
+        m[f"micro_{k}_ms"] = statistics.mean(vs) * 1000 if vs else 0.0
+    for label, vs in res["rec"].latency.items():
+        slug = re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+        for q in (50, 95, 99):
+            m[f"http_{slug}_p{q}_ms"] = pct(vs, q) * 1000
+    # /proc 가 없으면 ru_maxrss (Linux 는 KB) 로 대신한다
+    m["peak_rss_mb"] = max(res["rec"].peak_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+    m["peak_rss_workers_mb"] = res["rec"].peak_workers
+    llm = main.llm_client.metrics()
+    m["llm_calls"], m["llm_retries"], m["llm_failures"] = llm["calls"], llm["retries"], llm["failures"]
+    return m
+
+
+def print_table(head: List[str], rows: List[List[str]]) -> None:
+    widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(head)]
+    print("  ".join(h.ljust(w) for h, w in zip(head, widths)))
+    for r in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+
+
+def report(res: Dict[str, Any], m: Dict[str, float]) -> None:
+    print(f"\nsongs done: {res['done']}  wall: {m['wall_s']:.1f}s  throughput: {m['throughput_songs_per_min']:.1f} songs/min")
+    print(f"end-to-end  p50 {m['e2e_p50_s']:.2f}s  p95 {m['e2e_p95_s']:.2f}s  p99 {m['e2e_p99_s']:.2f}s")
+    print(f"peak RSS: {m['peak_rss_mb']:.0f} MB (server + workers), workers {m['peak_rss_workers_mb']:.0f} MB")
+    print(f"LLM calls {m['llm_calls']:.0f}, retries {m['llm_retries']:.0f}, failures {m['llm_failures']:.0f}")
+    if res["errors"]:
+        print(f"errors ({len(res['errors'])}):", *sorted(set(res["errors"]))[:5], sep="\n  ")
+
+    print("\n[stages]")
+    rows = [[k[6:-7], f"{m[k]:.3f}", f"{m[k[:-7] + '_p95_s']:.3f}"] for k in m if k.startswith("stage_") and k.endswith("_mean_s")]
+    rows += [[k[6:-3], f"{m[k] / 1000:.4f}", "-"] for k in m if k.startswith("micro_")]
+    print_table(["stage", "mean s", "p95 s"], rows)
+
+    print("\n[endpoints]")
+    rows = []
+    for label, vs in res["rec"].latency.items():
+        codes = ",".join(f"{c}×{n}" for c, n in sorted(res["rec"].status[label].items()))
+        rows.append([label, str(len(vs)), *(f"{pct(vs, q) * 1000:.1f}" for q in (50, 95, 99)), codes])
+    print_table(["endpoint", "n", "p50 ms", "p95 ms", "p99 ms", "status"], rows)
+
+
+def compare(m: Dict[str, float], name: str, config: Dict[str, Any], tolerance: float) -> bool:
+    with open(os.path.join(BASELINES, f"{name}.json"), "r", encoding="utf-8") as f:
+        base = json.load(f)
+    if base["config"] != config:
+        print("\n주의: 기준과 설정이 다릅니다:", {k: (base["config"].get(k), v) for k, v in config.items()
+                                        if base["config"].get(k) != v})
+    here = machine_info()
+    if base.get("machine") and base["machine"] != here:
+        print("\n주의: 기준과 실행 환경이 다릅니다:", {k: (base["machine"].get(k), v) for k, v in here.items()
+                                          if base["machine"].get(k) != v})
+    print(f"\n[compare with {name}]  (허용 ±{tolerance:.0%})")
+    rows, worse = [], False
+    for k, old in base["metrics"].items():
+        if k not in m or k.startswith("llm_"):
+            continue
+        new = m[k]
+        if old <= 0:
+            continue
+        change = (new - old) / old
+        bad = change < -tolerance if k.startswith("throughput") else change > tolerance
+        # 수 ms 짜리 지표는 잡음이 커서 절대 차이 1 ms 미만이면 무시
+        if k.endswith("_ms") and abs(new - old) < 1.0:
+            bad = False
+        worse |= bad
+        rows.append([k, f"{old:.4g}", f"{new:.4g}", f"{change:+.1%}", "REGRESSION" if bad else ""])
+    print_table(["metric", "baseline", "now", "change", ""], rows)
+    return not worse
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--songs", type=int, default=8, help="합성 곡 수")
+    ap.add_argument("--duration", type=float, default=60.0, help="합성 곡 길이 (초)")
+    ap.add_argument("--density", type=float, default=3.0, help="합성 곡 초당 평균 onset 수")
+    ap.add_argument("--uploads", type=int, default=0, help="합성 대신 uploads/ 의 실제 곡 N 개")
+    ap.add_argument("--concurrency", type=int, default=4, help="동시 업로드 수")
+    ap.add_argument("--readers", type=int, default=2, help="조회 부하 태스크 수")
+    ap.add_argument("--read-interval", type=float, default=0.05)
+    ap.add_argument("--poll", type=float, default=0.1, help="작업 상태 폴링 간격 (초)")
+    ap.add_argument("--keys", default="4")
+    ap.add_argument("--engine", default="llm", choices=("llm", "native"))
+    ap.add_argument("--slow-rate", type=float, default=1.0)
+    ap.add_argument("--llm-latency", type=float, default=1.0, help="가짜 Gemini 응답 지연 (초)")
+    ap.add_argument("--llm-failure", type=float, default=0.0, help="가짜 Gemini 503 확률")
+    ap.add_argument("--llm-rate", type=float, default=0.0, help="LLM 초당 호출 제한 (0 = 제한 없음)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--save", metavar="NAME", help="결과를 benchmarks/baselines/NAME.json 에 저장")
+    ap.add_argument("--compare", metavar="NAME", help="benchmarks/baselines/NAME.json 과 비교")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--keep", action="store_true", help="임시 작업 폴더를 지우지 않음")
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    # main 을 import 하기 전에: 설정은 환경 변수로 읽히고, 저장 경로는 현재 폴더 기준이다
+    os.environ.setdefault("LLM_RATE_PER_SEC", str(args.llm_rate))
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.05")
+    uploads = sorted(glob.glob(os.path.join(BACKEND, "uploads", "*.mp3")))[:args.uploads]
+    work = tempfile.mkdtemp(prefix="hci-bench-")
+    os.chdir(work)
+    os.makedirs("inputs")
+
+    config = {k: getattr(args, k) for k in ("songs", "duration", "density", "uploads", "concurrency", "readers",
+                                             "keys", "engine", "slow_rate", "llm_latency", "llm_failure", "llm_rate")}
+    files: List[str] = []
+    t0 = time.perf_counter()
+    if uploads:
+        for p in uploads:
+            files.append(shutil.copy(p, "inputs"))
+    else:
+        for i in range(args.songs):
+            path = os.path.join("inputs", f"synth_{i:03d}.wav")
+            synth_song(path, args.duration, args.density, args.seed * 1000 + i)
+            files.append(path)
+    print(f"inputs: {len(files)} files ready in {time.perf_counter() - t0:.1f}s  (work dir {work})")
+
+    import main
+    from llm_client import FakeGenaiClient
+    from bench_prompt import fake_respond
+    main.llm_client._client = FakeGenaiClient(fake_respond, latency=args.llm_latency,
+                                              failure_rate=args.llm_failure, seed=args.seed)
+    try:
+        res   = asyncio.run(run_load(main, files, args))
+        micro = asyncio.run(micro_stages(main, files, args))
+        m = summarize(res, micro, main)
+        report(res, m)
+        ok = True
+        if args.compare:
+            ok = compare(m, args.compare, config, args.tolerance)
+        if args.save:
+            os.makedirs(BASELINES, exist_ok=True)
+            path = os.path.join(BASELINES, f"{args.save}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"config": config, "machine": machine_info(), "created_at": time.time(), "metrics": m},
+                          f, indent=1)
+            print(f"\nbaseline saved: {path}")
+    finally:
+        os.chdir(BACKEND)
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,139 @@
+# backend/benchmarks/bench_prompt.py
+"""
+chaebo 프롬프트 비교: 예전 단일 프롬프트("legacy") vs system + 압축 onset("compact").
+같은 청크 계획으로 두 방식의 프롬프트를 만들어 청크마다 호출하고
+예상/실제 토큰, 지연 시간, 응답 유효성(onset 에 있는 시각·레인 범위 안의 노트 비율, onset 커버율)을 출력한다.
+
+    cd backend
+    python benchmarks/bench_prompt.py                       # uploads/*.mp3 첫 곡, GOOGLE_API_KEY 있으면 실제 Gemini
+    python benchmarks/bench_prompt.py a.mp3 --key 6 --chunks 3
+    python benchmarks/bench_prompt.py --fake                # 가짜 모델 (지연 = 토큰 수 비례 모의값)
+
+--fake 의 유효성 수치는 의미가 없고(항상 정답을 돌려줌), 토큰 수와 모의 지연만 비교용이다.
+"""
+import os, re, sys, glob, json, time, asyncio, argparse, warnings, statistics
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_analysis import run_analysis
+from chaebo_stream import CHAEBO_CONFIG, parse_chaebo_text
+from chunk_scheduler import plan_chunks, validate_chaebo
+from llm_client import LLMClient, FakeGenaiClient
+from prompts import PROMPT_STYLES, build_prompt, estimate_tokens, token_report
+
+_CSV_TIME  = re.compile(r"(?m)^(\d+(?:\.\d+)?),")
+_JSON_TIME = re.compile(r'"time": ([0-9.]+)')
+
+
+def fake_respond(user: str) -> str:
+    """프롬프트의 입력 onset(문맥 제외) 시각마다 노트 하나"""
+    body  = re.split(r"\nBefore \(read-only\)|\nContext \(read-only", user)[0]
+    times = _JSON_TIME.findall(body) or _CSV_TIME.findall(body)
+    return json.dumps([{"time": float(t), "type": "short", "position": 1 + i % 4} for i, t in enumerate(times)])
+
+
+class SimulatedClient(FakeGenaiClient):
+    """지연 = 기본 + 입력 토큰 × prefill + 출력 토큰 × decode (초/1k 토큰)"""
+
+    def __init__(self, base: float, prefill: float, decode: float):
+        super().__init__(fake_respond)
+        self.base, self.prefill, self.decode = base, prefill, decode
+
+    def generate_content(self, model: str, contents: str, config: Any = None):
+        system = (config or {}).get("system_instruction", "")
+        out = fake_respond(contents)
+        time.sleep(self.base + (estimate_tokens(system) + estimate_tokens(contents)) / 1000 * self.prefill
+                   + estimate_tokens(out) / 1000 * self.decode)
+        return super().generate_content(model, contents, config)
+
+
+async def run_style(client: LLMClient, style: str, key: int, bpm: float, chunks, concurrency: int) -> Dict[str, Any]:
+    usage: Dict[str, int] = {}
+    est, lat = {"system": 0, "user": 0, "total": 0}, []
+    kept = dropped = covered = total = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(chunk) -> None:
+        nonlocal kept, dropped, covered, total
+        prompt = build_prompt(key, bpm, chunk.onsets, "", {"before": chunk.before, "after": chunk.after}, style=style)
+        for k, v in token_report(prompt).items():
+            est[k] += v
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                text = await client.generate(prompt.user, config=prompt.config(CHAEBO_CONFIG), usage=usage)
+            except Exception as e:
+                print(f"  [{style}] chunk {chunk.index} 실패: {e}")
+                text = "[]"
+            lat.append(time.perf_counter() - t0)
+        notes = parse_chaebo_text(text)
+        good, bad = validate_chaebo(notes, chunk.times, key)
+        kept, dropped = kept + len(good), dropped + bad
+        covered += len({n["time"] for n in good})
+        total   += len(chunk.onsets)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(c) for c in chunks))
+    return {
+        "style": style, "chunks": len(chunks), "wall": time.perf_counter() - t0,
+        "est": est, "usage": usage, "lat": lat,
+        "kept": kept, "dropped": dropped, "coverage": covered / max(total, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--key", type=int, default=4)
+    ap.add_argument("--styles", nargs="+", default=list(PROMPT_STYLES), choices=PROMPT_STYLES)
+    ap.add_argument("--chunks", type=int, default=0, help="곡마다 앞에서부터 이 개수의 청크만 (0 = 전부)")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--model", default="gemini-2.0-flash")
+    ap.add_argument("--fake", action="store_true", help="실제 API 대신 모의 지연 클라이언트")
+    ap.add_argument("--sim", nargs=3, type=float, default=[0.3, 0.15, 6.0], metavar=("BASE", "PREFILL", "DECODE"),
+                    help="--fake 지연 모델: 기본 초, 입력 1k 토큰당 초, 출력 1k 토큰당 초")
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    fake = args.fake or not os.getenv("GOOGLE_API_KEY")
+    client = LLMClient(args.model, client=SimulatedClient(*args.sim) if fake else None,
+                       max_concurrency=args.concurrency, rate_per_sec=0)
+    files = args.files or sorted(glob.glob("uploads/*.mp3"))[:1]
+    print(f"model: {'simulated' if fake else args.model}, key: {args.key}, files: {len(files)}")
+
+    results: Dict[str, List[Dict[str, Any]]] = {s: [] for s in args.styles}
+    for path in files:
+        summary = run_analysis(path)
+        onsets  = sorted(({"time": round(o["time"], 4), "pitch": o.get("pitch"), "volume": o.get("volume")}
+                          for o in summary["onsets"]), key=lambda o: o["time"])
+        chunks  = plan_chunks(onsets, summary["bpm"])
+        if args.chunks:
+            chunks = chunks[:args.chunks]
+        for style in args.styles:
+            results[style].append(asyncio.run(
+                run_style(client, style, args.key, summary["bpm"], chunks, args.concurrency)))
+
+    head = ["style", "chunks", "est sys", "est user", "est total", "prompt tok", "cached", "out tok",
+            "lat p50", "lat avg", "wall", "kept", "dropped", "coverage"]
+    rows = []
+    for style, runs in results.items():
+        lat   = [x for r in runs for x in r["lat"]]
+        usage = lambda k: sum(r["usage"].get(k, 0) for r in runs)
+        kept, dropped = sum(r["kept"] for r in runs), sum(r["dropped"] for r in runs)
+        rows.append([
+            style, str(sum(r["chunks"] for r in runs)),
+            *(str(sum(r["est"][k] for r in runs)) for k in ("system", "user", "total")),
+            str(usage("prompt_tokens")), str(usage("cached_tokens")), str(usage("output_tokens")),
+            f"{statistics.median(lat):.2f}" if lat else "-", f"{statistics.mean(lat):.2f}" if lat else "-",
+            f"{sum(r['wall'] for r in runs):.1f}",
+            str(kept), f"{dropped / max(kept + dropped, 1):.1%}",
+            f"{statistics.mean(r['coverage'] for r in runs):.1%}",
+        ])
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(head)]
+    print("  ".join(h.ljust(w) for h, w in zip(head, widths)))
+    for r in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# backend/benchmarks/bench_slow_rate.py
+"""
+slow_rate 분석 방식 비교: time_stretch("stretch") vs hop 축소("hop").
+각 곡·배율마다 분석 시간과, stretch 결과를 기준으로 한 onset 일치율(precision/recall/F)을 출력한다.
+
+    cd backend
+    python benchmarks/bench_slow_rate.py                 # uploads/*.mp3, rate 0.5 0.75
+    python benchmarks/bench_slow_rate.py a.mp3 --rates 0.5 --tol 0.03 0.05
+"""
+import os, sys, glob, time, argparse, warnings
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_analysis import analyze_audio
+from cache import file_sha256
+
+
+def match_rates(ref: np.ndarray, est: np.ndarray, tol: float) -> Tuple[float, float, float]:
+    """ref/est onset 시각 배열 → (precision, recall, F). 각 점은 tol 이내에 짝이 있으면 일치."""
+    if len(ref) == 0 or len(est) == 0:
+        return 0.0, 0.0, 0.0
+    dist = np.abs(ref[:, None] - est[None, :])
+    recall    = float((dist.min(axis=1) <= tol).mean())
+    precision = float((dist.min(axis=0) <= tol).mean())
+    f = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f
+
+
+def timed(path: str, rate: float, method: str) -> Tuple[Dict, float]:
+    t0 = time.perf_counter()
+    res = analyze_audio(path, slow_rate=rate, max_onsets=10**9, method=method)
+    return res, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--rates", nargs="+", type=float, default=[0.5, 0.75])
+    ap.add_argument("--tol", nargs="+", type=float, default=[0.03, 0.06])
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    # 같은 내용의 파일은 한 번만
+    files: Dict[str, str] = {}
+    for p in args.files or sorted(glob.glob("uploads/*.mp3")):
+        files.setdefault(file_sha256(p), p)
+
+    # numba JIT 등 첫 호출 비용 제거
+    first = next(iter(files.values()))
+    for m in ("stretch", "hop"):
+        analyze_audio(first, slow_rate=args.rates[0], method=m)
+
+    rows: List[List[str]] = []
+    totals = {"stretch": 0.0, "hop": 0.0}
+    for path in files.values():
+        for rate in args.rates:
+            ref, t_ref = timed(path, rate, "stretch")
+            est, t_est = timed(path, rate, "hop")
+            totals["stretch"] += t_ref
+            totals["hop"]     += t_est
+            ta = np.array([o["time"] for o in ref["onsets"]])
+            tb = np.array([o["time"] for o in est["onsets"]])
+            row = [os.path.basename(path)[:12], f"{rate:g}",
+                   f"{t_ref:.2f}", f"{t_est:.2f}", f"{t_ref / t_est:.1f}x",
+                   str(len(ta)), str(len(tb))]
+            for tol in args.tol:
+                p, r, f = match_rates(ta, tb, tol)
+                row.append(f"{p:.2f}/{r:.2f}/{f:.2f}")
+            rows.append(row)
+
+    head = ["file", "rate", "stretch s", "hop s", "speedup", "n_ref", "n_hop"] + [f"P/R/F@{t*1000:g}ms" for t in args.tol]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(head)]
+    print("  ".join(h.ljust(w) for h, w in zip(head, widths)))
+    for r in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+    print(f"\ntotal: stretch {totals['stretch']:.2f}s, hop {totals['hop']:.2f}s "
+          f"({totals['stretch'] / max(totals['hop'], 1e-9):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
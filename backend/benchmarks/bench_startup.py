@@ -0,0 +1,123 @@
+# backend/benchmarks/bench_startup.py
+"""
+서버 기동 시간 / 첫 분석 지연 측정.
+
+매 측정을 새 파이썬 프로세스(빈 임시 작업 폴더)에서 돌린다:
+  1) import main 시간 (여러 번 중앙값) + -X importtime 기준 누적 시간이 큰 모듈, 조회 API 가 올린 무거운 모듈
+  2) 프로세스 시작(import main) → 앱 기동(lifespan) → 첫 GET /api/songs 응답까지의 시간
+  3) 기동 --delay 초 뒤 첫 분석과 두 번째 분석 시간 — ANALYSIS_PREWARM=0 / 1 비교
+     (예열이 꺼져 있으면 첫 분석이 워커 기동 + numba JIT 를 치른다)
+
+    cd backend
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --delay 3 --duration 60
+"""
+import os, re, sys, json, time, shutil, asyncio, argparse, tempfile, subprocess, statistics
+from typing import Any, Dict, List
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+HEAVY = ("librosa", "numba", "scipy", "sklearn", "soundfile", "soxr", "google.genai", "requests")
+
+
+# ────────────── 자식 프로세스 ─────────────
+def child_import() -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    import main  # noqa: F401
+    return {"import": time.perf_counter() - t0, "heavy": [m for m in HEAVY if m in sys.modules]}
+
+
+async def child_serve(delay: float, duration: float) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    import main
+    import httpx
+    from bench_pipeline import synth_song
+
+    out: Dict[str, Any] = {"import": time.perf_counter() - t0}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.get("/api/songs")
+        out["first_request"] = time.perf_counter() - t0
+        out["read_heavy"] = [m for m in HEAVY if m in sys.modules]
+        r.raise_for_status()
+        clips = [os.path.abspath(f"clip{i}.wav") for i in range(2)]
+        for i, clip in enumerate(clips):
+            synth_song(clip, duration, 3.0, seed=i)
+        await asyncio.sleep(delay)
+        for i, clip in enumerate(clips):
+            t1 = time.perf_counter()
+            await main.analyze_audio_cached(clip)
+            out[f"analysis_{i + 1}"] = time.perf_counter() - t1
+    return out
+
+
+def run_child(mode: str, env: Dict[str, str], args: argparse.Namespace) -> Dict[str, Any]:
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", mode,
+               "--delay", str(args.delay), "--duration", str(args.duration)]
+        res = subprocess.run(cmd, cwd=work, env={**os.environ, **env}, capture_output=True, text=True)
+        if res.returncode != 0:
+            raise RuntimeError(res.stderr[-2000:])
+        return json.loads(res.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def import_profile(top: int) -> List[Any]:
+    """-X importtime 의 누적 시간 상위 최상위 모듈 (ms)"""
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        code = f"import sys; sys.path.insert(0, {BACKEND!r}); import main"
+        res  = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=work, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    rows = []
+    for line in res.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if m and len(m.group(2)) <= 3:   # main 과 main 이 직접 import 한 모듈만
+            rows.append((m.group(3), int(m.group(1)) / 1000))
+    return sorted(rows, key=lambda r: -r[1])[:top]
+
+
+# ────────────── 출력 ─────────────
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=3, help="import 시간 반복 횟수")
+    ap.add_argument("--delay", type=float, default=10.0, help="기동 후 첫 분석까지 기다리는 초")
+    ap.add_argument("--duration", type=float, default=30.0, help="분석할 합성 곡 길이 (초)")
+    ap.add_argument("--top", type=int, default=8)
+    ap.add_argument("--child", choices=("import", "serve"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        res = child_import() if args.child == "import" else asyncio.run(child_serve(args.delay, args.duration))
+        print(json.dumps(res))
+        return
+
+    imports = [run_child("import", {}, args) for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(r['import'] for r in imports):.2f}s "
+          f"(min {min(r['import'] for r in imports):.2f}s, {args.runs} runs)")
+    print(f"heavy modules after import: {imports[0]['heavy'] or 'none'}")
+    print("\n[import profile, cumulative ms]")
+    for name, ms in import_profile(args.top):
+        print(f"  {name:<28} {ms:8.1f}")
+
+    print(f"\n[serve: first analysis {args.delay:g}s after startup, {args.duration:g}s clip]")
+    head = ["prewarm", "import s", "first GET s", "heavy after reads", "analysis #1 s", "analysis #2 s"]
+    rows = []
+    for prewarm in ("0", "1"):
+        r = run_child("serve", {"ANALYSIS_PREWARM": prewarm, "LOG_LEVEL": "WARNING"}, args)
+        rows.append([prewarm, f"{r['import']:.2f}", f"{r['first_request']:.2f}",
+                     ",".join(r["read_heavy"]) or "none", f"{r['analysis_1']:.2f}", f"{r['analysis_2']:.2f}"])
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(head)]
+    print("  ".join(h.ljust(w) for h, w in zip(head, widths)))
+    for r in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# backend/cache.py
+"""
+디스크 영속 + 메모리 LRU 2단 캐시.
+값은 JSON 으로 직렬화해 `root/<namespace>/<name>.json` 에 저장하고,
+전체 크기가 max_bytes 를 넘으면 가장 오래 안 쓴 파일부터 지운다.
+파일 atime 은 마지막 사용 시각(LRU), mtime 은 저장 시각(TTL)으로 쓴다.
+"""
+import os, json, time, hashlib, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from telemetry import Counter, span
+
+CACHE_LOOKUPS = Counter("disk_cache_lookups_total", "DiskLRUCache lookups", ["cache", "result"])
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """파일 내용의 sha256 hex digest"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+_hash_memo: Dict[str, Tuple[float, int, str]] = {}
+_hash_lock = threading.Lock()
+
+def cached_file_sha256(path: str) -> str:
+    """(mtime, size) 가 그대로면 이전 해시를 재사용한다."""
+    st = os.stat(path)
+    with _hash_lock:
+        memo = _hash_memo.get(path)
+        if memo and memo[0] == st.st_mtime and memo[1] == st.st_size:
+            return memo[2]
+    digest = file_sha256(path)
+    remember_file_sha256(path, digest, st)
+    return digest
+
+
+def remember_file_sha256(path: str, digest: str, st: Optional[os.stat_result] = None) -> None:
+    """이미 계산한 해시(예: 업로드하면서 계산)를 다시 읽지 않도록 기록"""
+    st = st or os.stat(path)
+    with _hash_lock:
+        _hash_memo[path] = (st.st_mtime, st.st_size, digest)
+
+
+class DiskLRUCache:
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 256 << 20,
+        mem_items: int = 64,
+        ttl: Optional[float] = None,
+    ):
+        self.root      = root
+        self.name      = os.path.basename(os.path.normpath(root)) or "cache"
+        self.max_bytes = max_bytes
+        self.mem_items = mem_items
+        self.ttl       = ttl
+        self.hits      = 0
+        self.misses    = 0
+        # (namespace, name) → (저장 시각, 값)
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._scan())
+
+    # ── 내부 유틸 ──
+    def _path(self, namespace: str, name: str) -> str:
+        return os.path.join(self.root, namespace, f"{name}.json")
+
+    def _scan(self):
+        """(path, size, 마지막 사용 시각) 목록"""
+        for dirpath, _, files in os.walk(self.root):
+            for fn in files:
+                if not fn.endswith(".json"):
+                    continue
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                yield p, st.st_size, st.st_atime
+
+    def _remember(self, k: Tuple[str, str], value: Tuple[float, Any]) -> None:
+        self._mem[k] = value
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+
+    def _evict(self) -> None:
+        if self._total <= self.max_bytes:
+            return
+        for p, size, _ in sorted(self._scan(), key=lambda e: e[2]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                continue
+            self._total -= size
+            ns  = os.path.basename(os.path.dirname(p))
+            self._mem.pop((ns, os.path.basename(p)[:-5]), None)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    # ── 공개 API ──
+    def get(self, namespace: str, name: str) -> Optional[Any]:
+        k = (namespace, name)
+        with self._lock:
+            if k in self._mem and not self._expired(self._mem[k][0]):
+                self._mem.move_to_end(k)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="memory")
+                return self._mem[k][1]
+        p = self._path(namespace, name)
+        try:
+            with span(f"{self.name}.read"):
+                created = os.stat(p).st_mtime
+                if self._expired(created):
+                    self.delete(namespace, name)
+                    raise FileNotFoundError(p)
+                with open(p, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+                os.utime(p, (time.time(), created))  # LRU 순서만 갱신 (저장 시각 유지)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return None
+        with self._lock:
+            self._remember(k, (created, value))
+            self.hits += 1
+        CACHE_LOOKUPS.inc(cache=self.name, result="disk")
+        return value
+
+    def put(self, namespace: str, name: str, value: Any) -> None:
+        p   = self._path(namespace, name)
+        tmp = f"{p}.tmp"
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock, span(f"{self.name}.write"):
+            old = os.path.getsize(p) if os.path.isfile(p) else 0
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, p)
+            self._total += len(data) - old
+            self._remember((namespace, name), (time.time(), value))
+            self._evict()
+
+    def delete(self, namespace: str, name: str) -> None:
+        p = self._path(namespace, name)
+        with self._lock:
+            self._mem.pop((namespace, name), None)
+            try:
+                size = os.path.getsize(p)
+                os.remove(p)
+            except FileNotFoundError:
+                return
+            self._total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes":    self._total,
+            "max_bytes": self.max_bytes,
+        }
+
+    def invalidate(self, namespace: str) -> None:
+        """namespace(예: 오디오 해시) 아래 항목을 모두 제거"""
+        d = os.path.join(self.root, namespace)
+        with self._lock:
+            for k in [k for k in self._mem if k[0] == namespace]:
+                self._mem.pop(k)
+            if not os.path.isdir(d):
+                return
+            for fn in os.listdir(d):
+                p = os.path.join(d, fn)
+                self._total -= os.path.getsize(p)
+                os.remove(p)
+            os.rmdir(d)
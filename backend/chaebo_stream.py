@@ -0,0 +1,101 @@
+# backend/chaebo_stream.py
+"""
+Gemini chaebo 응답 처리.
+
+- CHAEBO_SCHEMA: get_prompt 의 노트 모양(short/long/change_beat)을 강제하는 응답 스키마
+- ChaeboStreamParser: 스트리밍 텍스트를 받는 대로 최상위 배열 안의 `{...}` 노트를 하나씩 꺼낸다.
+  코드 펜스·앞뒤 설명문은 무시하고, 응답이 중간에 끊겨도 완성된 노트는 모두 남는다.
+"""
+import re, json
+from typing import Any, Dict, List
+
+NOTE_TYPES = ("short", "long", "change_beat")
+
+CHAEBO_SCHEMA: Dict[str, Any] = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "time":     {"type": "NUMBER"},
+            "type":     {"type": "STRING", "enum": list(NOTE_TYPES)},
+            "position": {"type": "INTEGER"},
+            "end":      {"type": "NUMBER"},
+            "beat":     {"type": "NUMBER"},
+        },
+        "required": ["time", "type"],
+        "property_ordering": ["time", "type", "position", "end", "beat"],
+    },
+}
+
+# LLMClient.generate/stream 의 config 로 그대로 넘긴다 (google-genai 는 dict 도 받는다)
+CHAEBO_CONFIG: Dict[str, Any] = {
+    "response_mime_type": "application/json",
+    "response_schema":    CHAEBO_SCHEMA,
+}
+
+
+_SPECIAL = re.compile(r'[\[\]{}"\\]')
+
+
+class ChaeboStreamParser:
+    def __init__(self):
+        self._carry: List[str] = []  # 이전 조각에서 이어지는 미완성 객체 텍스트
+        self._started = False        # 최상위 '[' 를 만났는지
+        self._depth   = 0            # 객체 중첩 깊이
+        self._in_str  = False
+        self._escape  = False        # 직전 조각이 문자열 안의 '\' 로 끝났는지
+        self.closed   = False        # 최상위 ']' 까지 받았는지 (= 잘리지 않음)
+        self.skipped  = 0            # JSON 으로 읽지 못한 객체 수
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """새로 완성된 노트 목록. 구조 문자 사이의 일반 텍스트는 건너뛰고 객체 단위로 잘라 읽는다."""
+        notes: List[Dict[str, Any]] = []
+        obj_start = 0 if self._depth else None
+        skip = 0 if self._escape else -1   # 이스케이프된 문자 위치
+        self._escape = False
+        for m in _SPECIAL.finditer(text):
+            pos, ch = m.start(), m.group()
+            if pos == skip:
+                continue
+            if self.closed:
+                break
+            if not self._started:
+                self._started = ch == "["
+                continue
+            if self._in_str:
+                if ch == "\\":
+                    skip = pos + 1
+                    self._escape = skip == len(text)
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth, obj_start = 1, pos
+                elif ch == "]":
+                    self.closed = True
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._carry) + text[obj_start:pos + 1]
+                    self._carry, obj_start = [], None
+                    try:
+                        note = json.loads(raw)
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+                        continue
+                    if isinstance(note, dict):
+                        notes.append(note)
+        if self._depth and obj_start is not None:
+            self._carry.append(text[obj_start:])
+        return notes
+
+
+def parse_chaebo_text(text: str) -> List[Dict[str, Any]]:
+    """전체 응답 텍스트 → 노트 목록 (펜스/설명문/잘림에 관대)"""
+    return ChaeboStreamParser().feed(text)
@@ -0,0 +1,235 @@
+# backend/chart_engine.py
+"""
+LLM 없이 onset/pitch/volume 으로 바로 chaebo 를 만드는 결정적(deterministic) 패턴 엔진.
+get_prompt 의 규칙을 그대로 따른다.
+
+- 노트 시각은 입력 onset 시각(소수 4자리)만 쓴다
+- pitch 가 바뀌면 레인도 바꾼다 (contour 패턴)
+- 강한 음(volume 순위 상위)은 2~3 레인 동시타 (최대 3 레인).
+  volume 이 모두 같거나 상한(1.0)에 붙어 순위를 가릴 수 없으면 동시타를 만들지 않는다
+- 트릴 / 계단 / 축 / 러닝맨 패턴을 2 초 이내 구간마다 바꿔 쓴다
+- 같은 레인 단타는 5 번 넘게 연속되지 않는다
+- short 노트만 생성
+
+같은 입력이면 항상 같은 차트가 나오도록 난수 시드는 입력 데이터에서 만든다.
+"""
+import hashlib, random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+PATTERNS      = ("contour", "trill", "stair", "axis", "running_man")
+MAX_PHRASE_S  = 2.0     # 한 패턴을 이어가는 최대 시간
+MAX_REPEAT    = 5       # 같은 레인 연속 단타 최대 수
+MAX_CHORD     = 3       # 동시타 최대 레인 수
+ACCENT_PCT    = 15      # volume 상위 15% → 2 레인 동시타
+STRONG_PCT    = 4       # volume 상위 4% → 3 레인 동시타
+MIN_JACK_GAP  = 0.06    # 구간 이어 붙일 때 경계 양쪽 같은 레인 노트 최소 간격(초)
+
+
+def _seed(key: int, onsets: List[Dict[str, Any]]) -> int:
+    h = hashlib.sha256(str(key).encode())
+    for o in onsets:
+        h.update(f"{o['time']:.4f},{o.get('pitch')};".encode())
+    return int.from_bytes(h.digest()[:8], "big")
+
+
+def _accent_sizes(vols: np.ndarray, key: int) -> np.ndarray:
+    """
+    onset 별 동시타 레인 수 (1 = 단타). volume 순위 상위 ACCENT_PCT / STRONG_PCT % 만 고른다.
+    경계 순위의 값보다 '큰' 것만 뽑으므로 같은 값이 몰린 경우(상한 1.0 포화 등)는 동시타가 되지 않는다.
+    """
+    sizes = np.ones(len(vols), dtype=np.int64)
+    n = len(vols)
+    if n == 0 or key < 2 or np.ptp(vols) <= 0:
+        return sizes
+    ranked = np.sort(vols)
+    for pct, size in ((ACCENT_PCT, 2), (STRONG_PCT, min(MAX_CHORD, key - 1))):
+        top = n * pct // 100
+        if top <= 0 or size < 2:
+            continue
+        sizes[vols > ranked[n - top - 1]] = size
+    return sizes
+
+
+def _phrases(times: np.ndarray, bpm: float) -> List[slice]:
+    """MAX_PHRASE_S 를 넘거나 2 박 이상 쉬는 곳에서 구간을 나눈다."""
+    gap = 2 * 60.0 / bpm if bpm and bpm > 0 else 1.0
+    out, start = [], 0
+    for i in range(1, len(times)):
+        if times[i] - times[start] > MAX_PHRASE_S or times[i] - times[i - 1] > gap:
+            out.append(slice(start, i))
+            start = i
+    if len(times):
+        out.append(slice(start, len(times)))
+    return out
+
+
+class _LaneWalker:
+    """패턴별 다음 레인 생성기 (1-based 레인)"""
+
+    def __init__(self, key: int, rng: random.Random):
+        self.key  = key
+        self.rng  = rng
+        self.lane = (key + 1) // 2
+
+    def start(self, pattern: str) -> None:
+        k, rng = self.key, self.rng
+        self.pattern = pattern
+        self.step    = 0
+        if pattern == "trill":
+            a = rng.randint(1, k)
+            b = rng.choice([l for l in range(1, k + 1) if l != a])
+            self.pair = (a, b)
+        elif pattern == "stair":
+            self.dir = rng.choice((-1, 1))
+        elif pattern == "axis":
+            self.center = rng.randint(2, k - 1) if k > 2 else 1
+        elif pattern == "running_man":
+            self.anchor = rng.choice((1, k))
+            self.others = list(range(2, k + 1)) if self.anchor == 1 else list(range(1, k))
+            self.dir    = 1 if self.anchor == 1 else -1
+
+    def next(self, dpitch: Optional[int]) -> int:
+        k, rng, step = self.key, self.rng, self.step
+        self.step += 1
+        p = self.pattern
+        if p == "trill":
+            lane = self.pair[step % 2]
+        elif p == "stair":
+            lane = self.lane + self.dir
+            if not 1 <= lane <= k:
+                self.dir = -self.dir
+                lane = self.lane + self.dir
+        elif p == "axis":
+            if step % 2 == 0:
+                lane = self.center
+            else:
+                lane = rng.choice([l for l in range(1, k + 1) if l != self.center])
+        elif p == "running_man":
+            if step % 2 == 0:
+                lane = self.anchor
+            else:
+                i = (step // 2) % len(self.others)
+                lane = self.others[i] if self.dir > 0 else self.others[::-1][i]
+        else:  # contour: pitch 가 오르면 오른쪽, 내리면 왼쪽, 크게 뛰면 2 칸
+            if dpitch is None:
+                lane = rng.randint(1, k)
+            elif dpitch == 0:
+                lane = self.lane
+            else:
+                move = 1 if abs(dpitch) <= 4 else 2
+                lane = self.lane + (move if dpitch > 0 else -move)
+                if not 1 <= lane <= k:   # 가장자리에서는 반대쪽으로 튕긴다
+                    lane = self.lane - (move if dpitch > 0 else -move)
+                lane = min(k, max(1, lane))
+        self.lane = lane
+        return lane
+
+
+def _chord_lanes(main: int, size: int, key: int, rng: random.Random) -> List[int]:
+    """main 을 포함한 size 개 레인 (인접 레인 우선, 없으면 임의)"""
+    lanes = [main]
+    candidates = [l for l in (main - 1, main + 1, main - 2, main + 2) if 1 <= l <= key]
+    rng.shuffle(candidates)
+    for l in candidates + [l for l in range(1, key + 1) if l not in candidates]:
+        if len(lanes) >= size:
+            break
+        if l not in lanes:
+            lanes.append(l)
+    return sorted(lanes)
+
+
+def generate_chaebo(key: int, bpm: float, onsets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """onset 리스트 → {key}Key chaebo (short 노트 리스트)"""
+    onsets = sorted((o for o in onsets if "time" in o), key=lambda o: o["time"])
+    if not onsets:
+        return []
+    rng    = random.Random(_seed(key, onsets))
+    times  = np.round(np.array([o["time"] for o in onsets], dtype=np.float64), 4)
+    vols   = np.array([o.get("volume") or 0.0 for o in onsets], dtype=np.float64)
+    pitch  = [o.get("pitch") for o in onsets]
+    sizes  = _accent_sizes(vols, key)
+
+    walker  = _LaneWalker(key, rng)
+    chaebo: List[Dict[str, Any]] = []
+    prev_pattern = None
+    run_lane, run_len = 0, 0
+    for ph in _phrases(times, bpm):
+        # 음높이 변화가 많은 구간은 contour 를 우선, 아니면 직전과 다른 패턴
+        seg_pitch = [p for p in pitch[ph] if p is not None]
+        if len(set(seg_pitch)) >= 3 and prev_pattern != "contour" and rng.random() < 0.5:
+            pattern = "contour"
+        else:
+            pattern = rng.choice([p for p in PATTERNS if p != prev_pattern])
+        walker.start(pattern)
+        prev_pattern = pattern
+
+        for i in range(ph.start, ph.stop):
+            dp = None
+            if i > 0 and pitch[i] is not None and pitch[i - 1] is not None:
+                dp = pitch[i] - pitch[i - 1]
+            lane = walker.next(dp)
+
+            # 같은 레인 단타가 MAX_REPEAT 를 넘으면 옆 레인으로
+            run_len = run_len + 1 if lane == run_lane else 1
+            if run_len > MAX_REPEAT:
+                lane = lane + 1 if lane < key else lane - 1
+                walker.lane, run_len = lane, 1
+            run_lane = lane
+
+            size = int(sizes[i])
+            t = float(times[i])
+            for l in _chord_lanes(lane, size, key, rng) if size > 1 else [lane]:
+                chaebo.append({"time": t, "type": "short", "position": l})
+    return chaebo
+
+
+def splice_section(
+    old: List[Dict[str, Any]],
+    new: List[Dict[str, Any]],
+    t0: float,
+    t1: float,
+    key: int,
+    min_gap: float = MIN_JACK_GAP,
+) -> List[Dict[str, Any]]:
+    """
+    old 의 [t0, t1) 구간을 new 로 바꾼다.
+    경계 바로 바깥 노트(또는 구간 안으로 이어지는 롱노트)와 같은 레인에서 min_gap 보다 붙는
+    새 노트는 비어 있는 가장 가까운 레인으로 옮기고, 옮길 곳이 없으면 버린다.
+    """
+    kept  = [n for n in old if not t0 <= n["time"] < t1]
+    new   = sorted((n for n in new if t0 <= n["time"] < t1), key=lambda n: n["time"])
+    edges = [n for n in kept
+             if t0 - min_gap < n["time"] < t1 + min_gap or (n.get("end") or 0) > t0 and n["time"] < t1]
+
+    def blocked(t: float) -> set:
+        return {n.get("position") for n in edges
+                if abs(n["time"] - t) < min_gap or n["time"] <= t <= (n.get("end") or -1)}
+
+    has_long = any(e.get("end") for e in edges)
+    spliced: List[Dict[str, Any]] = []
+    for n in new:
+        t, lane = n["time"], n.get("position")
+        near_edge = t - t0 < min_gap or t1 - t < min_gap
+        if lane is None or not (near_edge or has_long):
+            spliced.append(n)
+            continue
+        taken = blocked(t) | {m.get("position") for m in spliced if m["time"] == t}
+        if lane in taken:
+            free = [l for l in range(1, key + 1) if l not in taken]
+            if not free:
+                continue
+            n = {**n, "position": min(free, key=lambda l: abs(l - lane))}
+        spliced.append(n)
+    return sorted(kept + spliced, key=lambda n: n["time"])
+
+
+def generate_chart(key: int, summary: Dict[str, Any]) -> Dict[str, Any]:
+    """analyze_audio 결과 → build_chart_with_chunks 와 같은 모양의 차트 조각"""
+    return {
+        f"{key}key": {
+            "maxscore": {"score": 0, "player": "AAA"},
+            "chaebo":   generate_chaebo(key, summary["bpm"], summary["onsets"]),
+        }
+    }
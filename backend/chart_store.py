@@ -0,0 +1,253 @@
+# backend/chart_store.py
+"""
+채보 저장소 + /api/chart 응답 캐시.
+
+저장 형식 (charts/<song_id>.chart, little-endian)
+    header : b"HCHT" | version u8 | 모드 수 u8
+    모드별 : meta 길이 u32 | meta JSON | flags u8 | 노트 수 u32
+             time f64[n] | type u8[n] | position u8[n] | (end f64[n]) | (beat f64[n])
+    meta 는 {"name": "4key", "maxscore": {...}} 이고, 열(column)로 정확히 담을 수 없는
+    노트(모르는 type/필드 등)가 있는 모드는 meta["chaebo"] 에 원래 리스트를 그대로 둔다.
+
+예전 charts/<song_id>.json 은 처음 읽을 때 .chart 로 변환해 두고(원본은 유지),
+새로 저장할 때는 .chart 만 남긴다. 프론트엔드용 JSON 모양(types/chart.ts)은 그대로 만들어 준다.
+
+응답은 (song_id, format) 별로 인코딩·압축(gzip, brotli 가 있으면 br)까지 끝낸 바이트를
+메모리 LRU 에 두고, 파일이 바뀌면(mtime/size) 다시 만든다.
+"""
+import os, io, gzip, json, struct, hashlib, threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from telemetry import Counter, span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAGIC    = b"HCHT"
+VERSION  = 1
+TYPES    = ("short", "long", "change_beat")
+_TYPE_ID = {t: i for i, t in enumerate(TYPES)}
+_FIELDS  = {"time", "type", "position", "end", "beat"}
+HAS_END, HAS_BEAT = 1, 2
+
+FORMATS = {
+    "json": "application/json",
+    "bin":  "application/vnd.hci-chart",
+}
+
+CHART_RESPONSES = Counter("chart_response_cache_total", "ChartStore response cache lookups", ["result"])
+
+
+# ────────────── 열 형식 변환 ─────────────
+def _number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _columnar_ok(chaebo: List[Dict[str, Any]]) -> bool:
+    for n in chaebo:
+        if not isinstance(n, dict) or not _FIELDS.issuperset(n) or n.get("type") not in _TYPE_ID:
+            return False
+        if not _number(n.get("time")) or not isinstance(n.get("position"), int) or isinstance(n["position"], bool):
+            return False
+        if not 0 <= n["position"] <= 255:
+            return False
+        if any(f in n and not _number(n[f]) for f in ("end", "beat")):
+            return False
+    return True
+
+
+def _optional_column(chaebo: List[Dict[str, Any]], field: str) -> Optional[np.ndarray]:
+    if not any(field in n for n in chaebo):
+        return None
+    return np.array([n.get(field, np.nan) for n in chaebo], dtype="<f8")
+
+
+def encode_chart(chart: Dict[str, Any]) -> bytes:
+    """JSON 모양 차트 → 열 형식 바이너리"""
+    out = io.BytesIO()
+    out.write(struct.pack("<4sBB", MAGIC, VERSION, len(chart)))
+    for name, mode in chart.items():
+        chaebo = mode.get("chaebo", [])
+        meta   = {k: v for k, v in mode.items() if k != "chaebo"}
+        meta["name"] = name
+        columnar = _columnar_ok(chaebo)
+        if not columnar:
+            meta["chaebo"] = chaebo
+            chaebo = []
+        end, beat = _optional_column(chaebo, "end"), _optional_column(chaebo, "beat")
+        flags = (HAS_END if end is not None else 0) | (HAS_BEAT if beat is not None else 0)
+        meta_b = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        out.write(struct.pack("<I", len(meta_b)))
+        out.write(meta_b)
+        out.write(struct.pack("<BI", flags, len(chaebo)))
+        out.write(np.array([n["time"] for n in chaebo], dtype="<f8").tobytes())
+        out.write(np.array([_TYPE_ID[n["type"]] for n in chaebo], dtype="u1").tobytes())
+        out.write(np.array([n["position"] for n in chaebo], dtype="u1").tobytes())
+        for col in (end, beat):
+            if col is not None:
+                out.write(col.tobytes())
+    return out.getvalue()
+
+
+def decode_chart(data: bytes) -> Dict[str, Any]:
+    """열 형식 바이너리 → JSON 모양 차트"""
+    magic, version, n_modes = struct.unpack_from("<4sBB", data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("chart 파일 형식이 아닙니다.")
+    pos, chart = 6, {}
+    for _ in range(n_modes):
+        (meta_len,) = struct.unpack_from("<I", data, pos); pos += 4
+        meta = json.loads(data[pos:pos + meta_len]); pos += meta_len
+        flags, n = struct.unpack_from("<BI", data, pos); pos += 5
+
+        def column(dtype: str) -> np.ndarray:
+            nonlocal pos
+            arr = np.frombuffer(data, dtype=dtype, count=n, offset=pos)
+            pos += arr.nbytes
+            return arr
+
+        times, types, lanes = column("<f8").tolist(), column("u1").tolist(), column("u1").tolist()
+        end  = column("<f8").tolist() if flags & HAS_END else None
+        beat = column("<f8").tolist() if flags & HAS_BEAT else None
+        name   = meta.pop("name")
+        chaebo = meta.pop("chaebo", None)
+        if chaebo is None:
+            chaebo = []
+            for i in range(n):
+                note = {"time": times[i], "type": TYPES[types[i]], "position": lanes[i]}
+                if end is not None and end[i] == end[i]:     # NaN 이면 필드 없음
+                    note["end"] = end[i]
+                if beat is not None and beat[i] == beat[i]:
+                    note["beat"] = beat[i]
+                chaebo.append(note)
+        chart[name] = {**meta, "chaebo": chaebo}
+    return chart
+
+
+# ────────────── 저장소 ─────────────
+class EncodedChart:
+    """한 (song_id, format) 에 대해 미리 만들어 둔 응답 바이트"""
+
+    def __init__(self, body: bytes, media_type: str, stamp: Tuple[float, int]):
+        self.media_type = media_type
+        self.stamp      = stamp
+        self.etag       = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        self.bodies["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=5)
+
+    def pick(self, accept_encoding: str) -> Tuple[str, bytes]:
+        """Accept-Encoding 에 맞는 가장 작은 본문"""
+        accepted = {e.split(";")[0].strip().lower() for e in accept_encoding.split(",")
+                    if not e.strip().endswith(";q=0")}
+        best = ("identity", self.bodies["identity"])
+        for enc in ("br", "gzip"):
+            if enc in accepted and enc in self.bodies and len(self.bodies[enc]) < len(best[1]):
+                best = (enc, self.bodies[enc])
+        return best
+
+
+class ChartStore:
+    def __init__(self, root: str, mem_items: int = 128):
+        self.root      = root
+        self.mem_items = mem_items
+        self._mem: "OrderedDict[Tuple[str, str], EncodedChart]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _bin_path(self, song_id: str) -> str:
+        return os.path.join(self.root, f"{song_id}.chart")
+
+    def _json_path(self, song_id: str) -> str:
+        return os.path.join(self.root, f"{song_id}.json")
+
+    def exists(self, song_id: str) -> bool:
+        return os.path.isfile(self._bin_path(song_id)) or os.path.isfile(self._json_path(song_id))
+
+    def _forget(self, song_id: str) -> None:
+        with self._lock:
+            for k in [k for k in self._mem if k[0] == song_id]:
+                self._mem.pop(k)
+
+    def _read_bin(self, song_id: str) -> bytes:
+        """.chart 바이트. 예전 .json 만 있으면 변환해 .chart 를 만든다."""
+        path = self._bin_path(song_id)
+        if not os.path.isfile(path):
+            with open(self._json_path(song_id), "r", encoding="utf-8") as f:
+                self._write(path, encode_chart(json.load(f)))
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        # 서버와 일괄 처리 스크립트(rechart.py)가 같은 곡을 동시에 써도 임시 파일이 겹치지 않게
+        # 쓰는 쪽마다 이름을 따로 두고, 내용을 디스크에 내린 뒤 한 번에 교체한다
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # ── 공개 API ──
+    def load(self, song_id: str) -> Dict[str, Any]:
+        """JSON 모양 차트. 없으면 FileNotFoundError."""
+        with span("chart_store.load"):
+            return decode_chart(self._read_bin(song_id))
+
+    def save(self, song_id: str, chart: Dict[str, Any]) -> None:
+        with span("chart_store.save"):
+            self._write(self._bin_path(song_id), encode_chart(chart))
+        legacy = self._json_path(song_id)
+        if os.path.isfile(legacy):   # 이제 낡은 사본이므로 제거
+            os.remove(legacy)
+        self._forget(song_id)
+
+    def delete(self, song_id: str) -> None:
+        for p in (self._bin_path(song_id), self._json_path(song_id)):
+            if os.path.isfile(p):
+                os.remove(p)
+        self._forget(song_id)
+
+    def response(self, song_id: str, fmt: str = "json") -> EncodedChart:
+        """응답 바이트 (LRU). 다른 프로세스가 파일을 바꿨으면 다시 만든다."""
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown chart format: {fmt}")
+        k = (song_id, fmt)
+        stamp = None
+        if os.path.isfile(self._bin_path(song_id)):
+            st = os.stat(self._bin_path(song_id))
+            stamp = (st.st_mtime, st.st_size)
+        with self._lock:
+            entry = self._mem.get(k)
+            if entry is not None and stamp is not None and entry.stamp == stamp:
+                self._mem.move_to_end(k)
+                CHART_RESPONSES.inc(result="hit")
+                return entry
+
+        CHART_RESPONSES.inc(result="miss")
+        with span("chart_store.encode", fmt=fmt):
+            data = self._read_bin(song_id)
+            st   = os.stat(self._bin_path(song_id))
+            if fmt == "bin":
+                body = data
+            else:
+                body = json.dumps(decode_chart(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entry = EncodedChart(body, FORMATS[fmt], (st.st_mtime, st.st_size))
+        with self._lock:
+            self._mem[k] = entry
+            self._mem.move_to_end(k)
+            while len(self._mem) > self.mem_items:
+                self._mem.popitem(last=False)
+        return entry
@@ -0,0 +1,87 @@
+# backend/chart_summary.py
+"""
+곡 선택 화면용 차트 요약.
+
+차트를 저장할 때마다 Key 모드별로 노트 수 / 평균·최대 NPS / 동시치기 비율 / 대략적인 레벨 /
+NPS 곡선(구간별 노트 밀도)을 계산해 SongStore 인덱스(chart_stats)에 넣는다.
+곡 목록은 이 값만 읽으므로 전체 차트를 내려받아 훑을 필요가 없다.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+NPS_WINDOW  = float(os.getenv("NPS_WINDOW", "1.0"))   # 최대 NPS 를 재는 구간 길이 (초)
+CURVE_BINS  = int(os.getenv("NPS_CURVE_BINS", "24"))  # NPS 곡선 점 개수
+LEVEL_MAX   = 15
+PLAYABLE    = ("short", "long")                       # change_beat 같은 연출 노트는 세지 않는다
+
+
+def note_times(chaebo: List[Dict[str, Any]]) -> np.ndarray:
+    """플레이어가 치는 노트의 시각 (정렬됨)"""
+    t = np.fromiter((n["time"] for n in chaebo if n.get("type", "short") in PLAYABLE),
+                    dtype=np.float64)
+    t.sort()
+    return t
+
+
+def peak_nps(times: np.ndarray, window: float = NPS_WINDOW) -> float:
+    """
+    정렬된 시각에서 길이 window 인 구간 [t, t + window) 에 든 노트 수의 최댓값 / window.
+    구간 시작을 각 노트 시각에 두면 최댓값을 놓치지 않으므로 searchsorted 한 번으로 끝난다.
+    """
+    if len(times) == 0:
+        return 0.0
+    counts = np.searchsorted(times, times + window, side="left") - np.arange(len(times))
+    return float(counts.max()) / window
+
+
+def nps_curve(times: np.ndarray, duration: float, bins: int = CURVE_BINS) -> List[float]:
+    """곡을 bins 개 구간으로 나눈 구간별 NPS (소수 첫째 자리)"""
+    if duration <= 0 or bins <= 0:
+        return []
+    counts, _ = np.histogram(times, bins=bins, range=(0.0, duration))
+    return np.round(counts / (duration / bins), 1).tolist()
+
+
+def chord_ratio(times: np.ndarray) -> float:
+    """다른 노트와 같은 시각에 있는(동시치기) 노트의 비율"""
+    if len(times) == 0:
+        return 0.0
+    _, counts = np.unique(times, return_counts=True)
+    return float(counts[counts > 1].sum()) / len(times)
+
+
+def estimate_level(avg: float, peak: float, chords: float, key: int) -> int:
+    """
+    1 ~ LEVEL_MAX 의 대략적인 난이도. 평균 밀도를 주로, 순간 최대 밀도와 동시치기를 보태고
+    레인이 많을수록 조금 올린다. 정렬/필터용 어림값이다.
+    """
+    score = 0.9 * avg + 0.45 * peak + 3.0 * chords + 0.5 * (key - 4)
+    return int(np.clip(round(score), 1, LEVEL_MAX))
+
+
+def summarize_mode(times: np.ndarray, key: int, duration: float) -> Dict[str, Any]:
+    avg    = len(times) / duration if duration > 0 else 0.0
+    peak   = peak_nps(times)
+    chords = chord_ratio(times)
+    return {
+        "notes":       int(len(times)),
+        "avg_nps":     round(avg, 2),
+        "peak_nps":    round(peak, 2),
+        "chord_ratio": round(chords, 3),
+        "level":       estimate_level(avg, peak, chords, key),
+        "nps_curve":   nps_curve(times, duration),
+    }
+
+
+def summarize_chart(chart: Dict[str, Any], duration: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    {"4key": {...}, ...} 차트 → {4: 요약, ...}.
+    duration 을 모르면(예전 분석 캐시) 마지막 노트 시각을 곡 길이로 본다.
+    """
+    modes = {int(name[:-3]): note_times(mode.get("chaebo", []))
+             for name, mode in chart.items() if name.endswith("key") and name[:-3].isdigit()}
+    if not duration or duration <= 0:
+        duration = max((float(t[-1]) for t in modes.values() if len(t)), default=0.0)
+    return {key: summarize_mode(times, key, duration) for key, times in modes.items()}
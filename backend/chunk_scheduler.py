@@ -0,0 +1,133 @@
+# backend/chunk_scheduler.py
+"""
+LLM 청크 분할 계획.
+
+고정 300 개 단위 대신 청크 하나의 예상 토큰 수(입력 onset + 출력 노트)를 예산에 맞추고,
+BPM 으로 구한 마디(4 박) 경계에서 자른다. 마디 경계가 예산 범위 안에 없으면
+가장 긴 onset 간격(쉼)에서 자른다. 각 청크에는 앞뒤 onset 몇 개를 읽기 전용 문맥으로 붙여
+경계에서 패턴이 끊기지 않게 한다.
+
+LLM 응답은 그 청크 자신의 onset 시각에만 노트를 두었는지 validate_chaebo 로 검사한다.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from prompts import PROMPT_STYLE
+
+CHUNK_TOKEN_BUDGET  = int(os.getenv("LLM_CHUNK_TOKEN_BUDGET", "2400"))
+CHUNK_CONCURRENCY   = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+CONTEXT_ONSETS      = int(os.getenv("LLM_CHUNK_CONTEXT", "8"))
+MIN_CHUNK_ONSETS    = 16
+MAX_CHUNKS          = 32
+BEATS_PER_PHRASE    = 4
+
+# 토큰 추정 (JSON 숫자는 토큰화 효율이 낮다 — 실제 프롬프트로 잰 평균)
+# 고정 규칙(system)은 청크 수와 상관없이 한 번씩 붙으므로 예산에 넣지 않는다
+ONSET_PROMPT_TOKENS = 17 if PROMPT_STYLE == "legacy" else 7   # JSON {"time": .., "pitch": .., "volume": ..} / 12.3456,64,0.82
+NOTE_OUTPUT_TOKENS  = 16      # {"time":12.3456,"type":"short","position":2}
+NOTES_PER_ONSET     = 1.3     # 동시타 포함 평균
+
+
+def estimate_tokens(n_onsets: int) -> int:
+    return int(n_onsets * (ONSET_PROMPT_TOKENS + NOTE_OUTPUT_TOKENS * NOTES_PER_ONSET))
+
+
+class Chunk:
+    def __init__(self, index: int, onsets: List[Dict[str, Any]],
+                 before: List[Dict[str, Any]], after: List[Dict[str, Any]]):
+        self.index  = index
+        self.onsets = onsets
+        self.before = before      # 읽기 전용 문맥 (이 시각에는 노트를 두지 않는다)
+        self.after  = after
+
+    @property
+    def times(self) -> Set[float]:
+        return {o["time"] for o in self.onsets}
+
+
+def _cut_index(times: Sequence[float], lo: int, target: int, hi: int, bar: Optional[float]) -> int:
+    """[lo, hi] 범위에서 target 에 가장 가까운 마디 경계, 없으면 가장 긴 간격 위치"""
+    if bar:
+        t0 = times[0]
+        bars = [i for i in range(lo, hi + 1)
+                if int((times[i] - t0) // bar) != int((times[i - 1] - t0) // bar)]
+        if bars:
+            return min(bars, key=lambda i: abs(i - target))
+    return max(range(lo, hi + 1), key=lambda i: (times[i] - times[i - 1], -abs(i - target)))
+
+
+def split_window(
+    onsets: List[Dict[str, Any]], window: Optional[Sequence[float]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """[t0, t1) 구간 기준 (앞, 안, 뒤) onset. window 가 없으면 전체가 안쪽."""
+    if not window:
+        return [], onsets, []
+    t0, t1 = window
+    return ([o for o in onsets if o["time"] < t0],
+            [o for o in onsets if t0 <= o["time"] < t1],
+            [o for o in onsets if o["time"] >= t1])
+
+
+def plan_chunks(
+    onsets: List[Dict[str, Any]],
+    bpm: float,
+    token_budget: int = CHUNK_TOKEN_BUDGET,
+    context: int = CONTEXT_ONSETS,
+    lead: Optional[List[Dict[str, Any]]] = None,
+    tail: Optional[List[Dict[str, Any]]] = None,
+) -> List[Chunk]:
+    """
+    onset(시각 정렬, 소수 4자리) → 균형 잡힌 청크 목록.
+    lead/tail: 구간 재생성 때 구간 바깥 onset (첫/마지막 청크의 문맥으로만 쓴다)
+    """
+    n = len(onsets)
+    if n == 0:
+        return []
+    per_chunk = max(MIN_CHUNK_ONSETS, token_budget // estimate_tokens(1))
+    n_chunks  = min(MAX_CHUNKS, max(1, round(n / per_chunk)))
+    target    = n / n_chunks
+    times     = [o["time"] for o in onsets]
+    bar       = BEATS_PER_PHRASE * 60.0 / bpm if bpm and bpm > 0 else None
+
+    cuts, start = [], 0
+    for c in range(1, n_chunks):
+        ideal = round(c * target)
+        lo    = max(start + MIN_CHUNK_ONSETS // 2, ideal - int(target * 0.35), 1)
+        hi    = min(n - MIN_CHUNK_ONSETS // 2, ideal + int(target * 0.35), n - 1)
+        if lo > hi:
+            continue
+        start = _cut_index(times, lo, ideal, hi, bar)
+        cuts.append(start)
+
+    bounds = list(zip([0] + cuts, cuts + [n]))
+    lead   = (lead or [])[-context:] if context else []
+    tail   = (tail or [])[:context] if context else []
+    padded, off = lead + onsets + tail, len(lead)
+    return [
+        Chunk(i, onsets[a:b], padded[max(0, off + a - context):off + a], padded[off + b:off + b + context])
+        for i, (a, b) in enumerate(bounds)
+    ]
+
+
+def validate_chaebo(
+    part: Any, allowed_times: Set[float], key: int
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    LLM 이 돌려준 chaebo 에서 입력 onset 시각이 아닌 노트, 레인 범위를 벗어난 노트,
+    모양이 잘못된 노트를 버린다. (남은 노트, 버린 개수)
+    """
+    if not isinstance(part, list):
+        return [], 0
+    kept: List[Dict[str, Any]] = []
+    for n in part:
+        try:
+            t   = round(float(n["time"]), 4)
+            pos = n.get("position")
+        except (TypeError, KeyError, ValueError):
+            continue
+        if t not in allowed_times:
+            continue
+        if n.get("type", "short") != "change_beat" and not (isinstance(pos, int) and 1 <= pos <= key):
+            continue
+        kept.append({**n, "time": t})
+    return kept, len(part) - len(kept)
@@ -0,0 +1,89 @@
+# backend/ingest.py
+"""
+업로드 수집(ingestion).
+
+UploadFile 을 청크 단위로 임시 파일에 쓰면서 sha256 을 함께 계산하고,
+크기 제한·실제 컨테이너 형식(헤더 sniffing)·재생 길이 제한을 검사한다.
+같은 해시의 곡이 이미 있으면 호출 쪽에서 분석/LLM 없이 기존 곡으로 돌려보낸다.
+"""
+import os, uuid, hashlib, asyncio
+from typing import Any, Optional
+
+UPLOAD_MAX_BYTES   = int(os.getenv("UPLOAD_MAX_BYTES", str(50 << 20)))
+UPLOAD_MAX_SECONDS = float(os.getenv("UPLOAD_MAX_SECONDS", "900"))
+CHUNK_SIZE         = 1 << 20
+
+
+class IngestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_audio_format(head: bytes) -> Optional[str]:
+    """파일 앞부분으로 실제 형식 판별 ("mp3" | "wav" | None)"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:3] == b"ID3":
+        return "mp3"
+    # ID3 태그 없는 MPEG 오디오 프레임 (sync word 11 bit + layer III)
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0 and (head[1] & 0x06) == 0x02:
+        return "mp3"
+    return None
+
+
+def audio_duration(path: str) -> float:
+    import soundfile as sf
+    return sf.info(path).duration
+
+
+class IngestedFile:
+    def __init__(self, path: str, sha256: str, size: int, fmt: str, duration: float):
+        self.path     = path
+        self.sha256   = sha256
+        self.size     = size
+        self.format   = fmt
+        self.duration = duration
+
+    def discard(self) -> None:
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+async def ingest_upload(
+    upload: Any,
+    tmp_dir: str,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    max_seconds: float = UPLOAD_MAX_SECONDS,
+) -> IngestedFile:
+    """upload(UploadFile) → 검증을 통과한 임시 파일. 실패하면 임시 파일을 지우고 IngestError."""
+    tmp = os.path.join(tmp_dir, f".ingest-{uuid.uuid4().hex}")
+    h, size, fmt = hashlib.sha256(), 0, None
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                block = await upload.read(CHUNK_SIZE)
+                if not block:
+                    break
+                if fmt is None:
+                    fmt = sniff_audio_format(block[:16])
+                    if fmt is None:
+                        raise IngestError(415, "지원되지 않는 오디오 형식입니다. (MP3/WAV)")
+                size += len(block)
+                if size > max_bytes:
+                    raise IngestError(413, f"파일이 너무 큽니다. (최대 {max_bytes >> 20}MB)")
+                h.update(block)
+                out.write(block)
+        if fmt is None:
+            raise IngestError(400, "빈 파일입니다.")
+        try:
+            duration = await asyncio.to_thread(audio_duration, tmp)
+        except Exception:
+            raise IngestError(415, "오디오 파일을 읽을 수 없습니다.")
+        if duration > max_seconds:
+            raise IngestError(413, f"곡이 너무 깁니다. (최대 {max_seconds:g}초)")
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+    return IngestedFile(tmp, h.hexdigest(), size, fmt, duration)
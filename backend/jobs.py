@@ -0,0 +1,173 @@
+# backend/jobs.py
+"""
+차트 생성 작업(job) 저장소.
+작업 상태는 `jobs/<job_id>.json` 에 매 갱신마다 원자적으로 기록되어
+프로세스가 재시작돼도 마지막으로 끝난 LLM 청크부터 이어서 진행할 수 있다.
+상태 변화는 구독자(asyncio.Queue)에게 전달되어 SSE 로 흘려보낸다.
+스트리밍 중인 청크의 노트(live)는 메모리에만 두고 구독자에게만 알린다 (청크가 끝나면 chunks 로 옮겨진다).
+끝난(done/error) 작업은 chunks 를 비워 두고(결과는 차트 파일에 있다), JOB_TTL 이 지나거나
+JOB_MAX_FINISHED 개를 넘으면 오래된 것부터 파일째 지운다.
+"""
+import os, json, time, uuid, asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from telemetry import span
+
+FINISHED = ("done", "error")
+
+JOB_TTL          = float(os.getenv("JOB_TTL", str(24 * 3600)))   # 끝난 작업을 남겨 두는 시간 (초)
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "200"))     # 남겨 두는 끝난 작업 최대 수
+
+
+class JobStore:
+    def __init__(self, root: str, ttl: float = JOB_TTL, max_finished: int = JOB_MAX_FINISHED):
+        self.root         = root
+        self.ttl          = ttl
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._unfinished: Set[str] = set()
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+        self._live: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}   # job_id → 청크 id → 받는 중인 노트
+        os.makedirs(root, exist_ok=True)
+        for fn in os.listdir(root):
+            if not fn.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(root, fn), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            self._jobs[job["job_id"]] = job
+            if job["status"] not in FINISHED:
+                self._unfinished.add(job["job_id"])
+            elif job["chunks"]:
+                self._finish(job)   # chunks 를 지우기 전에 끝난 작업
+                self._save(job)
+        self.prune()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        path = self._path(job["job_id"])
+        tmp  = f"{path}.tmp"
+        with span("job_store.save"):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp, path)
+
+    def _publish(self, job: Dict[str, Any]) -> None:
+        for q in self._listeners.get(job["job_id"], []):
+            q.put_nowait(job)
+
+    # ── 생성 / 조회 ──
+    def create(self, kind: str, song_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "job_id":     str(uuid.uuid4()),
+            "kind":       kind,          # "upload" | "regenerate" | "section"
+            "song_id":    song_id,
+            "params":     params,
+            "status":     "queued",      # queued → running → done | error
+            "stage":      None,
+            "timings":    {},            # stage 이름 → 초
+            "tokens":     {},            # LLM 토큰 사용량 (예상/실제, 호출·캐시 적중 수)
+            "chunks":     {},            # 청크 id("<key>:<index>") → 완료된 chaebo 조각
+            "n_chunks":   None,
+            "error":      None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._jobs[job["job_id"]] = job
+        self._unfinished.add(job["job_id"])
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """재시작 시 이어서 돌려야 할 작업"""
+        return [self._jobs[job_id] for job_id in self._unfinished]
+
+    # ── 정리 ──
+    @staticmethod
+    def _finish(job: Dict[str, Any]) -> None:
+        """끝난 작업의 청크 chaebo 는 차트 파일에 합쳐졌으므로 개수만 남긴다."""
+        job["chunks_done"] = len(job["chunks"])
+        job["chunks"] = {}
+
+    def _remove(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._unfinished.discard(job_id)
+        self._live.pop(job_id, None)
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def prune(self) -> int:
+        """TTL 이 지났거나 JOB_MAX_FINISHED 를 넘는 끝난 작업을 지운다 → 지운 수"""
+        finished = sorted((j for j in self._jobs.values() if j["status"] in FINISHED),
+                          key=lambda j: j["updated_at"])
+        cutoff = time.time() - self.ttl
+        excess = len(finished) - self.max_finished
+        stale  = [j["job_id"] for i, j in enumerate(finished) if i < excess or j["updated_at"] < cutoff]
+        for job_id in stale:
+            self._remove(job_id)
+        return len(stale)
+
+    def delete_song(self, song_id: str) -> None:
+        """곡을 지울 때 그 곡의 끝난 작업도 지운다 (진행 중인 작업은 끝난 뒤 prune 에 맡긴다)."""
+        for job_id in [j["job_id"] for j in self._jobs.values()
+                       if j["song_id"] == song_id and j["status"] in FINISHED]:
+            self._remove(job_id)
+
+    # ── 갱신 ──
+    def update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        job = self._jobs[job_id]
+        job.update(fields)
+        job["updated_at"] = time.time()
+        finished = job["status"] in FINISHED and job_id in self._unfinished
+        if finished:
+            self._unfinished.discard(job_id)
+            self._live.pop(job_id, None)
+            self._finish(job)
+        self._save(job)
+        self._publish(job)
+        if finished:
+            self.prune()
+        return job
+
+    def add_timings(self, job_id: str, timings: Dict[str, float]) -> None:
+        job = self._jobs[job_id]
+        job["timings"].update({k: round(v, 4) for k, v in timings.items()})
+        self.update(job_id)
+
+    def add_chunk(self, job_id: str, chunk: str, chaebo: List[Dict[str, Any]], elapsed: float) -> None:
+        job = self._jobs[job_id]
+        job["chunks"][chunk] = chaebo
+        self._live.get(job_id, {}).pop(chunk, None)
+        job["timings"][f"llm_chunk_{chunk}"] = round(elapsed, 4)
+        self.update(job_id)
+
+    def add_live_notes(self, job_id: str, chunk: str, notes: List[Dict[str, Any]]) -> None:
+        """스트리밍으로 방금 도착한 노트. 파일에는 쓰지 않는다."""
+        self._live.setdefault(job_id, {}).setdefault(chunk, []).extend(notes)
+        self._publish(self._jobs[job_id])
+
+    def live(self, job_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        return self._live.get(job_id, {})
+
+    # ── SSE 구독 ──
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, []).append(q)
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue) -> None:
+        listeners = self._listeners.get(job_id, [])
+        if q in listeners:
+            listeners.remove(q)
+        if not listeners:
+            self._listeners.pop(job_id, None)
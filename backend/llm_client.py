@@ -0,0 +1,377 @@
+# backend/llm_client.py
+"""
+프로세스 전체에서 하나만 쓰는 Gemini 클라이언트 계층.
+
+- genai.Client 는 처음 호출할 때 한 번만 만든다 (HTTP keep-alive 재사용)
+- 동시 호출 수 세마포어 + token bucket 으로 요청 속도 제한
+- 일시적 오류(429/5xx/네트워크)는 지수 백오프로 재시도
+- 호출별 지연 시간·토큰 수를 누적해 metrics() 로 돌려준다
+- stream() 은 응답 텍스트 조각을 받는 대로 내보낸다 (generate_content_stream)
+- usage dict 를 넘기면 그 호출의 실제 토큰 사용량(프롬프트/캐시 적중/출력)을 더해 준다
+- cached_content() 는 고정 system instruction 을 명시적 컨텍스트 캐시로 올려 이름을 돌려준다
+
+테스트/부하 측정 때는 LLMClient(client=FakeGenaiClient(...)) 를 쓰거나
+GEMINI_BASE_URL 로 로컬 스텁 서버를 가리키면 실제 API 없이 돌 수 있다.
+"""
+import os, time, random, asyncio, logging, threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from telemetry import SIZE_BUCKETS, Counter, Histogram
+
+log = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RATE_PER_SEC    = float(os.getenv("LLM_RATE_PER_SEC", "2"))
+LLM_BURST           = int(os.getenv("LLM_BURST", "4"))
+LLM_MAX_RETRIES     = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE    = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX     = 20.0
+LLM_CACHE_TTL       = int(os.getenv("LLM_CACHE_TTL", "3600"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# /metrics (mode: generate | stream, outcome: ok | error)
+LLM_SECONDS        = Histogram("llm_request_seconds", "Gemini call latency per attempt", ["model", "mode", "outcome"])
+LLM_PROMPT_CHARS   = Histogram("llm_prompt_chars", "Prompt size per call (user part)", ["mode"], SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("llm_response_chars", "Response text size per successful call", ["mode"], SIZE_BUCKETS)
+LLM_RETRIES        = Counter("llm_retries_total", "Transient Gemini errors that were retried", ["mode"])
+LLM_FAILURES       = Counter("llm_failures_total", "Gemini calls that failed after retries", ["mode"])
+LLM_TOKENS         = Counter("llm_tokens_total", "Tokens reported by the API", ["kind"])
+
+
+class LLMError(RuntimeError):
+    """재시도 후에도 실패한 LLM 호출"""
+
+
+def is_transient(e: BaseException) -> bool:
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(e, httpx.TransportError)
+
+
+class TokenBucket:
+    """초당 rate 개, 최대 burst 개까지 모아 쓰는 토큰 버킷"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate   = rate
+        self.burst  = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp  = time.monotonic()
+        self._lock  = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMClient:
+    def __init__(
+        self,
+        model: str,
+        client: Any = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rate_per_sec: float = LLM_RATE_PER_SEC,
+        burst: int = LLM_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+    ):
+        self.model        = model
+        self.max_retries  = max_retries
+        self.backoff_base = backoff_base
+        self._client      = client
+        self._client_lock = threading.Lock()
+        self._max_concurrency = max_concurrency
+        self._rate  = (rate_per_sec, burst)
+        # asyncio 기본 요소는 이벤트 루프 안에서 처음 쓸 때 만든다
+        self._loop:   Optional[asyncio.AbstractEventLoop] = None
+        self._sem:    Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket]       = None
+        self._metrics: Dict[str, float] = {
+            "calls": 0, "failures": 0, "retries": 0, "in_flight": 0,
+            "latency_sum": 0.0, "latency_max": 0.0,
+            "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+        }
+        self._caches: Dict[tuple, tuple] = {}   # (model, system) → (cache 이름 | None, 만료 시각)
+        self._cache_lock: Optional[asyncio.Lock] = None
+
+    # ── 클라이언트 ──
+    def _get_client(self) -> Any:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    api_key = os.getenv("GOOGLE_API_KEY")
+                    if not api_key:
+                        raise RuntimeError("환경 변수 GOOGLE_API_KEY가 설정돼 있지 않습니다.")
+                    import google.genai as genai
+                    base_url = os.getenv("GEMINI_BASE_URL")
+                    http_options = genai.types.HttpOptions(base_url=base_url) if base_url else None
+                    self._client = genai.Client(api_key=api_key, http_options=http_options)
+        return self._client
+
+    def _limits(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop   = loop
+            self._sem    = asyncio.Semaphore(self._max_concurrency)
+            self._bucket = TokenBucket(*self._rate)
+            self._cache_lock = asyncio.Lock()
+        return self._sem, self._bucket
+
+    # ── 호출 ──
+    def _count_usage(self, resp: Any, usage_out: Optional[Dict[str, int]] = None) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        if usage is None:
+            return
+        counts = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        }
+        for k, v in counts.items():
+            self._metrics[k] += v
+            LLM_TOKENS.inc(v, kind=k[:-7])
+            if usage_out is not None:
+                usage_out[k] = usage_out.get(k, 0) + v
+
+    @staticmethod
+    def _kwargs(prompt: str, model: str, config: Any) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"model": model, "contents": prompt.strip()}
+        if config is not None:
+            kwargs["config"] = config
+        return kwargs
+
+    def _call_once(self, prompt: str, model: str, config: Any, usage: Optional[Dict[str, int]]) -> str:
+        resp = self._get_client().models.generate_content(**self._kwargs(prompt, model, config))
+        self._count_usage(resp, usage)
+        text = (resp.text or "").strip()
+        if not text:
+            raise RuntimeError("Gemini 응답이 비어 있습니다.")
+        return text
+
+    def _stream_once(self, prompt: str, model: str, config: Any, usage: Optional[Dict[str, int]]) -> Iterator[str]:
+        last, empty = None, True
+        for resp in self._get_client().models.generate_content_stream(**self._kwargs(prompt, model, config)):
+            last = resp
+            if resp.text:
+                empty = False
+                yield resp.text
+        if last is not None:
+            self._count_usage(last, usage)   # 사용량은 마지막 조각에 누적돼 온다
+        if empty:
+            raise RuntimeError("Gemini 응답이 비어 있습니다.")
+
+    async def generate(
+        self, prompt: str, model: Optional[str] = None, config: Any = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        """프롬프트 → 응답 텍스트. 일시적 오류는 재시도하고, 끝내 실패하면 LLMError."""
+        sem, bucket = self._limits()
+        model = model or self.model
+        attempt = 0
+        while True:
+            async with sem:
+                await bucket.acquire()
+                self._metrics["calls"]     += 1
+                self._metrics["in_flight"] += 1
+                LLM_PROMPT_CHARS.observe(len(prompt), mode="generate")
+                t0, error = time.perf_counter(), None
+                try:
+                    text = await asyncio.to_thread(self._call_once, prompt, model, config, usage)
+                    LLM_RESPONSE_CHARS.observe(len(text), mode="generate")
+                    return text
+                except Exception as e:
+                    error = e
+                finally:
+                    self._finish("generate", model, time.perf_counter() - t0, error)
+
+            if attempt >= self.max_retries or not is_transient(error):
+                self._metrics["failures"] += 1
+                LLM_FAILURES.inc(mode="generate")
+                raise LLMError(f"Gemini 호출 실패 ({attempt + 1}회 시도): {error}") from error
+            # 세마포어를 놓은 상태에서 대기 (full jitter)
+            delay = min(LLM_BACKOFF_MAX, self.backoff_base * (2 ** attempt))
+            attempt += 1
+            self._metrics["retries"] += 1
+            LLM_RETRIES.inc(mode="generate")
+            log.info("Gemini 일시적 오류, %.2f초 안에 재시도 (%d회째): %s", delay, attempt, error)
+            await asyncio.sleep(random.uniform(0, delay))
+
+    def _finish(self, mode: str, model: str, dt: float, error: Optional[BaseException]) -> None:
+        self._metrics["in_flight"]  -= 1
+        self._metrics["latency_sum"] += dt
+        self._metrics["latency_max"]  = max(self._metrics["latency_max"], dt)
+        LLM_SECONDS.observe(dt, model=model, mode=mode, outcome="error" if error else "ok")
+
+    async def stream(
+        self, prompt: str, model: Optional[str] = None, config: Any = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        generate 와 같되 응답 텍스트 조각을 받는 대로 내보낸다.
+        이미 내보낸 조각은 되돌릴 수 없으므로 첫 조각 전에 난 일시적 오류만 재시도한다.
+        """
+        sem, bucket = self._limits()
+        model = model or self.model
+        loop  = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            sent, error, size = False, None, 0
+            async with sem:
+                await bucket.acquire()
+                self._metrics["calls"]     += 1
+                self._metrics["in_flight"] += 1
+                LLM_PROMPT_CHARS.observe(len(prompt), mode="stream")
+                t0 = time.perf_counter()
+                q: asyncio.Queue = asyncio.Queue()
+                done = object()
+
+                def pump() -> None:
+                    # 스레드에서 동기 스트림을 읽어 이벤트 루프 큐로 넘긴다
+                    try:
+                        for piece in self._stream_once(prompt, model, config, usage):
+                            loop.call_soon_threadsafe(q.put_nowait, piece)
+                        loop.call_soon_threadsafe(q.put_nowait, done)
+                    except Exception as e:
+                        loop.call_soon_threadsafe(q.put_nowait, e)
+
+                loop.run_in_executor(None, pump)
+                try:
+                    while True:
+                        item = await q.get()
+                        if item is done:
+                            break
+                        if isinstance(item, Exception):
+                            error = item
+                            break
+                        sent  = True
+                        size += len(item)
+                        yield item
+                finally:
+                    self._finish("stream", model, time.perf_counter() - t0, error)
+            if error is None:
+                LLM_RESPONSE_CHARS.observe(size, mode="stream")
+                return
+
+            if sent or attempt >= self.max_retries or not is_transient(error):
+                self._metrics["failures"] += 1
+                LLM_FAILURES.inc(mode="stream")
+                raise LLMError(f"Gemini 스트림 실패 ({attempt + 1}회 시도): {error}") from error
+            delay = min(LLM_BACKOFF_MAX, self.backoff_base * (2 ** attempt))
+            attempt += 1
+            self._metrics["retries"] += 1
+            LLM_RETRIES.inc(mode="stream")
+            log.info("Gemini 스트림 일시적 오류, %.2f초 안에 재시도 (%d회째): %s", delay, attempt, error)
+            await asyncio.sleep(random.uniform(0, delay))
+
+    async def cached_content(self, system: str, model: Optional[str] = None, ttl: int = LLM_CACHE_TTL) -> Optional[str]:
+        """
+        system instruction 을 명시적 컨텍스트 캐시로 올린 이름 (모델·system 별로 한 번).
+        모델이 지원하지 않거나 최소 토큰 수에 못 미쳐 실패하면 None 을 기억해 두고
+        호출 쪽은 system_instruction 을 그대로 보낸다 (같은 접두부라 암묵적 캐시는 탈 수 있다).
+        """
+        self._limits()
+        model = model or self.model
+        k = (model, system)
+        async with self._cache_lock:
+            name, expires = self._caches.get(k, (None, 0.0))
+            if time.time() < expires:
+                return name
+            try:
+                cache = await asyncio.to_thread(
+                    self._get_client().caches.create,
+                    model=model, config={"system_instruction": system, "ttl": f"{ttl}s"},
+                )
+                name = cache.name
+            except Exception as e:
+                log.warning("컨텍스트 캐시를 만들 수 없어 system instruction 으로 보냅니다: %s", e)
+                name = None
+            # 만료 직전에 쓰지 않도록 조금 일찍 갱신, 실패는 TTL 동안 다시 시도하지 않음
+            self._caches[k] = (name, time.time() + ttl * 0.9)
+            return name
+
+    def metrics(self) -> Dict[str, float]:
+        m = dict(self._metrics)
+        m["latency_avg"] = m["latency_sum"] / m["calls"] if m["calls"] else 0.0
+        return m
+
+
+# ────────────── 테스트용 가짜 클라이언트 ─────────────
+class _FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count         = prompt_tokens
+        self.cached_content_token_count = 0
+        self.candidates_token_count     = output_tokens
+
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt: str, output_so_far: Optional[str] = None):
+        self.text = text
+        self.usage_metadata = _FakeUsage(len(prompt) // 4, len(output_so_far or text) // 4)
+
+
+def _fake_prompt(contents: str, config: Any) -> str:
+    """사용량 계산용: system instruction 도 프롬프트 토큰에 들어간다"""
+    system = (config or {}).get("system_instruction") if isinstance(config, dict) else None
+    return f"{system}\n{contents}" if system else contents
+
+
+class FakeAPIError(RuntimeError):
+    def __init__(self, code: int):
+        super().__init__(f"fake API error {code}")
+        self.code = code
+
+
+class FakeGenaiClient:
+    """
+    genai.Client 와 같은 모양(client.models.generate_content / generate_content_stream)의
+    가짜 클라이언트. latency 초 만큼 기다린 뒤 respond(prompt) 결과를 돌려주고,
+    failure_rate 확률로 503 을 던진다. 스트림은 stream_chunk 글자씩 latency 를 나눠 보낸다.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str], str] = lambda prompt: "[]",
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        stream_chunk: int = 256,
+    ):
+        self.respond      = respond
+        self.latency      = latency
+        self.failure_rate = failure_rate
+        self.stream_chunk = stream_chunk
+        self._rng         = random.Random(seed)
+        self.models       = self
+
+    def generate_content(self, model: str, contents: str, config: Any = None) -> _FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        if self._rng.random() < self.failure_rate:
+            raise FakeAPIError(503)
+        return _FakeResponse(self.respond(contents), _fake_prompt(contents, config))
+
+    def generate_content_stream(self, model: str, contents: str, config: Any = None) -> Iterator[_FakeResponse]:
+        if self._rng.random() < self.failure_rate:
+            raise FakeAPIError(503)
+        text   = self.respond(contents)
+        pieces = [text[i:i + self.stream_chunk] for i in range(0, len(text), self.stream_chunk)] or [""]
+        for i, piece in enumerate(pieces):
+            if self.latency:
+                time.sleep(self.latency / len(pieces))
+            yield _FakeResponse(piece, _fake_prompt(contents, config), text[: (i + 1) * self.stream_chunk])
@@ -1,18 +1,35 @@
 # backend/main.py
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+_IMPORT_T0 = time.perf_counter()   # 기동 시간 측정 (import 시작 → startup 완료)
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 load_dotenv()
 
-import os, json, uuid, shutil, asyncio
+import os, json, uuid, asyncio, hashlib, logging
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, List
-
-import numpy as np
-import librosa, soundfile as sf
-import google.genai as genai
-import requests
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 조회 API(/api/songs, /api/chart, /api/audio) 만으로는 librosa / soundfile / google.genai 를 import 하지 않는다.
+# audio_analysis · ingest · audio_variants · llm_client 는 무거운 모듈을 실제로 쓰는 함수 안에서만 불러온다.
+from cache import DiskLRUCache, cached_file_sha256, remember_file_sha256
+from audio_analysis import ANALYSIS_SR, SLOW_METHOD, STREAMING_MIN_SECONDS, run_analysis
+from analysis_worker import AnalysisExecutor, AnalysisBusy, AnalysisTimeout
+from jobs import JobStore
+from song_store import KEY_MODES, SORTS as SONG_SORTS, SongStore
+from chart_store import FORMATS as CHART_FORMATS, ChartStore
+from ingest import IngestError, audio_duration, ingest_upload
+from audio_variants import VARIANTS as AUDIO_VARIANTS, sniff_media_type, transcode_variants, variant_path
+from llm_client import LLMClient, LLMError
+from chaebo_stream import CHAEBO_CONFIG, ChaeboStreamParser
+from prompts import ChaeboPrompt, build_prompt, token_report
+from chart_engine import generate_chaebo, generate_chart, splice_section
+from chart_summary import summarize_chart
+from chunk_scheduler import CHUNK_CONCURRENCY, CHUNK_TOKEN_BUDGET, plan_chunks, split_window, validate_chaebo
+from telemetry import TRACE_REQUESTS, Counter, Gauge, Histogram, MetricsMiddleware, render as render_metrics, span
 
 # ────────────── FastAPI & CORS ──────────────
 app = FastAPI()
@@ -22,11 +39,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# ────────────── 로깅 ──────────────
+# LOG_LEVEL=DEBUG 일 때만 프롬프트 본문 출력 / gemini_prompt_n.txt 저장
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("hci")
+logging.getLogger("httpx").setLevel(logging.WARNING)   # genai 요청마다 찍히는 INFO 줄
+if TRACE_REQUESTS:   # 요청별 trace 는 LOG_LEVEL 과 상관없이 남긴다
+    logging.getLogger("hci.trace").setLevel(logging.DEBUG)
 
 # ────────────── 경로 & 상수 ──────────────
 UPLOAD_DIR = "uploads"
 CHART_DIR  = "charts"
-SONGS_FILE = "songs.json"
+SONGS_FILE = "songs.json"   # 예전 메타데이터 파일 (songs.db 로 한 번 이전)
+SONGS_DB   = "songs.db"
+SONGS_PAGE_MAX = 1000
 MODELS = [
     "gemini-2.5-flash-preview-05-20",
     "gemini-2.5-pro-preview-05-06",
@@ -35,20 +64,64 @@ MODELS = [
 ]
 MODEL_NAME = "gemini-2.0-flash"
 
+# 분석 결과 캐시 (오디오 내용 해시 + 분석 파라미터 기준)
+ANALYSIS_CACHE_DIR       = "analysis_cache"
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 << 20)))
+JOB_DIR = "jobs"
+# LLM 응답 캐시 (모델 + 전체 프롬프트 해시 기준)
+RESPONSE_CACHE_DIR       = "response_cache"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 << 20)))
+RESPONSE_CACHE_TTL       = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+# 응답을 스키마(JSON) 로 강제 / 스트리밍으로 받으며 노트 단위로 파싱
+LLM_STRUCTURED = os.getenv("LLM_STRUCTURED", "1") != "0"
+LLM_STREAM     = os.getenv("LLM_STREAM", "1") != "0"
+# 고정 규칙(system instruction)을 명시적 컨텍스트 캐시로 올린다 (모델이 지원할 때만)
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "0") == "1"
+# 재생용 저용량 음원 / 미리듣기 클립
+AUDIO_VARIANT_DIR = "audio_variants"
+AUDIO_MAX_AGE     = 24 * 3600
+# 음원 변환은 분석과 다른 작은 저우선순위 풀에서 돌려 분석 대기열(503 한도)을 차지하지 않게 한다
+TRANSCODE_WORKERS     = int(os.getenv("TRANSCODE_WORKERS", "1"))
+TRANSCODE_MAX_PENDING = int(os.getenv("TRANSCODE_MAX_PENDING", "16"))
+TRANSCODE_NICE        = int(os.getenv("TRANSCODE_NICE", "10"))
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(CHART_DIR, exist_ok=True)
-
-# ────────────── songs.json 로드 ─────────────
-if os.path.isfile(SONGS_FILE):
-    with open(SONGS_FILE, "r", encoding="utf-8") as f:
-        songs_data: Dict[str, Dict[str, Any]] = json.load(f)
-else:
-    songs_data = {}
-
-def save_songs_data() -> None:
-    with open(SONGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(songs_data, f, ensure_ascii=False, indent=2)
+os.makedirs(AUDIO_VARIANT_DIR, exist_ok=True)
+
+analysis_cache    = DiskLRUCache(ANALYSIS_CACHE_DIR, max_bytes=ANALYSIS_CACHE_MAX_BYTES)
+response_cache    = DiskLRUCache(RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                                 ttl=RESPONSE_CACHE_TTL)
+analysis_executor = AnalysisExecutor()
+transcode_executor = AnalysisExecutor(workers=TRANSCODE_WORKERS, max_pending=TRANSCODE_MAX_PENDING,
+                                      prewarm=False, nice=TRANSCODE_NICE)
+job_store         = JobStore(JOB_DIR)
+llm_client        = LLMClient(MODEL_NAME)
+song_store        = SongStore(SONGS_DB, legacy_json=SONGS_FILE)
+chart_store       = ChartStore(CHART_DIR)
+
+@app.on_event("shutdown")
+def shutdown_analysis_executor() -> None:
+    analysis_executor.shutdown()
+    transcode_executor.shutdown()
+
+# ────────────── 지표 ─────────────
+ANALYSIS_STAGE = Histogram("analysis_stage_seconds", "analyze_audio sub-step duration (cache misses only)", ["stage"])
+CHAEBO_PARSE   = Counter("chaebo_parse_total", "Parsed chaebo responses", ["outcome"])
+CHAEBO_NOTES   = Counter("chaebo_notes_rejected_total", "LLM notes dropped while parsing or validating", ["reason"])
+CHUNK_FALLBACK = Counter("chunk_fallback_total", "LLM chunks filled by the pattern engine", ["reason"])
+Gauge("analysis_queue_pending", "Analysis jobs queued or running in the worker pool",
+      fn=lambda: analysis_executor.pending)
+Gauge("transcode_queue_pending", "Audio variant transcodes queued or running in the transcode pool",
+      fn=lambda: transcode_executor.pending)
+Gauge("llm_in_flight", "Gemini calls in flight", fn=lambda: llm_client.metrics()["in_flight"])
+Gauge("jobs_unfinished", "Chart jobs not yet done or failed", fn=lambda: len(job_store.unfinished()))
+Gauge("background_tasks", "Chart job tasks running in this process", fn=lambda: len(_job_tasks))
+STARTUP_SECONDS = Gauge("startup_seconds", "Seconds from importing main to each startup phase", ["phase"])
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # ────────────── 더미 차트 ─────────────
 def generate_dummy_charts() -> Dict[str, Any]:
@@ -62,323 +135,526 @@ def generate_dummy_charts() -> Dict[str, Any]:
             for k in (4, 5, 6)}
 
 # ────────────── 오디오 분석 ─────────────
+def analysis_cache_key(slow_rate: float, max_onsets: int) -> str:
+    return f"sr{ANALYSIS_SR}_slow{slow_rate:g}_{SLOW_METHOD}_max{max_onsets}_stream{STREAMING_MIN_SECONDS:g}"
 
-async def analyze_audio_thread(path: str, slow_rate: float = 0.5, max_onsets: int = 400) -> Dict[str, Any]:
-    """
-    기존의 analyze_audio를 별도 스레드에서 실행하도록 감싸는 래퍼입니다.
-    """
-    return await asyncio.to_thread(analyze_audio, path, slow_rate, max_onsets)
-
-def analyze_audio(
+async def analyze_audio_cached(
     path: str,
     slow_rate: float = 0.5,
     max_onsets: int = 400
 ) -> Dict[str, Any]:
     """
-    MP3/WAV → BPM + onset 리스트(dict) 반환
-    slow_rate: 속도 비율 (1.0 = 원속도, 0.5 = 반속도)
+    analyze_audio 결과를 (오디오 해시, 파라미터) 기준으로 캐시.
+    같은 곡을 재생성할 때는 디코딩/onset/pitch 분석을 건너뛰고,
+    캐시 미스일 때만 분석 워커 풀에서 실행한다.
     """
-    # 1) 원본 신호 로드
-    y, sr = librosa.load(path, sr=22050, mono=True)
-
-    # 2) BPM 측정 (원본)
-    tempo = librosa.beat.tempo(y=y, sr=sr)[0]
-    bpm = float(np.round(tempo, 2))
-
-    # 3) 속도 변경 (pitch-preserving)
-    if slow_rate != 1.0:
-        y_proc = librosa.effects.time_stretch(y, rate=slow_rate)
-    else:
-        y_proc = y
-
-    # 4) onset 검출 (느려진 신호 기준)
-    onset_frames = librosa.onset.onset_detect(
-        y=y_proc,
-        sr=sr,
-        units="frames",
-        backtrack=True
-    )
-    onset_times_slow = librosa.frames_to_time(onset_frames, sr=sr)
-
-    # 5) pitch·volume 분석 (느려진 신호 기준)
-    pitches, magnitudes = librosa.piptrack(y=y_proc, sr=sr)
-
-    # 6) 결과 조합 & 시간 환산 및 반올림
-    output = []
-    for idx, frame in enumerate(onset_frames):
-        # 느려진 시간 → 원래 시간
-        t_slow = onset_times_slow[idx]
-        t_orig = round(t_slow * slow_rate, 4)
-
-        # pitch & volume
-        mag = magnitudes[:, frame]
-        if mag.any():
-            i = mag.argmax()
-            freq = pitches[i, frame]
-            midi = int(librosa.hz_to_midi(freq)) if freq > 0 else None
-            amp = float(np.clip(mag[i], 0, 1))
-
-            output.append({
-                "time": t_orig,
-                "pitch": midi,
-                "volume": amp
-            })
-
-    # 7) 최대 개수 제한 & 반환
-    return {
-        "bpm": bpm,
-        "onsets": output[:max_onsets]
-    }
+    audio_hash = await asyncio.to_thread(cached_file_sha256, path)
+    name       = analysis_cache_key(slow_rate, max_onsets)
+    summary    = analysis_cache.get(audio_hash, name)
+    if summary is None:
+        with span("analysis", path=os.path.basename(path)):
+            summary = await analysis_executor.run(run_analysis, path, slow_rate, max_onsets)
+        for stage, dt in summary.get("timings", {}).items():
+            ANALYSIS_STAGE.observe(dt, stage=stage)
+        # 단계별 시간은 이번 실행에만 의미가 있으므로 캐시에는 넣지 않는다
+        analysis_cache.put(audio_hash, name, {k: v for k, v in summary.items() if k != "timings"})
+    return summary
+
+def raise_analysis_error(e: Exception) -> None:
+    """분석 워커 포화/타임아웃은 더미 차트로 숨기지 않고 HTTP 에러로 돌려준다."""
+    if isinstance(e, AnalysisBusy):
+        raise HTTPException(503, str(e), headers={"Retry-After": "10"})
+    if isinstance(e, AnalysisTimeout):
+        raise HTTPException(504, str(e))
 
 # ────────────── Gemini 호출 ─────────────
-def call_gemini_raw(prompt: str) -> Any:
-    print("call_gemini_raw")
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise RuntimeError("환경 변수 GOOGLE_API_KEY가 설정돼 있지 않습니다.")
-
-    client = genai.Client(api_key=api_key)
-    print("Gemini 클라이언트 생성 완료")
-    # resp = client.models.generate_content(
-    #     model   = MODEL_NAME,
-    #     contents= prompt.strip(),
-    #     config  = genai.types.GenerateContentConfig(
-    #         max_output_tokens=8000,
-    #         temperature     =0.3,
-    #     )
-    # )
-    resp = client.models.generate_content(
-        model   = MODEL_NAME,
-        contents= prompt.strip()
-    )
-    print("Gemini 응답 수신 완료", resp)
-    text = resp.text.strip()
-    if not text:
-        raise RuntimeError("Gemini 응답이 비어 있습니다.")
+async def call_gemini_raw(prompt: str) -> str:
+    # 공용 클라이언트 (keep-alive, 동시성/속도 제한, 재시도)
+    return await llm_client.generate(prompt)
 
-    return text
+NotesCallback = Callable[[List[Dict[str, Any]]], None]
 
-def call_gemini(prompt: str) -> Any:
-    global prompt_cnt
-    text = call_gemini_raw(prompt)
-    print("Gemini 응답1:", text[:100], text[-100:])  # 디버깅용
-    # ```json ... ``` 블록 제거
-    if text.startswith("```json"):
-        print("Detected JSON block, processing...")
-        text = text.replace("```","").replace("json","").strip()
-    print("Gemini 응답2:", text[:100],"\n\n", text[-100:])  # 디버깅용
-
-    with open(f"gemini_response_{prompt_cnt}.txt", "w", encoding="utf-8") as f:
-        f.write(text)
-    
-    return json.loads(text)
-
-# ────────────── 온셋 분할 & Chaebo 생성 ─────────────
-def chunk_onsets(onsets: List[Dict[str, Any]], size: int = 600) -> List[List[Dict[str, Any]]]:
+async def call_gemini_chaebo(
+    prompt: ChaeboPrompt,
+    on_notes: Optional[NotesCallback] = None,
+    usage: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
     """
-    Splits a list of onset dicts (each with time, pitch, volume) into chunks,
-    rounding each time to 4 decimal places but preserving pitch and volume.
+    chaebo 프롬프트 → (노트 목록, 응답을 끝까지 받았는지).
+    고정 규칙은 system instruction(또는 컨텍스트 캐시)으로, 입력 onset 만 본문으로 보낸다.
+    스트리밍이면 노트가 완성될 때마다 on_notes 로 넘긴다.
+    도중에 끊기면 그때까지 완성된 노트를 complete=False 로 돌려준다 (하나도 없으면 예외).
     """
-    # 1) Round the time field and preserve pitch & volume
-    rounded = []
-    for o in onsets:
-        if "time" not in o:
-            continue
-        seg = {
-            "time": round(o["time"], 4),
-            "pitch": o.get("pitch"),
-            "volume": o.get("volume")
-        }
-        rounded.append(seg)
-
-    # 2) Chunk into fixed-size lists
-    return [rounded[i : i + size] for i in range(0, len(rounded), size)]
-
-def get_prompt(key: int, bpm: float, onsets: List[float], extra_prompt: str = "") -> str:
-    prompt = """
-You are a rhythm-game chart generator.
-You will receive a set of onsets (timestamps) and a source BPM.
-
-## Task
-Return **ONLY** the JSON array (no wrapper) that constitutes the *chaebo* of a **{key}Key** chart.
-Example:
-[{{"time":0.123,"type":"short","position":2}}, …]
-
-The chart must be playable, fun, and follow these rules:
----
-"""
-    prompt+=f"""
-### 1. Global Constraints
-| Item | Rule |
-|------|------|
-| **Source BPM** | bpm is beat per minute.<br>Use it to calculate note timings. |
-| **Onsets** | *place notes **only** at these times; never invent extra timestamps.* |
-"""
-    prompt+="""
-| **Allowed note shapes** | • `{"time":T,"type":"short","position":P}`<br>• `{"time":T,"type":"long","position":P,"end":E}`<br>• `{"time":T,"type":"change_beat","beat":B}` |
-| **Key-mode lanes** | 4K → 1 2 3 4  , 5K → 1 2 3 4 5  ,  6K → 1 2 3 4 5 6 |
-| **Long / change_beat** | *For now disallow* – generate **short** notes only. |
-| **Output** | A single JSON array, no comments / backticks / extra text. Must start with `[` and end with `]`. |
-
-*Feel free to invent new, fun patterns (as long as they respect all checklist rules and remain playable).*
----
-### 2. Musical Mapping Guidelines
-* **Pitch⇄Lane** – if pitch is different, use different lanes.
-  Example motif `D B C B D B E` → lanes `1 2 3 2 3 2 4`.
-* **Accents / strong hits** – use **Simultaneous (Chord)** notes (2–3 lanes at same `time`).
-* **Variety** – mix multiple patterns; don’t run any one pattern for > 2 s.
-    
-### 3. Pattern Library (use creatively)
-- **Random**
-  - **What it is:** It's not a pattern, but a fallback for when no other patterns fit. Or when you want to add some randomness.
-  - No specific examples, just put notes at random positions.
-
-- **Trill**  
-  - **What it is:** Rapid alternation between exactly two lanes  
-  - **Examples (4-key):**  
-    `[{"time":0.1000,"type":"short","position":1},{"time":0.2000,"type":"short","position":3},{"time":0.3000,"type":"short","position":1},{"time":0.4000,"type":"short","position":3}]`  
-    `[{"time":1.0000,"type":"short","position":2},{"time":1.1500,"type":"short","position":4},{"time":1.3000,"type":"short","position":2},{"time":1.4500,"type":"short","position":4}]`
-
-- **Jump-trill**
-    - **What it is:** Similar to Trill, but with Simultaneous notes
-    - **Examples (4-key):**
-    `[{"time":0.1000,"type":"short","position":1},{"time":0.1000,"type":"short","position":2},{"time":0.3000,"type":"short","position":3},{"time":0.3000,"type":"short","position":4}]` and repeat...
-
-- **Stair**  
-  - **What it is:** Stepwise ascend or descend; each note moves ±1 lane  
-  - **Examples (4-key):**  
-    `[{"time":0.5000,"type":"short","position":2},{"time":0.6000,"type":"short","position":3},{"time":0.7000,"type":"short","position":4}]`  
-    `[{"time":2.0000,"type":"short","position":4},{"time":2.2000,"type":"short","position":3},{"time":2.4000,"type":"short","position":2},{"time":2.6000,"type":"short","position":1}]`
-
-- **Simultaneous (Chord)**  
-  - **What it is:** 2–3 lanes hit at the same time for accents or surprises  
-  - **Constraints:** Do not exceed 3 lanes at once  
-  - **Examples (4-key):**  
-    `[{"time":0.8000,"type":"short","position":2},{"time":0.8000,"type":"short","position":4}]`  
-    `[{"time":3.0000,"type":"short","position":1},{"time":3.0000,"type":"short","position":2},{"time":3.0000,"type":"short","position":3}]`
-
-- **Rapid-fire**  
-  - **What it is:** “Machine-gun” burst in one lane  
-  - **Constraints:** Do not use this for long sequences, it is not fun to have more than 5 notes in a row in the same lane.
-  - **Examples (4-key):**  
-    `[{"time":1.0000,"type":"short","position":3},{"time":1.1000,"type":"short","position":3},{"time":1.2000,"type":"short","position":3}]`  
-    `[{"time":4.5000,"type":"short","position":2},{"time":4.5800,"type":"short","position":2},{"time":4.6600,"type":"short","position":2},{"time":4.7400,"type":"short","position":2},{"time":4.8200,"type":"short","position":2}]`
-
-- **Axis**  
-  - **What it is:** Central lane repeats (≥50% of notes) with occasional side-lane interjections  
-  - **Examples (4-key):**  
-    `[{"time":1.5000,"type":"short","position":3},{"time":1.6000,"type":"short","position":2},{"time":1.7000,"type":"short","position":3},{"time":1.8000,"type":"short","position":4},{"time":1.9000,"type":"short","position":3}]`  
-    `[{"time":5.0000,"type":"short","position":3},{"time":5.2500,"type":"short","position":3},{"time":5.5000,"type":"short","position":2},{"time":5.7500,"type":"short","position":3},{"time":6.0000,"type":"short","position":4}]`
-
-- **Running-man**
-    - **What it is:** Rapid-fire on left-most or right-most lane and stair or trill on the other
-    - **Examples (4-key):**
-    `[{"time":0.1000,"type":"short","position":1},{"time":0.2000,"type":"short","position":2},{"time":0.3000,"type":"short","position":1},{"time":0.4000,"type":"short","position":3},{"time":0.5000,"type":"short","position":1},{"time":0.6000,"type":"short","position":4},{"time":0.7000,"type":"short","position":1}]`
-
-
-*(Each micro-example is a **valid JSON array**.)*
----
-### 4. Chart-Quality Checklist (run before output)
-1. Every note `time` value is **exactly** present in **{onsets}**.  
-2. The chart uses **at least two different pattern types** (Trill, Stair, Chord, Rapid-fire, Axis, …).  
-3. No single pattern continues **longer than 3 s** without change.  
-4. No endless linear loops such as 1→2→3→4→1→… .  
-5. Include **at least three chord moments** (2–3 lanes at the same `time`).  
-6. Generate **only short notes** – no `long` or `change_beat`.  
-7. Final output is **strictly the JSON array** (no wrapper, comments, backticks, or extra fields).  
-   It must start with `[` and end with `]`.
-8. Don’t repeat the same pattern for too long—if the musical progression (pitch contour or rhythmic spacing) changes, switch to a new pattern.
-9. The examples for each pattern are only illustrative; their lengths can be chosen freely. 
-   For instance, for Simultaneous you might use: at 1.0 s hit lanes 1, 2, 3; at 1.2 s hit lanes 2, 3, 4; at 1.4 s hit lanes 1, 2, 3.
-   These also count as pattern combinations, and you are free to mix and match patterns as you like
-
-"""
-    prompt +=f"""
-### 5. Input Data
-Key : {key}
-BPM : {bpm}
-Onsets : {json.dumps(onsets, ensure_ascii=False)}
-
-*Note: All timestamps are rounded to exactly 4 decimal places. Output times must match this format.*
-"""
-
-
-    if extra_prompt.strip():  # 추가 프롬프트가 있다면
-        prompt += f"\n --- \n\n6.Additional instructions:\n{extra_prompt.strip()}"
-    prompt +="""\n
-### Final Instructions
-
-Before returning, please verify that all 9 items in the Chart-Quality Checklist are satisfied.  
-It is absolutely paramount that each pattern delivers electrifying fun—genuine excitement ignites from a driving groove and daring novelty. Dull, repetitive sequences are utterly intolerable.
-If there are 6. Additional instructions Section, they must take priority over any other rule or directive. In the event of a conflict, consider only the additional instructions and ignore the conflicting rules.
-"""
-    return prompt.strip()
+    cached = None
+    if LLM_CONTEXT_CACHE and prompt.system:
+        cached = await llm_client.cached_content(prompt.system)
+    config = prompt.config(CHAEBO_CONFIG if LLM_STRUCTURED else None, cached)
+    parser = ChaeboStreamParser()
+    notes: List[Dict[str, Any]] = []
+    try:
+        if LLM_STREAM:
+            async for piece in llm_client.stream(prompt.user, config=config, usage=usage):
+                new = parser.feed(piece)
+                if new:
+                    notes.extend(new)
+                    if on_notes:
+                        on_notes(new)
+        else:
+            notes = parser.feed(await llm_client.generate(prompt.user, config=config, usage=usage))
+    except LLMError as e:
+        if not notes:
+            CHAEBO_PARSE.inc(outcome="failed")
+            raise
+        log.warning("Gemini 응답이 끊김, 완성된 노트 %d개만 사용: %s", len(notes), e)
+    if parser.skipped:
+        CHAEBO_NOTES.inc(parser.skipped, reason="unparsable")
+        log.warning("Gemini 응답에서 읽지 못한 노트 %d개 무시", parser.skipped)
+    if not notes and not parser.closed:
+        CHAEBO_PARSE.inc(outcome="no_array")
+        raise ValueError("Gemini 응답에 chaebo 배열이 없습니다.")
+    CHAEBO_PARSE.inc(outcome="complete" if parser.closed else "truncated")
+    return notes, parser.closed
 
+# ────────────── 온셋 분할 & Chaebo 생성 ─────────────
+def round_onsets(onsets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rounds each time to 4 decimal places (sorted by time), preserving pitch and volume."""
+    return sorted(
+        ({"time": round(o["time"], 4), "pitch": o.get("pitch"), "volume": o.get("volume")}
+         for o in onsets if "time" in o),
+        key=lambda o: o["time"]
+    )
 
 prompt_cnt = 0
-async def ask_gemini_for_chaebo(key: int, bpm: float, onsets: List[float], extra_prompt: str = "") -> List[Dict[str, Any]]:
+def response_cache_key(model: str, prompt: str) -> Tuple[str, str]:
+    digest = hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+    return digest[:2], digest
+
+async def ask_gemini_for_chaebo(
+    key: int,
+    bpm: float,
+    onsets: List[float],
+    extra_prompt: str = "",
+    use_cache: bool = True,
+    context: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    on_notes: Optional[NotesCallback] = None,
+    usage: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    (chaebo, 완전한 응답인지). 같은 (모델, 출력 스키마, 프롬프트) 의 파싱된 chaebo 는
+    응답 캐시에서 바로 돌려준다. use_cache=False 면 새로 생성하고 그 결과로 캐시를 덮어쓴다.
+    끊긴 응답은 캐시하지 않는다.
+    usage: 요청(job) 단위 토큰 집계 — 어림값(estimated_*)과 API 가 알려 준 실제값을 더한다.
+    """
     global prompt_cnt
     prompt_cnt += 1
-    prompt = get_prompt(key, bpm, onsets, extra_prompt)
-    print("Gemini 요청:", prompt)  # 디버깅용
-    with open(f"gemini_prompt_{prompt_cnt}.txt", "w", encoding="utf-8") as f:
-        f.write(prompt)
-    res = await call_gemini_thread(prompt)
-
-    return res
+    prompt = build_prompt(key, bpm, onsets, extra_prompt, context)
+    model  = f"{llm_client.model}+schema" if LLM_STRUCTURED else llm_client.model
+    ns, name = response_cache_key(model, prompt.digest)
+    if use_cache:
+        cached = response_cache.get(ns, name)
+        if cached is not None:
+            if usage is not None:
+                usage["cache_hits"] = usage.get("cache_hits", 0) + 1
+            return cached, True
+
+    report = token_report(prompt)
+    if usage is not None:
+        usage["llm_calls"] = usage.get("llm_calls", 0) + 1
+        for k, v in report.items():
+            usage[f"estimated_{k}"] = usage.get(f"estimated_{k}", 0) + v
+    if log.isEnabledFor(logging.DEBUG):   # 디버깅용
+        log.debug("Gemini 요청 #%d (예상 토큰 %s): %s", prompt_cnt, report, prompt.user)
+        with open(f"gemini_prompt_{prompt_cnt}.txt", "w", encoding="utf-8") as f:
+            f.write(prompt.text)
+    res, complete = await call_gemini_chaebo(prompt, on_notes, usage)
+    if complete:
+        response_cache.put(ns, name, res)
+
+    return res, complete
+
+
+def merge_chaebo(parts: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """청크별 chaebo 를 합쳐 (시각, 종류, 레인) 중복 제거 후 시간 순 정렬"""
+    notes = [n for part in parts for n in part]
+    return sorted(
+        {(n["time"], n.get("type"), n.get("position")): n for n in notes}.values(),
+        key=lambda x: x["time"]
+    )
 
+ChunkCallback = Callable[[int, List[Dict[str, Any]], float], None]
+LiveCallback  = Callable[[int, List[Dict[str, Any]]], None]
+
+async def build_chart_with_chunks(
+    key: int,
+    summary: Dict[str, Any],
+    extra_prompt: str = "",
+    token_budget: int = CHUNK_TOKEN_BUDGET,
+    done_chunks: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    on_chunk: Optional[ChunkCallback] = None,
+    use_cache: bool = True,
+    window: Optional[Tuple[float, float]] = None,
+    on_notes: Optional[LiveCallback] = None,
+    usage: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    """
+    token_budget: 청크 하나의 예상 토큰 수 상한 (chunk_scheduler.plan_chunks 참고)
+    window:       (t0, t1) 이면 그 구간 onset 만 생성하고 바깥 onset 은 문맥으로만 쓴다.
+    done_chunks:  이미 끝난 청크(index 문자열 → chaebo). 해당 청크는 다시 호출하지 않는다.
+    on_chunk:     청크 하나가 끝날 때마다 (index, chaebo, 소요 초) 로 호출.
+    on_notes:     스트리밍 중 검증을 통과한 노트가 도착할 때마다 (index, 노트들) 로 호출.
+    usage:        토큰 사용량을 모을 dict (ask_gemini_for_chaebo 참고). 패턴 엔진으로 채운 청크 수는 fallback_chunks.
+    """
+    done_chunks = done_chunks or {}
 
-async def build_chart_with_chunks(key: int, summary: Dict[str, Any], extra_prompt: str = "", chunk_size: int = 300) -> Dict[str, Any]:
-    global prompt_cnt
-    prompt_cnt = 0
-    
     bpm     = summary["bpm"]
-    onsets  = summary["onsets"]
-    chaebo: List[Dict[str, Any]] = []
-
-    # Gemini 호출을 비동기로 병렬 실행
-    tasks = [
-        asyncio.create_task(ask_gemini_for_chaebo(key, bpm, seg, extra_prompt))
-        for seg in chunk_onsets(onsets, chunk_size)
-    ]
+    lead, onsets, tail = split_window(round_onsets(summary["onsets"]), window)
+    plan    = plan_chunks(onsets, bpm, token_budget, lead=lead, tail=tail)
+    parts: List[List[Dict[str, Any]]] = []
+    sem     = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def run_chunk(chunk) -> List[Dict[str, Any]]:
+        async with sem:
+            t0 = time.perf_counter()
+            live = None
+            if on_notes:
+                live = lambda new: on_notes(chunk.index, validate_chaebo(new, chunk.times, key)[0])
+            try:
+                part, complete = await ask_gemini_for_chaebo(
+                    key, bpm, chunk.onsets, extra_prompt, use_cache,
+                    context={"before": chunk.before, "after": chunk.after},
+                    on_notes=live, usage=usage,
+                )
+                part, dropped = validate_chaebo(part, chunk.times, key)
+                if dropped:
+                    CHAEBO_NOTES.inc(dropped, reason="invalid")
+                    log.info("Gemini 세그먼트 %d: onset 에 없는 시각/레인 노트 %d개 제거", chunk.index, dropped)
+                if not complete:
+                    CHUNK_FALLBACK.inc(reason="truncated")
+                    # 끊긴 응답: 받은 노트는 살리고 마지막 노트 뒤 onset 만 패턴 엔진으로 채운다
+                    last = max((n["time"] for n in part), default=float("-inf"))
+                    part += generate_chaebo(key, bpm, [o for o in chunk.onsets if o["time"] > last])
+            except Exception as e:
+                # LLM 이 실패한 구간은 자체 패턴 엔진으로 채운다
+                CHUNK_FALLBACK.inc(reason="error")
+                if usage is not None:
+                    usage["fallback_chunks"] = usage.get("fallback_chunks", 0) + 1
+                log.warning("Gemini 세그먼트 %d 오류, 패턴 엔진으로 대체: %s", chunk.index, e)
+                part = generate_chaebo(key, bpm, chunk.onsets)
+            if on_chunk:
+                on_chunk(chunk.index, part, time.perf_counter() - t0)
+            return part
+
+    # Gemini 호출을 비동기로 병렬 실행 (이미 끝난 청크는 건너뜀)
+    tasks = []
+    for chunk in plan:
+        if str(chunk.index) in done_chunks:
+            parts.append(done_chunks[str(chunk.index)])
+        else:
+            tasks.append(asyncio.create_task(run_chunk(chunk)))
     for t in tasks:
         try:
-            chaebo_part = await t
-            chaebo.extend(chaebo_part)
+            parts.append(await t)
         except Exception as e:
-            print("Gemini 세그먼트 오류:", e)
-
-    # 중복 제거 및 시간 순 정렬
-    chaebo = sorted(
-        {(n["time"], json.dumps(n)): n for n in chaebo}.values(),
-        key=lambda x: x["time"]
-    )
+            log.exception("Gemini 세그먼트 오류: %s", e)
 
     return {
         f"{key}key": {
             "maxscore": {"score": 0, "player": "AAA"},
-            "chaebo":   chaebo
+            "chaebo":   merge_chaebo(parts)
         }
     }
 
-def call_gemini_blocking(prompt: str) -> Any:
+# ────────────── API: 곡 리스트 ─────────────
+@app.get("/api/songs")
+async def list_songs(
+    offset: int = 0,
+    limit: Optional[int] = None,   # 없으면 전체
+    q: Optional[str] = None,       # 곡 이름 부분 일치
+    key: Optional[int] = None,     # 해당 Key 차트가 있는 곡만
+    sort: str = "created",         # created | name | bpm | duration | notes | level | peak_nps | avg_nps
+    order: str = "asc",            # asc | desc
+    bpm_min: Optional[float] = None,
+    bpm_max: Optional[float] = None,
+    duration_min: Optional[float] = None,
+    duration_max: Optional[float] = None,
+    level_min: Optional[int] = None,   # level / notes / *_nps 기준은 key 가 있어야 함
+    level_max: Optional[int] = None,
+    curve: bool = False,           # Key 별 요약에 NPS 곡선 포함
+):
     """
-    기존 call_gemini_raw+call_gemini 과정을 합쳐서
-    완전히 블로킹으로 실행하는 동기 함수.
+    곡 목록 + Key 별 차트 요약 (charts: {"4key": {notes, avg_nps, peak_nps, chord_ratio, level}}, bpm, duration).
+    요약은 차트를 저장할 때 미리 계산해 둔 인덱스에서 읽으므로 곡 선택 화면은 이 요청 하나로 충분하다.
     """
-    text = call_gemini_raw(prompt)
-    # JSON 블록 처리, 디버깅 파일 쓰기, JSON 파싱까지 그대로 둡니다.
-    if text.startswith("```json"):
-        text = text.replace("```", "").replace("json", "").strip()
-    return json.loads(text)
+    if offset < 0 or (limit is not None and not 0 < limit <= SONGS_PAGE_MAX):
+        raise HTTPException(400, f"offset 은 0 이상, limit 은 1~{SONGS_PAGE_MAX} 이어야 합니다.")
+    if key is not None and key not in KEY_MODES:
+        raise HTTPException(400, "Key 는 4, 5, 6 중에서 골라야 합니다.")
+    if sort not in SONG_SORTS or order not in ("asc", "desc"):
+        raise HTTPException(400, f"sort 는 {', '.join(SONG_SORTS)} 중 하나, order 는 asc / desc 여야 합니다.")
+    if key is None and (sort in ("notes", "level", "peak_nps", "avg_nps") or (level_min, level_max) != (None, None)):
+        raise HTTPException(400, "노트 수 / 레벨 / NPS 로 정렬·필터하려면 key 를 정해야 합니다.")
+    songs, total = song_store.list(
+        offset=offset, limit=limit, q=q, key=key, sort=sort, desc=order == "desc",
+        ranges={"bpm": (bpm_min, bpm_max), "duration": (duration_min, duration_max),
+                "level": (level_min, level_max)},
+        curve=curve,
+    )
+    return {"songs": songs, "total": total, "offset": offset, "limit": limit}
 
-async def call_gemini_thread(prompt: str) -> Any:
-    return await asyncio.to_thread(call_gemini_blocking, prompt)
+# ────────────── 차트 생성 작업 ─────────────
+_job_tasks: set = set()
+ENGINES = ("llm", "native")
 
-# ────────────── API: 곡 리스트 ─────────────
-@app.get("/api/songs")
-async def list_songs():
-    return {"songs": list(songs_data.values())}
+def job_engine(params: Dict[str, Any]) -> str:
+    """use_llm=False 는 패턴 엔진. 이전 버전 작업에는 engine 키가 없다."""
+    if not params["use_llm"]:
+        return "native"
+    return params.get("engine", "llm")
+
+def check_engine(engine: str) -> None:
+    if engine not in ENGINES:
+        raise HTTPException(400, f"engine 은 {', '.join(ENGINES)} 중 하나여야 합니다.")
+
+def parse_keys(keys: str, key: Optional[int]) -> List[int]:
+    """"4,5,6" 형태의 Key 목록. 비어 있으면 key 하나만."""
+    try:
+        out = sorted({int(k) for k in keys.split(",") if k.strip()}) if keys else []
+    except ValueError:
+        raise HTTPException(400, "keys 는 쉼표로 구분한 숫자여야 합니다. (예: 4,5,6)")
+    if not out and key is not None:
+        out = [key]
+    if not out or any(k not in (4, 5, 6) for k in out):
+        raise HTTPException(400, "Key 는 4, 5, 6 중에서 골라야 합니다.")
+    return out
+
+def job_keys(params: Dict[str, Any]) -> List[int]:
+    return params.get("keys") or [params["key"]]
+
+def chunk_id(key: int, idx: int) -> str:
+    return f"{key}:{idx}"
+
+def job_chunks(job: Dict[str, Any], key: int, live: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    job 에 저장된 청크 중 해당 Key 것만 (청크 index 문자열 → chaebo).
+    live=True 면 아직 스트리밍 중인 청크의 노트도 포함한다.
+    """
+    prefix = f"{key}:"
+    chunks = {**job_store.live(job["job_id"]), **job["chunks"]} if live else job["chunks"]
+    return {cid[len(prefix):]: part for cid, part in chunks.items() if cid.startswith(prefix)}
+
+def start_chart_job(job_id: str) -> None:
+    task = asyncio.create_task(run_chart_job(job_id))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+
+async def run_chart_job(job_id: str) -> None:
+    """
+    업로드/재생성 공통 작업: 분석 → 청크별 LLM → 차트 저장 → 메타 갱신.
+    여러 Key 를 요청하면 분석은 한 번만 하고 Key 별 생성을 동시에 돌린다.
+    LLM 호출은 모두 llm_client 의 동시 호출 제한 하나를 나눠 쓴다.
+    이미 끝난 청크는 job 에 남아 있으므로 재시작 후에도 그 다음부터 이어진다.
+    """
+    global prompt_cnt
+    job     = job_store.get(job_id)
+    params  = job["params"]
+    song_id = job["song_id"]
+    keys    = job_keys(params)
+    audio_path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+    engine  = job_engine(params)
+    window  = params.get("window")   # "section" 작업만: [t0, t1)
+    job_store.update(job_id, status="running", stage="analysis")
+
+    chart_part = None
+    analysis   = None   # 곡 목록 요약용 BPM / 길이
+    try:
+        t0 = time.perf_counter()
+        summary = analysis = await analyze_audio_cached(audio_path, slow_rate=params["slow_rate"])
+        job_store.add_timings(job_id, {**summary.get("timings", {}),
+                                       "analysis": time.perf_counter() - t0})
+        if engine == "llm":
+            n_chunks = len(plan_chunks(split_window(round_onsets(summary["onsets"]), window)[1],
+                                       summary["bpm"]))
+            job_store.update(job_id, stage="llm", n_chunks=n_chunks * len(keys))
+            prompt_cnt = 0
+            usage: Dict[str, int] = {}
+            parts = await asyncio.gather(*(
+                build_chart_with_chunks(
+                    k, summary, params["extra_prompt"],
+                    done_chunks=job_chunks(job, k),
+                    on_chunk=lambda i, part, dt, k=k: job_store.add_chunk(job_id, chunk_id(k, i), part, dt),
+                    on_notes=lambda i, notes, k=k: job_store.add_live_notes(job_id, chunk_id(k, i), notes),
+                    use_cache=params.get("use_cache", True),
+                    window=window,
+                    usage=usage,
+                )
+                for k in keys
+            ))
+            job_store.update(job_id, tokens=usage)
+        else:
+            job_store.update(job_id, stage="native")
+            t0 = time.perf_counter()
+            if window:
+                summary = {**summary, "onsets": split_window(round_onsets(summary["onsets"]), window)[1]}
+            parts = [generate_chart(k, summary) for k in keys]
+            job_store.add_timings(job_id, {"native": time.perf_counter() - t0})
+        chart_part = {name: chart for part in parts for name, chart in part.items()}
+    except (AnalysisBusy, AnalysisTimeout) as e:
+        if job["kind"] == "upload" and os.path.isfile(audio_path):
+            os.remove(audio_path)
+        job_store.update(job_id, status="error", stage=None, error=str(e))
+        return
+    except Exception as e:
+        log.exception("차트 생성 오류: %s", e)
+
+    if job["kind"] == "upload":
+        chart_json = chart_part or generate_dummy_charts()
+    elif job["kind"] == "section":
+        # 구간만 바꿔 끼운다. 생성 자체가 실패했으면 기존 차트를 그대로 둔다.
+        if chart_part is None:
+            job_store.update(job_id, status="error", stage=None, error="구간 생성에 실패했습니다.")
+            return
+        chart_json = chart_store.load(song_id)
+        for k in keys:
+            mode = chart_json[f"{k}key"]
+            mode["chaebo"] = splice_section(mode["chaebo"], chart_part[f"{k}key"]["chaebo"], *window, k)
+    else:
+        # 요청한 Key 차트만 교체
+        chart_json = chart_store.load(song_id)
+        chart_part = chart_part or generate_dummy_charts()
+        for k in keys:
+            chart_json[f"{k}key"] = chart_part[f"{k}key"]
+
+    # 모든 Key 가 끝난 뒤 차트 파일·메타를 한 번에 교체
+    job_store.update(job_id, stage="save")
+    chart_store.save(song_id, chart_json)
+
+    # 메타 정보 갱신
+    if job["kind"] == "upload":
+        song_store.upsert({
+            "song_id": song_id,
+            "original_name": params["original_name"],
+            "audio_sha256": params.get("audio_sha256"),
+            "duration": params.get("duration"),
+            "has4": "4key" in chart_json,
+            "has5": "5key" in chart_json,
+            "has6": "6key" in chart_json,
+        })
+    else:
+        song_store.set_key_modes(song_id, keys)
+    index_chart(song_id, chart_json, analysis)
+    job_store.update(job_id, status="done", stage=None)
+
+def index_chart(song_id: str, chart_json: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None) -> None:
+    """
+    곡 목록용 차트 요약 갱신. BPM 은 analysis(analyze_audio 결과)에서, 길이는 analysis 나
+    (예전 분석 캐시에는 길이가 없으므로) 곡 메타에서 읽는다. 음원 파일은 열지 않는다.
+    """
+    analysis = analysis or {}
+    duration = analysis.get("duration")
+    if duration is None:
+        song     = song_store.get(song_id)
+        duration = song["duration"] if song else None
+    song_store.set_summary(song_id, summarize_chart(chart_json, duration),
+                           bpm=analysis.get("bpm"), duration=duration)
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """API 로 내보낼 작업 상태 (Key 별로 완료된 청크를 합친 부분 chaebo 포함)"""
+    keys = job_keys(job["params"])
+    return {
+        "job_id":   job["job_id"],
+        "kind":     job["kind"],
+        "song_id":  job["song_id"],
+        "key":      keys[0],
+        "keys":     keys,
+        "status":   job["status"],
+        "stage":    job["stage"],
+        "timings":  job["timings"],
+        "tokens":   job.get("tokens", {}),
+        "chunks_done":  job.get("chunks_done", len(job["chunks"])),   # 끝난 작업은 chunks 를 비워 둔다
+        "chunks_total": job["n_chunks"],
+        "partial_chaebo": {f"{k}key": merge_chaebo(list(job_chunks(job, k, live=True).values())) for k in keys},
+        "error":    job["error"],
+    }
+
+@app.on_event("startup")
+async def resume_unfinished_jobs() -> None:
+    # 재시작 전에 끝나지 못한 작업을 마지막 청크부터 이어서 실행
+    for job in job_store.unfinished():
+        start_chart_job(job["job_id"])
+    for backfill in (backfill_audio_hashes, backfill_chart_summaries):
+        task = asyncio.create_task(backfill())
+        _job_tasks.add(task)
+        task.add_done_callback(_job_tasks.discard)
+
+@app.on_event("startup")
+async def prewarm_analysis_workers() -> None:
+    # 요청을 받기 시작한 뒤 백그라운드로 워커를 띄워 예열 (첫 업로드가 numba JIT 를 치르지 않게)
+    ready = time.perf_counter() - _IMPORT_T0
+    STARTUP_SECONDS.set(ready, phase="ready")
+    log.info("서버 기동 %.2fs", ready)
+
+    async def run() -> None:
+        try:
+            workers = await analysis_executor.start()
+        except Exception as e:
+            log.warning("분석 워커 예열 실패: %s", e)
+            return
+        total = time.perf_counter() - _IMPORT_T0
+        STARTUP_SECONDS.set(total, phase="workers_warm")
+        warm = {pid: dt for pid, dt in workers}
+        log.info("분석 워커 %d개 예열 완료 %.2fs (워커별 %s)", len(warm), total,
+                 {pid: None if dt is None else round(dt, 2) for pid, dt in warm.items()})
+
+    task = asyncio.create_task(run())
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+
+def find_duplicate(audio_sha256: str) -> Optional[Tuple[str, Optional[str]]]:
+    """같은 음원의 (song_id, 진행 중인 job_id). 등록이 끝난 곡이면 job_id 는 None."""
+    song = song_store.find_by_hash(audio_sha256)
+    if song is not None:
+        return song["song_id"], None
+    for job in job_store.unfinished():
+        if job["kind"] == "upload" and job["params"].get("audio_sha256") == audio_sha256:
+            return job["song_id"], job["job_id"]
+    return None
+
+async def backfill_audio_hashes() -> None:
+    """해시가 없는 예전 곡의 오디오 해시를 채워 중복 검사에 쓰이게 한다."""
+    for song_id in song_store.missing_hashes():
+        path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+        if os.path.isfile(path):
+            song_store.set_hash(song_id, await asyncio.to_thread(cached_file_sha256, path))
+
+async def backfill_chart_summaries() -> None:
+    """요약 인덱스가 생기기 전의 차트를 한 번 훑어 채운다 (분석 캐시에 있으면 BPM/길이도)."""
+    for song_id in song_store.missing_summaries():
+        path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+        if not chart_store.exists(song_id):
+            continue
+        analysis = None
+        if os.path.isfile(path):
+            audio_hash = await asyncio.to_thread(cached_file_sha256, path)
+            for slow_rate in (1.0, 0.5):   # 업로드 / analyze_audio_cached 기본값
+                analysis = analysis or analysis_cache.get(audio_hash, analysis_cache_key(slow_rate, 400))
+            song = song_store.get(song_id)
+            if not (analysis or {}).get("duration") and song and song["duration"] is None:
+                # 길이를 모르는 예전 곡만 음원 헤더를 읽는다 (soundfile 을 서버 프로세스에 올리지 않도록 변환 워커에서)
+                try:
+                    duration = round(await transcode_executor.run(audio_duration, path), 3)
+                    analysis = {**(analysis or {}), "duration": duration}
+                except Exception as e:
+                    log.warning("곡 길이 확인 실패 %s: %s", song_id, e)
+        try:
+            chart_json = await asyncio.to_thread(chart_store.load, song_id)
+        except (OSError, ValueError) as e:
+            log.warning("차트 요약 실패 %s: %s", song_id, e)
+            continue
+        await asyncio.to_thread(index_chart, song_id, chart_json, analysis)
+
+def check_analysis_capacity() -> None:
+    if analysis_executor.pending >= analysis_executor.max_pending:
+        raise_analysis_error(AnalysisBusy("분석 대기열이 가득 찼습니다."))
 
 # ────────────── API: 업로드 & 차트 생성 ─────────────
 @app.post("/api/upload/")
@@ -388,124 +664,269 @@ async def upload_music(
     key: int = Form(4),  # 4, 5, 6 중 하나
     use_llm: bool = Form(True),
     extra_prompt: str = Form(""),
-    slow_rate: float = Form(1.0)
+    slow_rate: float = Form(1.0),
+    engine: str = Form("llm"),       # "llm" | "native" (자체 패턴 엔진)
+    keys: str = Form(""),            # "4,5,6" 처럼 여러 Key 를 한 번에. 비우면 key 하나
 ):
-    # 1) 파일 형식 검증
-    if not file.filename.lower().endswith((".mp3", ".wav")):
-        raise HTTPException(400, "지원되지 않는 오디오 형식입니다.")
+    check_engine(engine)
+    key_list = parse_keys(keys, key)
+
+    # 1) 청크 단위로 받으면서 해시·크기·형식·길이 검사
+    try:
+        ingested = await ingest_upload(file, UPLOAD_DIR)
+    except IngestError as e:
+        raise HTTPException(e.status, str(e))
+    params = {
+        "key": key_list[0],
+        "keys": key_list,
+        "use_llm": use_llm,
+        "engine": engine,
+        "extra_prompt": extra_prompt,
+        "slow_rate": slow_rate,
+    }
 
-    # 2) 저장 경로 결정
+    # 2) 같은 음원이 이미 있으면 분석/LLM 없이 기존 곡으로
+    duplicate = find_duplicate(ingested.sha256)
+    if duplicate is not None:
+        ingested.discard()
+        song_id, job_id = duplicate
+        if job_id is None:
+            # 요청한 Key 중 아직 없는 것만 기존 곡에 추가 생성
+            song    = song_store.get(song_id)
+            missing = [k for k in key_list if not song[f"has{k}"]]
+            if missing:
+                check_analysis_capacity()
+                job_id = job_store.create("regenerate", song_id, {
+                    **params, "key": missing[0], "keys": missing})["job_id"]
+                start_chart_job(job_id)
+        return {"song_id": song_id, "job_id": job_id, "duplicate": True}
+
+    check_analysis_capacity()
+
+    # 3) 저장 경로 결정
     song_id       = str(uuid.uuid4())
-    original_name = name.strip() if name else Path(file.filename).stem
+    original_name = name.strip() if name else Path(file.filename or song_id).stem
     save_path     = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+    os.replace(ingested.path, save_path)
+    remember_file_sha256(save_path, ingested.sha256)
 
-    # 3) 파일 저장
-    with open(save_path, "wb") as buf:
-        shutil.copyfileobj(file.file, buf)
-
-    # 4) 차트 생성
-    if use_llm:
-        try:
-            # slow_rate을 analyze_audio에 전달
-            summary    = analyze_audio(save_path, slow_rate=slow_rate)
-            # LLM 호출 (비동기)
-            chart_part = await build_chart_with_chunks(
-                key, summary, extra_prompt
-            )
-            # build_chart_with_chunks_sync 호출 (블로킹 작업이므로 to_thread로 감싸도, 그냥 호출해도 무방)
-            # chart_part = await asyncio.to_thread(
-            #     build_chart_with_chunks_sync,
-            #     4, summary, extra_prompt
-            # )
-            chart_json = chart_part
-        except Exception as e:
-            print("LLM 오류:", e)
-            chart_json = generate_dummy_charts()
-    else:
-        chart_json = generate_dummy_charts()
-
-    # 5) 차트 파일로 저장
-    chart_path = os.path.join(CHART_DIR, f"{song_id}.json")
-    with open(chart_path, "w", encoding="utf-8") as f:
-        json.dump(chart_json, f, ensure_ascii=False, indent=2)
-
-    # 6) 메타 정보 갱신
-    songs_data[song_id] = {
-        "song_id": song_id,
+    # 4) 차트 생성은 작업으로 넘기고 바로 반환
+    job = job_store.create("upload", song_id, {
+        **params,
         "original_name": original_name,
-        "has4": "4key" in chart_json,
-        "has5": "5key" in chart_json,
-        "has6": "6key" in chart_json,
-    }
-    save_songs_data()
-
-    return {"song_id": song_id}
+        "audio_sha256": ingested.sha256,
+        "duration": round(ingested.duration, 3),
+    })
+    start_chart_job(job["job_id"])
+    start_transcode(song_id)
+
+    return {"song_id": song_id, "job_id": job["job_id"], "duplicate": False}
+
+# ────────────── API: 작업 상태 ─────────────
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "작업을 찾을 수 없습니다.")
+    return job_view(job)
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events 로 작업 상태를 변할 때마다 전송 (끝나면 스트림 종료)"""
+    if job_store.get(job_id) is None:
+        raise HTTPException(404, "작업을 찾을 수 없습니다.")
+
+    async def stream():
+        q   = job_store.subscribe(job_id)
+        job = job_store.get(job_id)
+        try:
+            while True:
+                yield f"data: {json.dumps(job_view(job), ensure_ascii=False)}\n\n"
+                if job["status"] in ("done", "error"):
+                    break
+                while True:
+                    try:
+                        job = await asyncio.wait_for(q.get(), 15)
+                        break
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+        finally:
+            job_store.unsubscribe(job_id, q)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 # ────────────── API: 차트 반환 ─────────────
 @app.get("/api/chart/{song_id}")
-async def get_chart(song_id: str):
-    chart_path = os.path.join(CHART_DIR, f"{song_id}.json")
-    if not os.path.isfile(chart_path):
+async def get_chart(song_id: str, request: Request, format: str = "json"):
+    """
+    format=json: 프론트엔드용 기존 모양 (types/chart.ts)
+    format=bin:  열 형식 바이너리 (chart_store.py 참고)
+    ETag/If-None-Match 와 gzip/br 사전 압축본을 지원한다.
+    """
+    if format not in CHART_FORMATS:
+        raise HTTPException(400, f"format 은 {', '.join(CHART_FORMATS)} 중 하나여야 합니다.")
+    if not chart_store.exists(song_id):
         raise HTTPException(404, "차트 파일을 찾을 수 없습니다.")
-    with open(chart_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    entry = chart_store.response(song_id, format)
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if any(t.strip().removeprefix("W/") in (entry.etag, "*") for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    encoding, body = entry.pick(request.headers.get("accept-encoding", ""))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=entry.media_type, headers=headers)
 
 # ────────────── API: 음원 스트리밍 ─────────────
+_transcoding: set = set()
+
+def start_transcode(song_id: str) -> None:
+    """stream / preview 변형을 백그라운드로 만든다 (이미 진행 중이면 무시)."""
+    if song_id in _transcoding:
+        return
+    _transcoding.add(song_id)
+
+    async def run() -> None:
+        src = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+        try:
+            with span("transcode", song_id=song_id):
+                timings = await transcode_executor.run(transcode_variants, src, AUDIO_VARIANT_DIR, song_id)
+            log.info("변형 음원 생성 완료 %s: %s", song_id, {k: round(v, 3) for k, v in timings.items()})
+        except Exception as e:
+            # 다음 요청 때 다시 시도한다
+            log.warning("변형 음원 생성 실패 %s: %s", song_id, e)
+        finally:
+            _transcoding.discard(song_id)
+
+    task = asyncio.create_task(run())
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return any(t.strip().removeprefix("W/") in (etag, "*") for t in inm.split(","))
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @app.get("/api/audio/{song_id}")
-async def get_audio(song_id: str):
+async def get_audio(song_id: str, request: Request, variant: str = "original"):
+    """
+    variant=original: 업로드한 원본
+    variant=stream:   정규화된 저용량 재생용 MP3 (아직 없으면 원본 + 백그라운드 생성)
+    variant=preview:  곡 선택 화면용 짧은 클립
+    Range 요청은 FileResponse 가, 조건부 요청(ETag/Last-Modified)은 여기서 처리한다.
+    """
+    if variant not in AUDIO_VARIANTS:
+        raise HTTPException(400, f"variant 는 {', '.join(AUDIO_VARIANTS)} 중 하나여야 합니다.")
     path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
     if not os.path.isfile(path):
         raise HTTPException(404, "MP3 not found")
-    return FileResponse(path, media_type="audio/mpeg", filename=f"{song_id}.mp3")
+
+    served = "original"
+    if variant != "original":
+        vpath = variant_path(AUDIO_VARIANT_DIR, song_id, variant)
+        if os.path.isfile(vpath):
+            path, served = vpath, variant
+        else:
+            start_transcode(song_id)
+
+    st   = os.stat(path)
+    etag = '"' + (await asyncio.to_thread(cached_file_sha256, path))[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "X-Audio-Variant": served,
+        # 변형이 준비되면 같은 URL 의 내용이 바뀌므로 대체 응답은 캐시하지 않는다
+        "Cache-Control": f"public, max-age={AUDIO_MAX_AGE}" if served == variant else "no-cache",
+    }
+    if not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+    media_type = "audio/mpeg" if served != "original" else sniff_media_type(path)
+    return FileResponse(path, media_type=media_type, filename=f"{song_id}.mp3", headers=headers,
+                        stat_result=st)
 
 # ────────────── API: 차트 재생성 ─────────────
 @app.post("/api/regenerate/{song_id}")
 async def regenerate_chart(
     song_id: str,
-    key: int = Form(...),            # 4, 5, 6 중 하나
+    key: Optional[int] = Form(None), # 4, 5, 6 중 하나 (keys 를 주면 생략 가능)
     use_llm: bool = Form(True),
     extra_prompt: str = Form(""),
-    slow_rate: float = Form(1.0)
+    slow_rate: float = Form(1.0),
+    use_cache: bool = Form(True),    # False 면 캐시된 LLM 응답 대신 새 변형 생성
+    engine: str = Form("llm"),       # "llm" | "native" (자체 패턴 엔진)
+    keys: str = Form(""),            # "4,5,6" 처럼 여러 Key 를 한 번에
 ):
     # 1) 파일 존재 확인
     audio_path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
-    chart_path = os.path.join(CHART_DIR,  f"{song_id}.json")
-    if not os.path.isfile(audio_path) or not os.path.isfile(chart_path):
+    if not os.path.isfile(audio_path) or not chart_store.exists(song_id):
         raise HTTPException(404, "해당 파일을 찾을 수 없습니다.")
+    check_engine(engine)
+    key_list = parse_keys(keys, key)
+    check_analysis_capacity()
+
+    # 2) 재생성 작업 등록
+    job = job_store.create("regenerate", song_id, {
+        "key": key_list[0],
+        "keys": key_list,
+        "use_llm": use_llm,
+        "engine": engine,
+        "extra_prompt": extra_prompt,
+        "slow_rate": slow_rate,
+        "use_cache": use_cache,
+    })
+    start_chart_job(job["job_id"])
+
+    return {"status": "ok", "message": f"{'/'.join(map(str, key_list))}Key 차트 재생성을 시작했습니다.", "job_id": job["job_id"]}
+# ────────────── API: 구간 재생성 ─────────────
+@app.post("/api/regenerate/{song_id}/section")
+async def regenerate_section(
+    song_id: str,
+    key: int = Form(...),            # 4, 5, 6 중 하나
+    t0: float = Form(...),           # 구간 시작 (초, 포함)
+    t1: float = Form(...),           # 구간 끝 (초, 미포함)
+    use_llm: bool = Form(True),
+    extra_prompt: str = Form(""),
+    slow_rate: float = Form(1.0),
+    use_cache: bool = Form(True),
+    engine: str = Form("llm"),       # "llm" | "native" (자체 패턴 엔진)
+):
+    """[t0, t1) 구간의 {key}Key 채보만 다시 만들어 기존 차트에 이어 붙인다."""
+    audio_path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
+    song = song_store.get(song_id)
+    if song is None or not os.path.isfile(audio_path) or not chart_store.exists(song_id):
+        raise HTTPException(404, "해당 파일을 찾을 수 없습니다.")
+    check_engine(engine)
+    key_list = parse_keys("", key)
+    if not song[f"has{key}"]:
+        raise HTTPException(400, f"{key}Key 차트가 없습니다. 먼저 전체 생성을 해 주세요.")
+    if not 0 <= t0 < t1:
+        raise HTTPException(400, "0 <= t0 < t1 이어야 합니다.")
+    check_analysis_capacity()
+
+    job = job_store.create("section", song_id, {
+        "key": key,
+        "keys": key_list,
+        "window": [round(t0, 4), round(t1, 4)],
+        "use_llm": use_llm,
+        "engine": engine,
+        "extra_prompt": extra_prompt,
+        "slow_rate": slow_rate,
+        "use_cache": use_cache,
+    })
+    start_chart_job(job["job_id"])
+
+    return {"status": "ok", "message": f"{key}Key {t0:g}~{t1:g}초 구간 재생성을 시작했습니다.",
+            "job_id": job["job_id"]}
 
-    # 2) 기존 차트 로드
-    with open(chart_path, "r", encoding="utf-8") as f:
-        chart_json = json.load(f)
-
-    # 3) LLM 으로 재생성 또는 더미
-    if use_llm:
-        try:
-            summary    = analyze_audio(audio_path, slow_rate=slow_rate)
-            # chart_part = await asyncio.to_thread(
-            #     build_chart_with_chunks_sync,
-            #     key, summary, extra_prompt
-            # )
-            chart_part = await build_chart_with_chunks(
-                key, summary, extra_prompt
-            )
-        except Exception as e:
-            print("LLM 오류:", e)
-            chart_part = { f"{key}key": generate_dummy_charts()[f"{key}key"] }
-    else:
-        chart_part = { f"{key}key": generate_dummy_charts()[f"{key}key"] }
-
-    # 4) 해당 Key 차트만 교체
-    chart_json[f"{key}key"] = chart_part[f"{key}key"]
-
-    # 5) 파일 덮어쓰기
-    with open(chart_path, "w", encoding="utf-8") as f:
-        json.dump(chart_json, f, ensure_ascii=False, indent=2)
-
-    # 6) 메타 정보 업데이트
-    songs_data[song_id][f"has{key}"] = True
-    save_songs_data()
-
-    return {"status": "ok", "message": f"{key}Key 차트를 재생성했습니다."}
 # ────────────── API: 그냥 프롬프트 전달 ─────────────
 @app.post("/api/prompt/")
 async def prompt_raw_call(
@@ -516,7 +937,7 @@ async def prompt_raw_call(
         raise HTTPException(400, "use_llm가 False일 때는 이 API를 사용할 수 없습니다.")
 
     try:
-        response = call_gemini_raw(prompt)
+        response = await call_gemini_raw(prompt)
     except Exception as e:
         raise HTTPException(500, f"LLM 호출 오류: {str(e)}")
 
@@ -533,6 +954,17 @@ async def debug_prompt(prompt_id: int):
     except Exception as e:
         return {"error": f"Error reading prompt file: {str(e)}"}
     
+@app.get("/debug/llm")
+async def debug_llm():
+    return llm_client.metrics()
+
+@app.get("/debug/cache")
+async def debug_cache():
+    return {
+        "analysis": analysis_cache.stats(),
+        "response": response_cache.stats(),
+    }
+
 @app.delete("/api/song/{song_id}")
 async def delete_song(song_id: str):
     """
@@ -540,21 +972,23 @@ async def delete_song(song_id: str):
     and removes its metadata entry.
     """
     audio_path = os.path.join(UPLOAD_DIR, f"{song_id}.mp3")
-    chart_path = os.path.join(CHART_DIR,  f"{song_id}.json")
 
     # 1) 파일 존재 확인
-    if not os.path.isfile(audio_path) and not os.path.isfile(chart_path):
+    if not os.path.isfile(audio_path) and not chart_store.exists(song_id):
         raise HTTPException(404, "해당 song_id의 파일을 찾을 수 없습니다.")
 
-    # 2) 파일 삭제
+    # 2) 파일 삭제 (분석 캐시도 함께 무효화)
     if os.path.isfile(audio_path):
+        analysis_cache.invalidate(cached_file_sha256(audio_path))
         os.remove(audio_path)
-    if os.path.isfile(chart_path):
-        os.remove(chart_path)
-
-    # 3) 메타데이터에서 제거
-    if song_id in songs_data:
-        songs_data.pop(song_id)
-        save_songs_data()
+    chart_store.delete(song_id)
+    for v in AUDIO_VARIANTS[1:]:
+        vpath = variant_path(AUDIO_VARIANT_DIR, song_id, v)
+        if os.path.isfile(vpath):
+            os.remove(vpath)
+
+    # 3) 메타데이터와 끝난 작업 기록에서 제거
+    song_store.delete(song_id)
+    job_store.delete_song(song_id)
 
     return {"status": "ok", "message": f"Song {song_id} has been deleted."}
@@ -0,0 +1,284 @@
+# backend/prompts.py
+"""
+chaebo 생성 프롬프트 템플릿.
+
+프롬프트를 두 부분으로 나눈다.
+- system : 규칙 표·패턴 라이브러리·체크리스트. Key 마다 한 번만 렌더링해 두고(lru_cache)
+           system instruction 으로 보낸다. 매 청크 같은 접두부라 모델 쪽 캐시(암묵적 캐시,
+           LLM_CONTEXT_CACHE=1 이면 명시적 cached content)도 그대로 탄다.
+- user   : Key/BPM 과 onset 만. onset 은 키 이름을 반복하는 JSON 대신 `time,pitch,volume` 행으로 쓴다.
+
+legacy_prompt 는 예전 단일 프롬프트 그대로다 (PROMPT_STYLE=legacy, benchmarks/bench_prompt.py 비교용).
+토큰 수는 estimate_tokens 로 어림한다 (실제 사용량은 LLMClient 의 usage 로 받는다).
+"""
+import os, re, json, hashlib
+from functools import lru_cache
+from string import Template
+from typing import Any, Dict, List, Optional
+
+PROMPT_STYLE = os.getenv("PROMPT_STYLE", "compact")   # "compact" | "legacy"
+PROMPT_STYLES = ("compact", "legacy")
+
+Onsets  = List[Dict[str, Any]]
+Context = Optional[Dict[str, Onsets]]
+
+
+class ChaeboPrompt:
+    def __init__(self, system: str, user: str):
+        self.system = system
+        self.user   = user
+
+    @property
+    def text(self) -> str:
+        """system 을 따로 보낼 수 없을 때 쓰는 한 덩어리 프롬프트"""
+        return f"{self.system}\n\n{self.user}" if self.system else self.user
+
+    @property
+    def digest(self) -> str:
+        """응답 캐시 키용"""
+        return hashlib.sha256(f"{self.system}\0{self.user}".encode("utf-8")).hexdigest()
+
+    def config(self, base: Optional[Dict[str, Any]] = None, cached_content: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """LLMClient.generate/stream 의 config. cached_content 가 있으면 system 은 그 안에 들어 있다."""
+        config = dict(base or {})
+        if cached_content:
+            config["cached_content"] = cached_content
+        elif self.system:
+            config["system_instruction"] = self.system
+        return config or None
+
+
+# ────────────── 정적 규칙 (system) ─────────────
+SYSTEM_TEMPLATE = Template("""
+You are a rhythm-game chart generator for a **${key}Key** chart.
+Each request gives a source BPM and a list of onsets. Return **ONLY** the JSON array that constitutes the *chaebo*:
+[{"time":0.123,"type":"short","position":2}, …]
+
+## Input format
+Key : K
+BPM : B
+Onsets (time,pitch,volume):   one onset per line, e.g. `12.3456,64,0.82` (pitch is MIDI, `-` if unknown)
+Before / After (read-only context): onsets of the neighbouring segments, same format — use them only to continue patterns smoothly across the boundary, **never** place notes at these times.
+Additional instructions (optional): take priority over every rule below; on conflict follow them and ignore the conflicting rule.
+
+### 1. Global Constraints
+| Item | Rule |
+|------|------|
+| **Source BPM** | Beats per minute. Use it to feel the groove and phrase length. |
+| **Onsets** | Place notes **only** at these times, written exactly as given (4 decimals); never invent timestamps. |
+| **Note shape** | `{"time":T,"type":"short","position":P}` — short notes only, no `long` / `change_beat`. |
+| **Lanes** | ${lanes} |
+| **Output** | A single JSON array, no comments / backticks / extra text / extra fields. |
+
+### 2. Musical Mapping
+* **Pitch⇄Lane** – different pitch → different lane. Motif `D B C B D B E` → lanes `1 2 3 2 3 2 4`.
+* **Accents / strong hits** (high volume) – chords of 2–3 lanes at the same `time`.
+* **Variety** – mix patterns; don't run one pattern for more than 2 s. Feel free to invent new playable patterns.
+
+### 3. Pattern Library (lane sequences at consecutive onsets, `+` = same time; lengths are free)
+- **Random** – fallback when nothing else fits.
+- **Trill** – alternate exactly two lanes: `1 3 1 3`, `2 4 2 4`.
+- **Jump-trill** – trill of chords: `1+2 3+4 1+2 3+4`.
+- **Stair** – each note moves ±1 lane: `2 3 4`, `4 3 2 1`.
+- **Chord** – 2–3 lanes at once for accents, never more than 3: `2+4`, `1+2+3`; chains like `1+2+3 2+3+4 1+2+3`.
+- **Rapid-fire** – one-lane burst, at most 5 in a row: `3 3 3`.
+- **Axis** – a centre lane on ≥50 % of notes with side interjections: `3 2 3 4 3`.
+- **Running-man** – rapid-fire on an edge lane while the other hand trills/stairs: `1 2 1 3 1 4 1`.
+
+### 4. Checklist (verify before output)
+1. Every `time` is exactly one of the given onsets (not a context onset).
+2. At least two different pattern types; no pattern longer than 3 s; switch when pitch contour or rhythmic spacing changes.
+3. No endless linear loops such as 1→2→3→4→1→….
+4. At least three chord moments.
+5. Output is strictly the JSON array.
+
+Every pattern must deliver electrifying fun — a driving groove and daring novelty. Dull, repetitive sequences are intolerable.
+""")
+
+
+@lru_cache(maxsize=None)
+def system_prompt(key: int) -> str:
+    lanes = f"{key}K → " + " ".join(str(i) for i in range(1, key + 1))
+    return SYSTEM_TEMPLATE.substitute(key=key, lanes=lanes).strip()
+
+
+# ────────────── 입력 (user) ─────────────
+def encode_onsets(onsets: Onsets) -> str:
+    """[{time, pitch, volume}] → `time,pitch,volume` 행 (time 은 이미 소수 4자리)"""
+    rows = []
+    for o in onsets:
+        pitch = o.get("pitch")
+        vol   = o.get("volume")
+        rows.append(f"{o['time']},{'-' if pitch is None else pitch},{'-' if vol is None else format(round(vol, 2), 'g')}")
+    return "\n".join(rows)
+
+
+def user_prompt(key: int, bpm: float, onsets: Onsets, extra_prompt: str = "", context: Context = None) -> str:
+    parts = [f"Key : {key}", f"BPM : {bpm}", "Onsets (time,pitch,volume):", encode_onsets(onsets)]
+    if context and (context.get("before") or context.get("after")):
+        parts += ["Before (read-only):", encode_onsets(context.get("before", [])),
+                  "After (read-only):",  encode_onsets(context.get("after", []))]
+    if extra_prompt.strip():
+        parts += ["Additional instructions:", extra_prompt.strip()]
+    return "\n".join(p for p in parts if p)
+
+
+def build_prompt(
+    key: int,
+    bpm: float,
+    onsets: Onsets,
+    extra_prompt: str = "",
+    context: Context = None,
+    style: str = PROMPT_STYLE,
+) -> ChaeboPrompt:
+    if style == "legacy":
+        return ChaeboPrompt("", legacy_prompt(key, bpm, onsets, extra_prompt, context))
+    return ChaeboPrompt(system_prompt(key), user_prompt(key, bpm, onsets, extra_prompt, context))
+
+
+# ────────────── 토큰 어림 ─────────────
+_TOKEN_RE = re.compile(r"\d|[A-Za-z]+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Gemini 토크나이저 근사: 숫자는 한 자리씩, 영단어는 하나, 기호는 하나씩"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def token_report(prompt: ChaeboPrompt) -> Dict[str, int]:
+    system, user = estimate_tokens(prompt.system), estimate_tokens(prompt.user)
+    return {"system": system, "user": user, "total": system + user}
+
+
+# ────────────── 예전 단일 프롬프트 ─────────────
+def legacy_prompt(
+    key: int,
+    bpm: float,
+    onsets: List[float],
+    extra_prompt: str = "",
+    context: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> str:
+    prompt = """
+You are a rhythm-game chart generator.
+You will receive a set of onsets (timestamps) and a source BPM.
+
+## Task
+Return **ONLY** the JSON array (no wrapper) that constitutes the *chaebo* of a **{key}Key** chart.
+Example:
+[{{"time":0.123,"type":"short","position":2}}, …]
+
+The chart must be playable, fun, and follow these rules:
+---
+"""
+    prompt+=f"""
+### 1. Global Constraints
+| Item | Rule |
+|------|------|
+| **Source BPM** | bpm is beat per minute.<br>Use it to calculate note timings. |
+| **Onsets** | *place notes **only** at these times; never invent extra timestamps.* |
+"""
+    prompt+="""
+| **Allowed note shapes** | • `{"time":T,"type":"short","position":P}`<br>• `{"time":T,"type":"long","position":P,"end":E}`<br>• `{"time":T,"type":"change_beat","beat":B}` |
+| **Key-mode lanes** | 4K → 1 2 3 4  , 5K → 1 2 3 4 5  ,  6K → 1 2 3 4 5 6 |
+| **Long / change_beat** | *For now disallow* – generate **short** notes only. |
+| **Output** | A single JSON array, no comments / backticks / extra text. Must start with `[` and end with `]`. |
+
+*Feel free to invent new, fun patterns (as long as they respect all checklist rules and remain playable).*
+---
+### 2. Musical Mapping Guidelines
+* **Pitch⇄Lane** – if pitch is different, use different lanes.
+  Example motif `D B C B D B E` → lanes `1 2 3 2 3 2 4`.
+* **Accents / strong hits** – use **Simultaneous (Chord)** notes (2–3 lanes at same `time`).
+* **Variety** – mix multiple patterns; don’t run any one pattern for > 2 s.
+    
+### 3. Pattern Library (use creatively)
+- **Random**
+  - **What it is:** It's not a pattern, but a fallback for when no other patterns fit. Or when you want to add some randomness.
+  - No specific examples, just put notes at random positions.
+
+- **Trill**  
+  - **What it is:** Rapid alternation between exactly two lanes  
+  - **Examples (4-key):**  
+    `[{"time":0.1000,"type":"short","position":1},{"time":0.2000,"type":"short","position":3},{"time":0.3000,"type":"short","position":1},{"time":0.4000,"type":"short","position":3}]`  
+    `[{"time":1.0000,"type":"short","position":2},{"time":1.1500,"type":"short","position":4},{"time":1.3000,"type":"short","position":2},{"time":1.4500,"type":"short","position":4}]`
+
+- **Jump-trill**
+    - **What it is:** Similar to Trill, but with Simultaneous notes
+    - **Examples (4-key):**
+    `[{"time":0.1000,"type":"short","position":1},{"time":0.1000,"type":"short","position":2},{"time":0.3000,"type":"short","position":3},{"time":0.3000,"type":"short","position":4}]` and repeat...
+
+- **Stair**  
+  - **What it is:** Stepwise ascend or descend; each note moves ±1 lane  
+  - **Examples (4-key):**  
+    `[{"time":0.5000,"type":"short","position":2},{"time":0.6000,"type":"short","position":3},{"time":0.7000,"type":"short","position":4}]`  
+    `[{"time":2.0000,"type":"short","position":4},{"time":2.2000,"type":"short","position":3},{"time":2.4000,"type":"short","position":2},{"time":2.6000,"type":"short","position":1}]`
+
+- **Simultaneous (Chord)**  
+  - **What it is:** 2–3 lanes hit at the same time for accents or surprises  
+  - **Constraints:** Do not exceed 3 lanes at once  
+  - **Examples (4-key):**  
+    `[{"time":0.8000,"type":"short","position":2},{"time":0.8000,"type":"short","position":4}]`  
+    `[{"time":3.0000,"type":"short","position":1},{"time":3.0000,"type":"short","position":2},{"time":3.0000,"type":"short","position":3}]`
+
+- **Rapid-fire**  
+  - **What it is:** “Machine-gun” burst in one lane  
+  - **Constraints:** Do not use this for long sequences, it is not fun to have more than 5 notes in a row in the same lane.
+  - **Examples (4-key):**  
+    `[{"time":1.0000,"type":"short","position":3},{"time":1.1000,"type":"short","position":3},{"time":1.2000,"type":"short","position":3}]`  
+    `[{"time":4.5000,"type":"short","position":2},{"time":4.5800,"type":"short","position":2},{"time":4.6600,"type":"short","position":2},{"time":4.7400,"type":"short","position":2},{"time":4.8200,"type":"short","position":2}]`
+
+- **Axis**  
+  - **What it is:** Central lane repeats (≥50% of notes) with occasional side-lane interjections  
+  - **Examples (4-key):**  
+    `[{"time":1.5000,"type":"short","position":3},{"time":1.6000,"type":"short","position":2},{"time":1.7000,"type":"short","position":3},{"time":1.8000,"type":"short","position":4},{"time":1.9000,"type":"short","position":3}]`  
+    `[{"time":5.0000,"type":"short","position":3},{"time":5.2500,"type":"short","position":3},{"time":5.5000,"type":"short","position":2},{"time":5.7500,"type":"short","position":3},{"time":6.0000,"type":"short","position":4}]`
+
+- **Running-man**
+    - **What it is:** Rapid-fire on left-most or right-most lane and stair or trill on the other
+    - **Examples (4-key):**
+    `[{"time":0.1000,"type":"short","position":1},{"time":0.2000,"type":"short","position":2},{"time":0.3000,"type":"short","position":1},{"time":0.4000,"type":"short","position":3},{"time":0.5000,"type":"short","position":1},{"time":0.6000,"type":"short","position":4},{"time":0.7000,"type":"short","position":1}]`
+
+
+*(Each micro-example is a **valid JSON array**.)*
+---
+### 4. Chart-Quality Checklist (run before output)
+1. Every note `time` value is **exactly** present in **{onsets}**.  
+2. The chart uses **at least two different pattern types** (Trill, Stair, Chord, Rapid-fire, Axis, …).  
+3. No single pattern continues **longer than 3 s** without change.  
+4. No endless linear loops such as 1→2→3→4→1→… .  
+5. Include **at least three chord moments** (2–3 lanes at the same `time`).  
+6. Generate **only short notes** – no `long` or `change_beat`.  
+7. Final output is **strictly the JSON array** (no wrapper, comments, backticks, or extra fields).  
+   It must start with `[` and end with `]`.
+8. Don’t repeat the same pattern for too long—if the musical progression (pitch contour or rhythmic spacing) changes, switch to a new pattern.
+9. The examples for each pattern are only illustrative; their lengths can be chosen freely. 
+   For instance, for Simultaneous you might use: at 1.0 s hit lanes 1, 2, 3; at 1.2 s hit lanes 2, 3, 4; at 1.4 s hit lanes 1, 2, 3.
+   These also count as pattern combinations, and you are free to mix and match patterns as you like
+
+"""
+    prompt +=f"""
+### 5. Input Data
+Key : {key}
+BPM : {bpm}
+Onsets : {json.dumps(onsets, ensure_ascii=False)}
+
+*Note: All timestamps are rounded to exactly 4 decimal places. Output times must match this format.*
+"""
+    if context and (context.get("before") or context.get("after")):
+        prompt +=f"""
+Context (read-only neighbouring onsets of the adjacent segments — use them only to continue patterns smoothly across the boundary, **never** output notes at these times):
+Before : {json.dumps(context.get("before", []), ensure_ascii=False)}
+After : {json.dumps(context.get("after", []), ensure_ascii=False)}
+"""
+
+
+    if extra_prompt.strip():  # 추가 프롬프트가 있다면
+        prompt += f"\n --- \n\n6.Additional instructions:\n{extra_prompt.strip()}"
+    prompt +="""\n
+### Final Instructions
+
+Before returning, please verify that all 9 items in the Chart-Quality Checklist are satisfied.  
+It is absolutely paramount that each pattern delivers electrifying fun—genuine excitement ignites from a driving groove and daring novelty. Dull, repetitive sequences are utterly intolerable.
+If there are 6. Additional instructions Section, they must take priority over any other rule or directive. In the event of a conflict, consider only the additional instructions and ignore the conflicting rules.
+"""
+    return prompt.strip()
@@ -0,0 +1,214 @@
+# backend/rechart.py
+"""
+라이브러리 일괄 재분석 / 차트 재생성.
+
+모델·프롬프트 규칙·분석 파라미터를 바꾼 뒤 /api/regenerate 를 곡마다 누르는 대신 한 번에 돌린다.
+- songs.db(예전 songs.json 에서 옮겨진 곡 포함)의 곡과 uploads/<song_id>.mp3 를 대상으로
+  분석은 모든 코어(분석 워커 프로세스)에서, LLM 호출은 --llm-concurrency 개까지만 동시에 한다.
+- 곡·Key 별 입력 지문(오디오 해시, 분석 파라미터, 엔진, 모델, 프롬프트)을 체크포인트 파일에 남긴다.
+  지문이 같고 차트가 있으면 건너뛰므로, 중단된 실행은 같은 명령으로 다시 돌리면 이어진다.
+  (곡 도중에 끊겨도 끝난 청크의 LLM 응답은 응답 캐시에 있어 다시 부르지 않는다)
+- 차트는 ChartStore 로 원자적으로 교체한다 (임시 파일 → fsync → rename). 저장 직전에 최신 차트를
+  다시 읽어 요청한 Key 만 바꾸므로, 서버가 그 사이 다른 Key 를 바꿨어도 덮어쓰지 않는다.
+
+    cd backend
+    python rechart.py                                   # 모든 곡, 곡이 가진 Key, 입력이 바뀐 곡만
+    python rechart.py --keys 4,5,6 --engine native
+    python rechart.py --songs <song_id> <song_id> --force
+    python rechart.py --model gemini-2.5-flash-preview-05-20 --llm-concurrency 2 --dry-run
+"""
+import os, sys, json, glob, time, asyncio, hashlib, argparse, logging
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main as server
+from analysis_worker import AnalysisExecutor
+from cache import cached_file_sha256
+from chart_engine import generate_chart
+from llm_client import LLM_MAX_CONCURRENCY, LLMClient
+from prompts import PROMPT_STYLE, build_prompt
+from song_store import KEY_MODES
+
+STATE_FILE = "rechart_state.json"
+MAX_ONSETS = 400   # analyze_audio_cached 기본값과 같게
+
+log = logging.getLogger("hci.rechart")
+
+
+# ────────────── 체크포인트 ─────────────
+class Checkpoint:
+    """{song_id: {key: 입력 지문}}. 곡 하나가 끝날 때마다 통째로 원자적으로 다시 쓴다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: Dict[str, Dict[str, str]] = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def get(self, song_id: str, key: int) -> Optional[str]:
+        return self.data.get(song_id, {}).get(str(key))
+
+    def mark(self, song_id: str, prints: Dict[int, str]) -> None:
+        self.data.setdefault(song_id, {}).update({str(k): v for k, v in prints.items()})
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def fingerprint(audio_sha256: str, key: int, args: argparse.Namespace) -> str:
+    """차트 결과를 바꾸는 입력만 모은 지문"""
+    parts: Dict[str, Any] = {
+        "audio":    audio_sha256,
+        "analysis": server.analysis_cache_key(args.slow_rate, MAX_ONSETS),
+        "engine":   args.engine,
+        "key":      key,
+    }
+    if args.engine == "llm":
+        # 빈 onset 으로 만든 프롬프트: 고정 규칙 / 스타일 / 추가 요청이 바뀌면 달라진다
+        parts.update(model=server.llm_client.model, structured=server.LLM_STRUCTURED, style=PROMPT_STYLE,
+                     prompt=build_prompt(key, 0.0, [], args.extra_prompt).digest)
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# ────────────── 곡 단위 작업 ─────────────
+async def rechart_song(
+    song: Dict[str, Any],
+    args: argparse.Namespace,
+    state: Checkpoint,
+    sem: asyncio.Semaphore,
+    stats: Dict[str, Any],
+) -> None:
+    song_id = song["song_id"]
+    label   = f"{song['original_name']} ({song_id[:8]})"
+    keys    = args.keys or [k for k in KEY_MODES if song[f"has{k}"]]
+    path    = os.path.join(server.UPLOAD_DIR, f"{song_id}.mp3")
+    if not os.path.isfile(path) or not keys:
+        stats["missing"] += 1
+        log.warning("건너뜀 %s: %s", label, "음원 파일 없음" if keys else "차트 Key 없음")
+        return
+
+    async with sem:
+        sha    = await asyncio.to_thread(cached_file_sha256, path)
+        prints = {k: fingerprint(sha, k, args) for k in keys}
+        exists = server.chart_store.exists(song_id)
+        todo   = [k for k in keys if args.force or not exists or state.get(song_id, k) != prints[k]]
+        if not todo:
+            stats["skipped"] += 1
+            return
+        if args.dry_run:
+            stats["planned"] += 1
+            log.info("대상 %s: %sKey", label, ",".join(map(str, todo)))
+            return
+
+        t0 = time.perf_counter()
+        usage: Dict[str, int] = {}
+        try:
+            summary = await server.analyze_audio_cached(path, slow_rate=args.slow_rate)
+            t_analysis = time.perf_counter() - t0
+            if args.engine == "llm":
+                parts = await asyncio.gather(*(
+                    server.build_chart_with_chunks(k, summary, args.extra_prompt,
+                                                   use_cache=not args.no_cache, usage=usage)
+                    for k in todo
+                ))
+            else:
+                parts = [generate_chart(k, summary) for k in todo]
+            # 저장 직전의 최신 차트에서 요청한 Key 만 교체
+            chart = {}
+            if server.chart_store.exists(song_id):
+                chart = await asyncio.to_thread(server.chart_store.load, song_id)
+            for part in parts:
+                chart.update(part)
+            await asyncio.to_thread(server.chart_store.save, song_id, chart)
+            server.song_store.set_key_modes(song_id, todo)
+            server.index_chart(song_id, chart, summary)
+        except Exception as e:   # 분석 포화/타임아웃, 차트 파일 오류 등: 체크포인트에 남기지 않고 다음 곡으로
+            stats["failed"] += 1
+            log.error("실패 %s: %s", label, e)
+            return
+
+        for k, v in usage.items():
+            stats["usage"][k] = stats["usage"].get(k, 0) + v
+        if usage.get("fallback_chunks"):
+            # 차트는 저장했지만 패턴 엔진으로 채운 청크가 있으니 다음 실행에서 다시 시도한다
+            stats["partial"] += 1
+            log.warning("부분 완료 %s: 청크 %d개를 패턴 엔진으로 대체", label, usage["fallback_chunks"])
+        else:
+            state.mark(song_id, {k: prints[k] for k in todo})
+            stats["done"] += 1
+        n = stats["done"] + stats["partial"] + stats["failed"]
+        log.info("[%d/%d] %s %sKey %.1fs (분석 %.1fs)", n, stats["total"], label,
+                 ",".join(map(str, todo)), time.perf_counter() - t0, t_analysis)
+
+
+# ────────────── 실행 ─────────────
+def parse_key_list(text: str) -> List[int]:
+    keys = sorted({int(k) for k in text.split(",") if k.strip()})
+    if any(k not in KEY_MODES for k in keys):
+        raise argparse.ArgumentTypeError("Key 는 4, 5, 6 중에서 골라야 합니다.")
+    return keys
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    library, _ = server.song_store.list()
+    songs = library
+    if args.songs:
+        wanted = set(args.songs)
+        songs  = [s for s in library if s["song_id"] in wanted]
+        for sid in wanted - {s["song_id"] for s in songs}:
+            log.warning("등록되지 않은 곡: %s", sid)
+    known   = {s["song_id"] for s in library}
+    orphans = [p for p in glob.glob(os.path.join(server.UPLOAD_DIR, "*.mp3"))
+               if os.path.splitext(os.path.basename(p))[0] not in known]
+    if orphans:
+        log.warning("곡 목록에 없는 음원 %d개는 건너뜁니다 (이름을 알 수 없음)", len(orphans))
+
+    stats: Dict[str, Any] = {"total": len(songs), "done": 0, "partial": 0, "skipped": 0, "failed": 0,
+                             "missing": 0, "planned": 0, "usage": {}}
+    state = Checkpoint(args.state)
+    # 분석이 대기열 한도에 걸리지 않도록 동시에 진행하는 곡 수 = 분석 대기열 크기
+    parallel = max(args.workers * 2, args.llm_concurrency)
+    sem = asyncio.Semaphore(parallel)
+    server.analysis_executor = AnalysisExecutor(workers=args.workers, max_pending=parallel)
+    try:
+        await asyncio.gather(*(rechart_song(s, args, state, sem, stats) for s in songs))
+    finally:
+        server.analysis_executor.shutdown()
+    return stats
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--songs", nargs="+", metavar="SONG_ID", help="이 곡들만 (기본: 전체)")
+    ap.add_argument("--keys", type=parse_key_list, help="다시 만들 Key 목록, 예: 4,5,6 (기본: 곡이 가진 Key)")
+    ap.add_argument("--engine", choices=server.ENGINES, default="llm")
+    ap.add_argument("--model", default=server.MODEL_NAME)
+    ap.add_argument("--extra-prompt", default="")
+    ap.add_argument("--slow-rate", type=float, default=1.0)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="분석 워커 프로세스 수")
+    ap.add_argument("--llm-concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="동시에 진행하는 Gemini 호출 수")
+    ap.add_argument("--no-cache", action="store_true", help="캐시된 LLM 응답 대신 새로 생성")
+    ap.add_argument("--force", action="store_true", help="입력이 같아도 다시 생성")
+    ap.add_argument("--dry-run", action="store_true", help="대상 곡만 출력")
+    ap.add_argument("--state", default=STATE_FILE, help="체크포인트 파일")
+    args = ap.parse_args()
+
+    server.llm_client = LLMClient(args.model, max_concurrency=args.llm_concurrency)
+    t0 = time.perf_counter()
+    try:
+        stats = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("중단됨 — 같은 명령으로 다시 실행하면 끝난 곡은 건너뜁니다.")
+        sys.exit(130)
+    print(f"{time.perf_counter() - t0:.1f}s: 곡 {stats['total']}개 중 완료 {stats['done']}, "
+          f"부분 완료 {stats['partial']}, 변경 없음 {stats['skipped']}, 실패 {stats['failed']}, "
+          f"파일 없음 {stats['missing']}" + (f", 대상 {stats['planned']}" if args.dry_run else ""))
+    if stats["usage"]:
+        print("LLM:", stats["usage"])
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
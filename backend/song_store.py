@@ -0,0 +1,310 @@
+# backend/song_store.py
+"""
+곡 메타데이터 저장소 (SQLite, WAL 모드).
+
+songs.json 을 통째로 다시 쓰던 방식 대신 곡 단위 upsert/delete 를 트랜잭션으로 처리한다.
+WAL 이라 읽기는 쓰기를 기다리지 않고, 여러 프로세스(서버 + 일괄 처리 스크립트)가 같이 써도 된다.
+처음 열 때 songs.json 이 있으면 한 번만 옮겨 온다 (meta 테이블에 이전 여부 기록).
+차트를 저장할 때마다 Key 모드별 요약(chart_summary)을 chart_stats 에 넣어 두고,
+곡 목록은 이 인덱스로 정렬·필터한다 (차트 파일은 읽지 않음).
+"""
+import os, json, time, sqlite3, threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from telemetry import span
+
+KEY_MODES = (4, 5, 6)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    song_id       TEXT PRIMARY KEY,
+    original_name TEXT NOT NULL,
+    has4          INTEGER NOT NULL DEFAULT 0,
+    has5          INTEGER NOT NULL DEFAULT 0,
+    has6          INTEGER NOT NULL DEFAULT 0,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    audio_sha256  TEXT,
+    bpm           REAL,
+    duration      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_songs_name ON songs(original_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_songs_has4 ON songs(has4, created_at);
+CREATE INDEX IF NOT EXISTS idx_songs_has5 ON songs(has5, created_at);
+CREATE INDEX IF NOT EXISTS idx_songs_has6 ON songs(has6, created_at);
+CREATE TABLE IF NOT EXISTS chart_stats (
+    song_id     TEXT NOT NULL,
+    mode        INTEGER NOT NULL,
+    notes       INTEGER NOT NULL,
+    avg_nps     REAL NOT NULL,
+    peak_nps    REAL NOT NULL,
+    chord_ratio REAL NOT NULL,
+    level       INTEGER NOT NULL,
+    nps_curve   TEXT NOT NULL,
+    PRIMARY KEY (song_id, mode)
+);
+CREATE INDEX IF NOT EXISTS idx_stats_level ON chart_stats(mode, level);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# 곡 목록 정렬 기준 → 컬럼 (c.* 는 key 를 정해야 쓸 수 있음)
+SORTS = {
+    "created":  "s.created_at",
+    "name":     "s.original_name COLLATE NOCASE",
+    "bpm":      "s.bpm",
+    "duration": "s.duration",
+    "notes":    "c.notes",
+    "level":    "c.level",
+    "peak_nps": "c.peak_nps",
+    "avg_nps":  "c.avg_nps",
+}
+_STATS_IN_MAX = 500   # IN (...) 한 번에 넣는 song_id 수 (SQLite 변수 개수 제한)
+
+
+def _row_to_song(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "song_id":       row["song_id"],
+        "original_name": row["original_name"],
+        "has4":          bool(row["has4"]),
+        "has5":          bool(row["has5"]),
+        "has6":          bool(row["has6"]),
+        "bpm":           row["bpm"],
+        "duration":      row["duration"],
+        "charts":        {},
+    }
+
+
+def _row_to_stats(row: sqlite3.Row, curve: bool) -> Dict[str, Any]:
+    stats = {
+        "notes":       row["notes"],
+        "avg_nps":     row["avg_nps"],
+        "peak_nps":    row["peak_nps"],
+        "chord_ratio": row["chord_ratio"],
+        "level":       row["level"],
+    }
+    if curve:
+        stats["nps_curve"] = json.loads(row["nps_curve"])
+    return stats
+
+
+class SongStore:
+    def __init__(self, path: str, legacy_json: Optional[str] = None):
+        self.path   = path
+        self._local = threading.local()
+        db = self._conn()
+        db.executescript(_SCHEMA)
+        # audio_sha256 / bpm / duration 이 없던 시절의 DB (새 컬럼은 뒤에 붙는다)
+        cols = {r["name"] for r in db.execute("PRAGMA table_info(songs)")}
+        for col, typ in (("audio_sha256", "TEXT"), ("bpm", "REAL"), ("duration", "REAL")):
+            if col not in cols:
+                db.execute(f"ALTER TABLE songs ADD COLUMN {col} {typ}")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_songs_sha ON songs(audio_sha256)")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    # ── 연결 ──
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 연결은 스레드 간 공유하지 않는다 (to_thread 작업용)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    class _Tx:
+        def __init__(self, db: sqlite3.Connection):
+            self.db = db
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.db.execute("BEGIN IMMEDIATE")
+            return self.db
+
+        def __exit__(self, exc_type, exc, tb) -> None:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _tx(self) -> "_Tx":
+        return self._Tx(self._conn())
+
+    # ── songs.json 이전 ──
+    def migrate_json(self, json_path: str) -> int:
+        """DB 에 아직 옮기지 않았으면 songs.json 내용을 그대로 넣는다. 넣은 곡 수 반환."""
+        if not os.path.isfile(json_path):
+            return 0
+        with self._tx() as db:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return 0
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy: Dict[str, Dict[str, Any]] = json.load(f)
+            now = time.time()
+            # created_at 이 같으면 rowid(삽입 순서)로 정렬되므로 기존 순서가 유지된다
+            db.executemany(
+                "INSERT OR IGNORE INTO songs (song_id, original_name, has4, has5, has6, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(sid, s.get("original_name", sid),
+                  int(bool(s.get("has4"))), int(bool(s.get("has5"))), int(bool(s.get("has6"))),
+                  now, now)
+                 for sid, s in legacy.items()],
+            )
+            db.execute("INSERT INTO meta VALUES ('migrated_json', ?)", (json_path,))
+        return len(legacy)
+
+    # ── 조회 ──
+    def _attach_stats(self, songs: List[Dict[str, Any]], curve: bool = False) -> List[Dict[str, Any]]:
+        """songs[i]["charts"] = {"4key": 요약, ...} (페이지 단위로 한 번에 읽음)"""
+        by_id = {s["song_id"]: s for s in songs}
+        ids = list(by_id)
+        db = self._conn()
+        for i in range(0, len(ids), _STATS_IN_MAX):
+            part = ids[i : i + _STATS_IN_MAX]
+            rows = db.execute(
+                f"SELECT * FROM chart_stats WHERE song_id IN ({','.join('?' * len(part))})", part)
+            for r in rows:
+                by_id[r["song_id"]]["charts"][f"{r['mode']}key"] = _row_to_stats(r, curve)
+        return songs
+
+    def get(self, song_id: str, curve: bool = False) -> Optional[Dict[str, Any]]:
+        with span("song_store.get"):
+            row = self._conn().execute("SELECT * FROM songs WHERE song_id = ?", (song_id,)).fetchone()
+            return self._attach_stats([_row_to_song(row)], curve)[0] if row else None
+
+    def find_by_hash(self, audio_sha256: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM songs WHERE audio_sha256 = ? ORDER BY created_at LIMIT 1", (audio_sha256,)).fetchone()
+        return _row_to_song(row) if row else None
+
+    def missing_hashes(self) -> List[str]:
+        """오디오 해시가 아직 없는 song_id 목록"""
+        return [r[0] for r in self._conn().execute("SELECT song_id FROM songs WHERE audio_sha256 IS NULL")]
+
+    def set_hash(self, song_id: str, audio_sha256: str) -> None:
+        with self._tx() as db:
+            db.execute("UPDATE songs SET audio_sha256 = ? WHERE song_id = ?", (audio_sha256, song_id))
+
+    def __contains__(self, song_id: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM songs WHERE song_id = ?", (song_id,)).fetchone() is not None
+
+    def list(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        q: Optional[str] = None,
+        key: Optional[int] = None,
+        sort: str = "created",
+        desc: bool = False,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        curve: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        (곡 목록, 필터에 맞는 전체 곡 수).
+        sort:   SORTS 의 이름. 값이 없는(요약 전) 곡은 방향과 상관없이 맨 뒤, 같은 값은 업로드 순.
+        ranges: {"bpm": (최소, 최대), "level": (…, …)} 처럼 SORTS 컬럼의 닫힌 구간 (None 은 제한 없음).
+        notes / level / *_nps 로 정렬·필터하려면 key 가 있어야 한다 (그 Key 차트의 요약 기준).
+        curve:  True 면 Key 별 요약에 nps_curve 도 넣는다.
+        """
+        ranges = {name: r for name, r in (ranges or {}).items() if r != (None, None)}
+        if sort not in SORTS or any(name not in SORTS for name in ranges):
+            raise ValueError(f"unknown sort/filter field: {sort}, {list(ranges)}")
+        where, args = [], []
+        if q:
+            where.append("s.original_name LIKE ? ESCAPE '\\' COLLATE NOCASE")
+            args.append("%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        join = ""
+        if key is not None:
+            if key not in KEY_MODES:
+                raise ValueError(f"unknown key mode: {key}")
+            where.append(f"s.has{key} = 1")
+            join = f" LEFT JOIN chart_stats c ON c.song_id = s.song_id AND c.mode = {key}"
+        elif any(SORTS[name].startswith("c.") for name in (sort, *ranges)):
+            raise ValueError(f"{sort}/{list(ranges)} needs a key mode")
+        for name, (lo, hi) in ranges.items():
+            col = SORTS[name]
+            if lo is not None:
+                where.append(f"{col} >= ?")
+                args.append(lo)
+            if hi is not None:
+                where.append(f"{col} <= ?")
+                args.append(hi)
+        sql_from  = f" FROM songs s{join}" + (f" WHERE {' AND '.join(where)}" if where else "")
+        col       = SORTS[sort]
+        order     = f"{col} IS NULL, {col} {'DESC' if desc else 'ASC'}, s.created_at, s.rowid"
+        db = self._conn()
+        with span("song_store.list"):
+            total = db.execute(f"SELECT COUNT(*){sql_from}", args).fetchone()[0]
+            rows = db.execute(
+                f"SELECT s.*{sql_from} ORDER BY {order} LIMIT ? OFFSET ?",
+                [*args, -1 if limit is None else limit, offset],
+            ).fetchall()
+            return self._attach_stats([_row_to_song(r) for r in rows], curve), total
+
+    # ── 갱신 ──
+    def upsert(self, song: Dict[str, Any]) -> None:
+        now = time.time()
+        with span("song_store.upsert"), self._tx() as db:
+            db.execute(
+                """
+                INSERT INTO songs (song_id, original_name, has4, has5, has6, created_at, updated_at, audio_sha256,
+                                   duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(song_id) DO UPDATE SET
+                    original_name = excluded.original_name,
+                    has4 = excluded.has4, has5 = excluded.has5, has6 = excluded.has6,
+                    updated_at = excluded.updated_at,
+                    audio_sha256 = COALESCE(excluded.audio_sha256, songs.audio_sha256),
+                    duration = COALESCE(excluded.duration, songs.duration)
+                """,
+                (song["song_id"], song["original_name"],
+                 int(bool(song.get("has4"))), int(bool(song.get("has5"))), int(bool(song.get("has6"))),
+                 now, now, song.get("audio_sha256"), song.get("duration")),
+            )
+
+    def set_key_modes(self, song_id: str, keys: Iterable[int]) -> bool:
+        """has{key} 를 켠다. 곡이 없으면 False."""
+        keys = [k for k in keys if k in KEY_MODES]
+        if not keys:
+            return song_id in self
+        sets = ", ".join(f"has{k} = 1" for k in keys)
+        with span("song_store.set_key_modes"), self._tx() as db:
+            cur = db.execute(f"UPDATE songs SET {sets}, updated_at = ? WHERE song_id = ?",
+                             (time.time(), song_id))
+        return cur.rowcount > 0
+
+    def set_summary(
+        self,
+        song_id: str,
+        modes: Dict[int, Dict[str, Any]],
+        bpm: Optional[float] = None,
+        duration: Optional[float] = None,
+    ) -> None:
+        """차트 요약(chart_summary.summarize_chart) 을 통째로 교체. bpm/duration 이 None 이면 기존 값 유지."""
+        with span("song_store.set_summary"), self._tx() as db:
+            db.execute("UPDATE songs SET bpm = COALESCE(?, bpm), duration = COALESCE(?, duration) WHERE song_id = ?",
+                       (bpm, duration, song_id))
+            db.execute("DELETE FROM chart_stats WHERE song_id = ?", (song_id,))
+            db.executemany(
+                "INSERT INTO chart_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(song_id, mode, m["notes"], m["avg_nps"], m["peak_nps"], m["chord_ratio"], m["level"],
+                  json.dumps(m["nps_curve"]))
+                 for mode, m in modes.items()],
+            )
+
+    def missing_summaries(self) -> List[str]:
+        """차트 요약이 아직 없는 song_id 목록"""
+        return [r[0] for r in self._conn().execute(
+            "SELECT song_id FROM songs WHERE song_id NOT IN (SELECT DISTINCT song_id FROM chart_stats)")]
+
+    def delete(self, song_id: str) -> bool:
+        with span("song_store.delete"), self._tx() as db:
+            cur = db.execute("DELETE FROM songs WHERE song_id = ?", (song_id,))
+            db.execute("DELETE FROM chart_stats WHERE song_id = ?", (song_id,))
+        return cur.rowcount > 0
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM songs").fetchone()[0]
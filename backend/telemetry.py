@@ -0,0 +1,223 @@
+# backend/telemetry.py
+"""
+가벼운 계측 계층.
+
+- Counter / Gauge / Histogram: Prometheus 텍스트 형식(render)으로 /metrics 에 내보낸다.
+  prometheus_client 없이 프로세스 안에서만 모으며, 스레드(to_thread) 에서 갱신해도 안전하다.
+- span(name): 구간 시간을 span_seconds{span=...} 히스토그램에 넣고, 예외로 끝나면 span_errors_total 을 올린다.
+- 요청별 trace: 미들웨어가 trace_id 를 ContextVar 에 넣으면 그 요청(과 요청이 띄운 작업)의 span 마다
+  "hci.trace" 로거에 JSON 한 줄을 남긴다. TRACE_REQUESTS=1 이고 로거가 DEBUG 일 때만.
+- MetricsMiddleware: 요청별 지연 시간 히스토그램 + trace_id 설정.
+
+METRICS_ENABLED=0 이면 모든 기록이 바로 반환된다.
+"""
+import os, json, time, uuid, logging, threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+TRACE_REQUESTS  = os.getenv("TRACE_REQUESTS", "0") == "1"
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+trace_log = logging.getLogger("hci.trace")
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = ()) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._lock  = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {v:g}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """set() 으로 넣거나, fn 을 주면 /metrics 를 읽을 때마다 fn() 값을 쓴다 (대기열 길이 등)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {float(self.fn()):g}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}   # 버킷별 개수 + [+Inf 개수, 합]
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        k = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(k)
+            if row is None:
+                row = self._values[k] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(row)) for k, row in self._values.items()]
+        out: List[str] = []
+        for k, row in items:
+            acc = 0.0
+            for b, n in zip(self.buckets, row):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, ('le', format(b, 'g')))} {acc:g}")
+            acc += row[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, ('le', '+Inf'))} {acc:g}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {row[-1]:.6g}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {acc:g}")
+        return out
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
+
+
+# ────────────── span ─────────────
+SPAN_SECONDS = Histogram("span_seconds", "Duration of instrumented code spans", ["span"])
+SPAN_ERRORS  = Counter("span_errors_total", "Spans that ended with an exception", ["span"])
+
+
+def trace_event(name: str, **fields) -> None:
+    """현재 trace 에 이벤트 한 줄 (trace 가 꺼져 있으면 아무 일도 하지 않음)"""
+    tid = trace_id.get()
+    if tid is not None and TRACE_REQUESTS and trace_log.isEnabledFor(logging.DEBUG):
+        trace_log.debug(json.dumps({"trace": tid, "event": name, **fields}, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name: str, **fields) -> Iterator[None]:
+    if not METRICS_ENABLED and not TRACE_REQUESTS:
+        yield
+        return
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        SPAN_SECONDS.observe(dt, span=name)
+        if not ok:
+            SPAN_ERRORS.inc(span=name)
+        trace_event(name, ms=round(dt * 1000, 3), ok=ok, **fields)
+
+
+# ────────────── HTTP 미들웨어 ─────────────
+HTTP_SECONDS = Histogram("http_request_seconds", "HTTP request duration", ["method", "route", "status"])
+
+
+class MetricsMiddleware:
+    """
+    요청마다 http_request_seconds{method, route, status} 를 기록한다 (route 는 경로 템플릿, 매칭 실패 시 "other").
+    TRACE_REQUESTS=1 이면 X-Request-ID(없으면 새로 만든 id) 를 trace_id 로 두고 응답 헤더로도 돌려준다.
+    스트리밍 응답(SSE, 음원) 은 본문을 다 보낸 시점까지가 한 요청이다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (METRICS_ENABLED or TRACE_REQUESTS):
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        if TRACE_REQUESTS:
+            rid = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        token  = trace_id.set(rid)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if rid is not None:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-request-id", rid.encode("latin-1"))]}
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            dt    = time.perf_counter() - t0
+            route = getattr(scope.get("route"), "path", "other")
+            HTTP_SECONDS.observe(dt, method=scope["method"], route=route, status=str(status[0]))
+            trace_event("http", method=scope["method"], path=scope["path"], route=route,
+                        status=status[0], ms=round(dt * 1000, 3))
+            trace_id.reset(token)
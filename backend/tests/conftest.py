@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+"""backend 폴더 모듈을 평평하게 import 한다 (서버를 cd backend 에서 띄우는 것과 같게)."""
+import os, sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
@@ -0,0 +1,44 @@
+# backend/tests/test_analysis_worker.py
+"""제한 시간을 넘긴 분석이 워커와 대기열 슬롯을 붙잡지 않는지."""
+import asyncio, time
+
+import pytest
+
+from analysis_worker import AnalysisExecutor, AnalysisTimeout
+
+
+def test_timeout_recycles_pool():
+    async def scenario():
+        ex = AnalysisExecutor(workers=1, max_pending=2, timeout=0.5, prewarm=False)
+        try:
+            with pytest.raises(AnalysisTimeout):
+                await ex.run(time.sleep, 30)
+            # 워커가 하나뿐이어도 다음 작업이 바로 돈다
+            t0 = time.perf_counter()
+            assert await ex.run(abs, -3) == 3
+            assert time.perf_counter() - t0 < 10
+            for _ in range(50):
+                if ex.pending == 0:
+                    break
+                await asyncio.sleep(0.05)
+            assert ex.pending == 0
+        finally:
+            ex.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_cut_by_recycle_are_retried():
+    async def scenario():
+        ex = AnalysisExecutor(workers=1, max_pending=4, timeout=0.5, prewarm=False)
+        try:
+            stuck  = asyncio.ensure_future(ex.run(time.sleep, 30))
+            await asyncio.sleep(0.1)
+            queued = asyncio.ensure_future(ex.run(abs, -5))   # 멈춘 작업 뒤에서 기다리다 풀 교체로 취소됨
+            with pytest.raises(AnalysisTimeout):
+                await stuck
+            assert await queued == 5
+        finally:
+            ex.shutdown()
+
+    asyncio.run(scenario())
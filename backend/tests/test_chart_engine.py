@@ -0,0 +1,60 @@
+# backend/tests/test_chart_engine.py
+"""
+패턴 엔진 동시타 선택.
+
+실제 곡의 analyze_audio 결과는 volume 이 상한 1.0 에 붙어 있다. 이때 모든 onset 이
+동시타가 되면 트릴/계단/축 패턴이 사라지므로, 실제 분석 결과로 확인한다.
+"""
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from chart_engine import ACCENT_PCT, generate_chaebo
+
+SONG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "uploads", "14ab8165-850e-4acf-8fef-aa7356b08270.mp3")
+
+
+@pytest.fixture(scope="module")
+def summary():
+    from audio_analysis import analyze_audio
+    return analyze_audio(SONG)
+
+
+def chords(chaebo):
+    per_time = Counter(n["time"] for n in chaebo)
+    return sum(1 for c in per_time.values() if c > 1), per_time
+
+
+@pytest.mark.parametrize("key", [4, 5, 6])
+def test_real_song_is_not_all_chords(summary, key):
+    onsets = summary["onsets"]
+    chaebo = generate_chaebo(key, summary["bpm"], onsets)
+    n_chords, per_time = chords(chaebo)
+
+    assert len(per_time) == len(onsets)
+    assert n_chords <= len(onsets) * ACCENT_PCT // 100
+    # 단타 레인이 한두 개에 몰리지 않고 패턴대로 돌아다닌다
+    singles = [n["position"] for n in chaebo if per_time[n["time"]] == 1]
+    assert len(set(singles)) == key
+    assert sum(a != b for a, b in zip(singles, singles[1:])) > len(singles) // 2
+
+
+def test_saturated_volume_makes_no_chords():
+    onsets = [{"time": i * 0.25, "pitch": 60 + i % 5, "volume": 1.0 if i % 3 else 0.4} for i in range(80)]
+    n_chords, _ = chords(generate_chaebo(4, 120.0, onsets))
+    assert n_chords == 0
+
+
+def test_accents_follow_volume_rank():
+    rng = np.random.default_rng(0)
+    vols = rng.uniform(0.1, 0.9, 200)
+    onsets = [{"time": i * 0.25, "pitch": 60, "volume": float(v)} for i, v in enumerate(vols)]
+    chaebo = generate_chaebo(4, 120.0, onsets)
+    n_chords, per_time = chords(chaebo)
+
+    assert n_chords == len(onsets) * ACCENT_PCT // 100
+    loudest = np.argsort(vols)[-n_chords:]
+    assert all(per_time[round(i * 0.25, 4)] > 1 for i in loudest)
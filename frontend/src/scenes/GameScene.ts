@@ -93,7 +93,7 @@ export class GameScene extends Phaser.Scene {
     this.chart = this.cache.json.get(this.songId) as Chart;
     const list = this.chart[`${this.keyMode}key` as '4key'|'5key'|'6key'];
     this.totalNotes = list.chaebo.length;
-    this.audio = new Audio(`/api/audio/${this.songId}`);
+    this.audio = new Audio(`/api/audio/${this.songId}?variant=stream`);
     this.audio.volume = this.initialVolume;
     this.audio.preload = 'auto';
     this.audio.load();
@@ -20,7 +20,7 @@ export async function fetchSongList(): Promise<SongData[]> {
  * @param key - 차트 키 수 (4, 5, 6 중 하나)
  * @param extraPrompt - LLM에 보낼 추가 프롬프트 (optional)
  * @param slowRate - slow_rate 값 (0.25~1.00)
- * @returns 생성된 song_id
+ * @returns 생성된 song_id (차트 생성 작업이 끝난 뒤 반환)
  */
 export async function uploadMusic(
   file: File,
@@ -46,9 +46,46 @@ export async function uploadMusic(
     body: form,
   });
   if (!res.ok) throw new Error('Failed to upload and generate chart');
+  // 이미 등록된 음원이면 job_id 가 없을 수 있다 (duplicate)
+  const { song_id, job_id } = await res.json();
+  if (job_id) await waitForJob(job_id);
+  return { song_id };
+}
+
+export interface JobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'error';
+  stage: string | null;
+  timings: Record<string, number>;
+  chunks_done: number;
+  chunks_total: number | null;
+  error: string | null;
+}
+
+/**
+ * 차트 생성 작업 상태를 조회합니다.
+ * @param jobId - upload/regenerate 가 돌려준 job_id
+ */
+export async function fetchJob(jobId: string): Promise<JobStatus> {
+  const res = await fetch(`/api/jobs/${jobId}`);
+  if (!res.ok) throw new Error(`Failed to fetch job ${jobId}`);
   return res.json();
 }
 
+/**
+ * 작업이 끝날 때까지 주기적으로 상태를 확인합니다.
+ * @param jobId - 기다릴 작업 ID
+ * @param intervalMs - 폴링 간격 (ms)
+ */
+export async function waitForJob(jobId: string, intervalMs: number = 1000): Promise<JobStatus> {
+  for (;;) {
+    const job = await fetchJob(jobId);
+    if (job.status === 'done') return job;
+    if (job.status === 'error') throw new Error(job.error ?? 'Chart generation failed');
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
 
 /**
  * 특정 song_id에 대응하는 차트 JSON을 가져옵니다.
@@ -90,7 +127,9 @@ export async function regenerateChart(
     throw new Error(`Failed to regenerate chart for ${keyMode}-key`);
   }
 
-  return res.json();
+  const data = await res.json();
+  await waitForJob(data.job_id);
+  return data;
 }
 /**
  * 특정 song_id 의 곡을 삭제합니다.